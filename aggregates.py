@@ -0,0 +1,380 @@
+"""Per-player running aggregates stored with the score document.
+
+``data['aggregates']`` holds, for the first ``rounds`` rounds, each player's
+summed total, basic and duns_raw, how many rounds they took part in and how
+often they finished at each rank, plus a fingerprint of the last round that
+was folded in. Reading them (``player_totals``) checks the round count and
+the fingerprint and folds in only the rounds appended since, so the totals
+row and summaries cost O(players) instead of a pass over the history. The
+block is rebuilt from scratch when the check fails (rounds removed or
+replaced by a full save of a different history).
+
+Each player also carries online statistics of their round totals, updated
+in O(1) per round as rounds are folded in: Welford's running mean and sum
+of squared deviations ('n', 'mean', 'm2'), the best and worst round with
+its index, win/last-place counts and the current and longest win and
+last-place streaks (counted over the rounds the player was ranked in; a
+"last" needs at least two ranked players). ``player_stats`` turns them into
+the per-player dicts the statistics screen shows.
+
+The block also keeps the agreement between drag order and score order:
+sums of the per-round Kendall tau and Spearman rho, discordant pairs and,
+per player, how often their two ranks differed. Everything in it is a
+per-player or per-game scalar, so its size does not grow with the history.
+``fold`` extends it; that is what ``storage.append_rounds`` runs for each
+saved round, so opening the statistics screen after playing costs
+O(players), not a pass over the history.
+
+The statistics screen's charts (every player's running total after each
+round, the running mean of tau) do grow with the rounds, so they are not
+saved: they are kept in memory for the current game, built from its rounds
+as a frame-budgeted job the first time they are needed (``iter_charts``)
+and extended by the rounds appended afterwards.
+"""
+from ranking import competition_ranks, pair_agreement, round_ranks
+from roundindex import round_hash
+
+KEY = 'aggregates'
+VERSION = 4
+# rounds folded per slice of iter_ensure and iter_charts
+CHUNK = 500
+
+
+def _empty():
+    return {'version': VERSION, 'rounds': 0, 'last': None, 'players': {},
+            'agreement': {'compared': 0, 'tau_sum': 0.0, 'rho_n': 0, 'rho_sum': 0.0,
+                          'disagree': 0, 'discordant': 0}}
+
+
+def _new_player():
+    return {'total': 0, 'basic': 0, 'duns_raw': 0, 'rounds': 0, 'ranks': {},
+            'n': 0, 'mean': 0.0, 'm2': 0.0, 'max': None, 'max_round': None, 'min': None, 'min_round': None,
+            'ranked': 0, 'wins': 0, 'lasts': 0, 'win_run': 0, 'win_best': 0, 'last_run': 0, 'last_best': 0,
+            'rank_compared': 0, 'rank_mismatch': 0}
+
+
+def _num(v):
+    try:
+        return int(v)
+    except Exception:
+        return 0
+
+
+def _opt_num(v):
+    try:
+        return int(v)
+    except Exception:
+        return None
+
+
+def _map(rd, *path):
+    for k in path:
+        rd = rd.get(k) if isinstance(rd, dict) else None
+    return rd if isinstance(rd, dict) else {}
+
+
+def fold(agg, rd):
+    """Add one round dict to `agg` in place."""
+    players = agg['players']
+    index = agg['rounds']
+    total = _map(rd, 'total')
+    basic = _map(rd, 'breakdown', 'basic')
+    duns_raw = _map(rd, 'breakdown', 'duns_raw')
+    ranks = round_ranks(rd)
+    field = len(ranks)
+    for name in set(total) | set(basic) | set(duns_raw) | set(ranks):
+        p = players.get(name)
+        if p is None:
+            p = players[name] = _new_player()
+        p['total'] += _num(total.get(name, 0))
+        p['basic'] += _num(basic.get(name, 0))
+        p['duns_raw'] += _num(duns_raw.get(name, 0))
+        p['rounds'] += 1
+        t = _opt_num(total.get(name))
+        if t is not None:
+            # Welford's update of mean and squared deviations
+            p['n'] += 1
+            delta = t - p['mean']
+            p['mean'] += delta / p['n']
+            p['m2'] += delta * (t - p['mean'])
+            if p['max'] is None or t > p['max']:
+                p['max'], p['max_round'] = t, index
+            if p['min'] is None or t < p['min']:
+                p['min'], p['min_round'] = t, index
+        r = ranks.get(name)
+        if r is not None:
+            p['ranks'][str(r)] = p['ranks'].get(str(r), 0) + 1
+            p['ranked'] += 1
+            win = r == 1
+            last = field > 1 and r == field
+            p['wins'] += win
+            p['lasts'] += last
+            p['win_run'] = p['win_run'] + 1 if win else 0
+            p['last_run'] = p['last_run'] + 1 if last else 0
+            p['win_best'] = max(p['win_best'], p['win_run'])
+            p['last_best'] = max(p['last_best'], p['last_run'])
+    _fold_agreement(agg, rd)
+    agg['rounds'] += 1
+    agg['last'] = round_hash(rd)
+
+
+def _rank_pairs(rd):
+    """[(name, drag rank, score rank)] of the players ranked both ways."""
+    drag = _map(rd, 'ranks')
+    score = _map(rd, 'ranks_by_score') or competition_ranks(_map(rd, 'total'))
+    out = []
+    for name, d in drag.items():
+        d, s = _opt_num(d), _opt_num(score.get(name))
+        if d is not None and s is not None and d > 0 and s > 0:
+            out.append((name, d, s))
+    return out
+
+
+def _fold_agreement(agg, rd):
+    pairs = _rank_pairs(rd)
+    for name, d, s in pairs:
+        p = agg['players'].get(name)
+        if p is not None:
+            p['rank_compared'] += 1
+            p['rank_mismatch'] += d != s
+    tau, rho, disc = pair_agreement([(d, s) for _n, d, s in pairs])
+    a = agg['agreement']
+    if tau is not None:
+        a['compared'] += 1
+        a['tau_sum'] += tau
+    if rho is not None:
+        a['rho_n'] += 1
+        a['rho_sum'] += rho
+    a['disagree'] += disc > 0
+    a['discordant'] += disc
+
+
+def _valid(agg, rounds):
+    try:
+        n = agg['rounds']
+        if agg.get('version') != VERSION or not isinstance(agg.get('players'), dict):
+            return False
+        if not 0 <= n <= len(rounds):
+            return False
+        return n == 0 or agg.get('last') == round_hash(rounds[n - 1])
+    except Exception:
+        return False
+
+
+def _rounds(data):
+    return data.get('rounds') if isinstance(data.get('rounds'), list) else []
+
+
+def _start(data):
+    rounds = _rounds(data)
+    agg = data.get(KEY)
+    if not isinstance(agg, dict) or not _valid(agg, rounds):
+        agg = _empty()
+        data[KEY] = agg
+    return agg, rounds
+
+
+def _lock():
+    # the block lives in the store's cached document, which the debounced
+    # writer and compaction serialize on other threads
+    import storage
+    return storage.lock()
+
+
+def ensure(data):
+    """Return the document's aggregates, bringing them up to date in place.
+
+    Only rounds after the stored count are folded in; the updated block is
+    written out with the next full save of the document.
+    """
+    with _lock():
+        agg, rounds = _start(data)
+        for rd in rounds[agg['rounds']:]:
+            fold(agg, rd)
+        return agg
+
+
+def iter_ensure(data, chunk=CHUNK):
+    """ensure() in slices of `chunk` rounds, yielding between them (a
+    scheduler job; see scheduler.py)."""
+    while True:
+        with _lock():
+            agg, rounds = _start(data)
+            if agg['rounds'] >= len(rounds):
+                return
+            for rd in rounds[agg['rounds']:agg['rounds'] + chunk]:
+                fold(agg, rd)
+        yield
+
+
+def current(data):
+    """True when the aggregates already cover every round, i.e. reading them
+    needs no folding."""
+    rounds = _rounds(data)
+    agg = data.get(KEY)
+    return isinstance(agg, dict) and _valid(agg, rounds) and agg['rounds'] == len(rounds)
+
+
+def copy(agg):
+    """A copy of an aggregates block that later folds leave untouched."""
+    if isinstance(agg, dict):
+        return {k: copy(v) for k, v in agg.items()}
+    return agg
+
+
+def invalidate(data):
+    """Drop the aggregates, e.g. after a round in the middle was edited."""
+    try:
+        with _lock():
+            data.pop(KEY, None)
+    except Exception:
+        pass
+
+
+def player_totals(data, players=None):
+    """{player: {'total', 'basic', 'duns_raw', 'rounds', 'ranks', ...}} for
+    `players` (default: the document's players), zeros for absentees."""
+    agg = ensure(data)['players']
+    if players is None:
+        players = data.get('players') or list(agg)
+    out = {}
+    for name in players:
+        p = agg.get(name) or _new_player()
+        out[name] = dict(p, ranks=dict(p['ranks']))
+    return out
+
+
+def player_stats(data, players=None):
+    """{player: {'rounds', 'sum', 'mean', 'var', 'min', 'max', ...}}: per-player
+    statistics read from the accumulators in O(players) once they are
+    current. Variance is the population variance of the round totals; rates
+    are over the rounds the player was ranked in."""
+    out = {}
+    for name, p in player_totals(data, players).items():
+        n, ranked = p['n'], p['ranked']
+        ranks = {}
+        for r, c in p['ranks'].items():
+            try:
+                ranks[int(r)] = c
+            except ValueError:
+                pass
+        out[name] = {
+            'rounds': n, 'sum': p['total'], 'mean': p['mean'] if n else 0.0,
+            'var': p['m2'] / n if n else 0.0, 'min': p['min'], 'max': p['max'],
+            'min_round': p['min_round'], 'max_round': p['max_round'],
+            'basic': p['basic'], 'duns_raw': p['duns_raw'],
+            'wins': p['wins'], 'lasts': p['lasts'],
+            'win_rate': p['wins'] / ranked if ranked else 0.0,
+            'last_rate': p['lasts'] / ranked if ranked else 0.0,
+            'ranks': dict(sorted(ranks.items())),
+            'win_streak': p['win_best'], 'last_streak': p['last_best'],
+        }
+    return out
+
+
+# ---- charts of the current game (in memory) ----
+class _Charts:
+    """Running totals and running mean of tau, one point per round."""
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, data):
+        self.src = data
+        self.rev = None
+        self.count = 0
+        self.last = None
+        self.totals = {}
+        self.cum_tau = []
+        self.tau_sum = 0.0
+        self.compared = 0
+
+    def fold(self, rd):
+        total = _map(rd, 'total')
+        for name in total:
+            if name not in self.totals:
+                # joined later: no points before this round
+                self.totals[name] = [0] * self.count
+        for name, line in self.totals.items():
+            line.append((line[-1] if line else 0) + _num(total.get(name, 0)))
+        tau = pair_agreement([(d, s) for _n, d, s in _rank_pairs(rd)])[0]
+        if tau is not None:
+            self.compared += 1
+            self.tau_sum += tau
+        self.cum_tau.append(self.tau_sum / self.compared if self.compared else None)
+        self.count += 1
+
+    def extendable(self, data):
+        """True when the rounds appended since the last update are all that
+        is missing."""
+        import storage
+        rounds = _rounds(data)
+        if self.src is not data or self.count > len(rounds):
+            return False
+        if self.count and round_hash(rounds[self.count - 1]) != self.last:
+            return False
+        changes = storage.STORE.changes_since(self.rev)
+        return changes is not None and all(ch[0] == 'append' for ch in changes)
+
+    def iter_update(self, data, chunk):
+        import storage
+        if not self.extendable(data):
+            self.reset(data)
+        self.rev = storage.STORE.revision
+        rounds = _rounds(data)
+        while self.count < len(rounds):
+            for rd in rounds[self.count:self.count + chunk]:
+                self.fold(rd)
+            self.last = round_hash(rounds[self.count - 1])
+            yield
+
+
+_CHARTS = _Charts()
+
+
+def charts_current(data):
+    """True when the charts of `data` (the store's document) are at most a
+    few appended rounds behind, i.e. reading them needs no rescan."""
+    return _CHARTS.extendable(data) and len(_rounds(data)) - _CHARTS.count <= CHUNK
+
+
+def iter_charts(data, chunk=CHUNK):
+    """Bring the charts up to date in slices of `chunk` rounds, yielding
+    between them (a scheduler job)."""
+    return _CHARTS.iter_update(data, chunk)
+
+
+def _charts(data):
+    for _ in iter_charts(data):
+        pass
+    return _CHARTS
+
+
+def series(data, players=None):
+    """{player: [running total after each round]}. The lists are kept in
+    memory and grow as rounds are appended; do not modify them."""
+    charts = _charts(data)
+    if players is None:
+        players = data.get('players') or list(charts.totals)
+    return {name: charts.totals.get(name) or [0] * charts.count for name in players}
+
+
+def agreement(data, players=None):
+    """Drag order vs score order over the whole game: {'compared' (rounds
+    with a defined tau), 'disagree_rounds', 'discordant' (pairs in total),
+    'mean_tau', 'mean_rho', 'cum_tau' (running mean of tau per round, None
+    before the first), 'per_player': {name: {'compared', 'mismatch'}}}.
+    A round with fewer than two players ranked both ways, or where either
+    order is all ties, has no tau or rho (see ranking.pair_agreement)."""
+    agg = ensure(data)
+    a = agg['agreement']
+    if players is None:
+        players = data.get('players') or list(agg['players'])
+    per_player = {}
+    for name in players:
+        p = agg['players'].get(name) or _new_player()
+        per_player[name] = {'compared': p['rank_compared'], 'mismatch': p['rank_mismatch']}
+    return {'compared': a['compared'], 'disagree_rounds': a['disagree'], 'discordant': a['discordant'],
+            'mean_tau': a['tau_sum'] / a['compared'] if a['compared'] else None,
+            'mean_rho': a['rho_sum'] / a['rho_n'] if a['rho_n'] else None,
+            'cum_tau': _charts(data).cum_tau, 'per_player': per_player}
@@ -0,0 +1,185 @@
+"""Archive of finished games.
+
+Each archived game body is stored in its own file under ARCHIVE_DIR, and a
+small index (id, date, players, round count, final totals) lists them all.
+Startup and the history list only read the index; a game's rounds are read
+when that game is opened.
+"""
+import datetime, json, logging, os, threading, uuid
+
+from storage import atomic_write_text
+import aggregates
+
+ARCHIVE_DIR = "games"
+INDEX_NAME = "index.json"
+
+_log = logging.getLogger(__name__)
+_lock = threading.RLock()
+_index_cache = None
+_index_sig = None
+
+
+def index_path():
+    return os.path.join(ARCHIVE_DIR, INDEX_NAME)
+
+
+def game_path(game_id):
+    return os.path.join(ARCHIVE_DIR, f"game_{game_id}.json")
+
+
+def _stat(p):
+    try:
+        st = os.stat(p)
+        return (st.st_mtime_ns, st.st_size)
+    except Exception:
+        return None
+
+
+def load_index():
+    """Return the list of index entries, newest first (cached by mtime)."""
+    global _index_cache, _index_sig
+    with _lock:
+        sig = (index_path(), _stat(index_path()))
+        if _index_cache is not None and sig == _index_sig:
+            return _index_cache
+        entries = []
+        try:
+            with open(index_path(), "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            entries = [e for e in (doc.get("games") or []) if isinstance(e, dict) and e.get("id")]
+        except Exception:
+            entries = []
+        _index_cache = entries
+        _index_sig = sig
+        return entries
+
+
+def _write_index(entries):
+    global _index_cache, _index_sig
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    atomic_write_text(index_path(), json.dumps({"version": 1, "games": entries}, ensure_ascii=False, indent=2))
+    _index_cache = entries
+    _index_sig = (index_path(), _stat(index_path()))
+
+
+def summarize(data, game_id=None, date=None):
+    """Build the index entry for a game document."""
+    players = list(data.get("players") or [])
+    rounds = data.get("rounds") or []
+    per_player = aggregates.player_totals(data, None)
+    totals = {p: 0 for p in players}
+    totals.update((p, a["total"]) for p, a in per_player.items())
+    return {
+        "id": game_id,
+        "date": date or datetime.datetime.now().isoformat(timespec="seconds"),
+        "players": players,
+        "rounds": len(rounds),
+        "totals": totals,
+    }
+
+
+def archive_game(data):
+    """Store `data` as an archived game and return its index entry.
+
+    A game that was opened from the archive carries its id in
+    meta['archive_id'] and is updated in place instead of duplicated.
+    Returns None for games without rounds.
+    """
+    if not isinstance(data, dict) or not data.get("rounds"):
+        return None
+    with _lock:
+        entries = list(load_index())
+        meta = data.get("meta") if isinstance(data.get("meta"), dict) else {}
+        game_id = meta.get("archive_id")
+        old = next((e for e in entries if e.get("id") == game_id), None) if game_id else None
+        if old is None:
+            game_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        body = {"players": list(data.get("players") or []), "rounds": list(data.get("rounds") or [])}
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        atomic_write_text(game_path(game_id), json.dumps(body, ensure_ascii=False))
+        entry = summarize(body, game_id=game_id, date=(old or {}).get("date"))
+        entries = [e for e in entries if e.get("id") != game_id]
+        entries.insert(0, entry)
+        _write_index(entries)
+        return entry
+
+
+def game_signature(game_id):
+    """(mtime_ns, size) of an archived game's file, None if missing; changes
+    whenever the game is rewritten."""
+    return _stat(game_path(game_id))
+
+
+def chronological():
+    """Index entries oldest first (archived games in the order they were played)."""
+    return sorted(load_index(), key=lambda e: (str(e.get("date") or ""), str(e.get("id"))))
+
+
+class ArchiveError(Exception):
+    """An archived game that is listed in the index cannot be read."""
+
+
+def read_game(game_id):
+    """load_game() for callers that need the game: raises ArchiveError if the
+    file is missing or unreadable."""
+    body = load_game(game_id)
+    if body is None:
+        raise ArchiveError(f"archived game {game_id} cannot be read")
+    return body
+
+
+def load_game(game_id):
+    """Read the full body of one archived game, or None if missing."""
+    try:
+        with open(game_path(game_id), "r", encoding="utf-8") as f:
+            body = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(body, dict):
+        return None
+    body.setdefault("players", [])
+    body.setdefault("rounds", [])
+    return body
+
+
+def delete_game(game_id):
+    with _lock:
+        entries = [e for e in load_index() if e.get("id") != game_id]
+        _write_index(entries)
+        try:
+            os.remove(game_path(game_id))
+        except Exception:
+            pass
+
+
+# ---- derived caches ----
+# Files next to the archive holding data computed from the archived games
+# (ratings.py, h2h.py). They can always be rebuilt from the games, so a
+# missing, unreadable or outdated cache is only a slower start.
+def load_derived_cache(name, version, **params):
+    """The 'games' entry of cache file `name`, or None when the file is
+    missing, unreadable or was written with another `version` or `params`."""
+    path = os.path.join(ARCHIVE_DIR, name)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        _log.warning("cache %s is unreadable; rebuilding it", path, exc_info=True)
+        return None
+    if not isinstance(doc, dict) or doc.get("version") != version:
+        return None
+    if any(doc.get(k) != v for k, v in params.items()):
+        return None
+    return doc.get("games")
+
+
+def save_derived_cache(name, version, games, **params):
+    """Write `games` to cache file `name` under `version` and `params`."""
+    path = os.path.join(ARCHIVE_DIR, name)
+    try:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        atomic_write_text(path, json.dumps(dict(params, version=version, games=games), ensure_ascii=False))
+    except OSError:
+        _log.warning("cannot write cache %s", path, exc_info=True)
@@ -0,0 +1,225 @@
+"""Content-addressed, rotating backups of the data file.
+
+Every backup is named by the SHA-256 of the file content, so backing up an
+unchanged file is a no-op and identical content is never stored twice.
+Objects are zlib-compressed and, where it is smaller, stored as a delta
+against the previous backup: the common prefix and suffix are referenced and
+only the changed middle is kept, which suits a score file that mostly grows
+by appended rounds. A retention policy (last N plus newest per day and per
+week) prunes the manifest and any objects no longer needed.
+"""
+import datetime, hashlib, json, os, threading, zlib
+
+from storage import atomic_write_text, atomic_write_bytes
+
+BACKUP_DIR = "backups"
+MANIFEST_NAME = "manifest.json"
+
+# retention policy
+KEEP_LAST = 10
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+# store a full copy after this many deltas so restores stay cheap
+MAX_CHAIN = 8
+
+_lock = threading.RLock()
+
+
+def _manifest_path():
+    return os.path.join(BACKUP_DIR, MANIFEST_NAME)
+
+
+def _object_path(digest):
+    return os.path.join(BACKUP_DIR, "objects", digest)
+
+
+def _load_manifest():
+    try:
+        with open(_manifest_path(), "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        if isinstance(doc, dict) and isinstance(doc.get("files"), dict):
+            return doc
+    except Exception:
+        pass
+    return {"version": 1, "files": {}, "objects": {}}
+
+
+def _save_manifest(doc):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    atomic_write_text(_manifest_path(), json.dumps(doc, ensure_ascii=False, indent=2))
+
+
+def _read_object(doc, digest, _depth=0):
+    """Return the full content of object `digest`, resolving delta chains."""
+    info = doc.get("objects", {}).get(digest)
+    if info is None or _depth > MAX_CHAIN + 1:
+        raise KeyError(digest)
+    with open(_object_path(digest), "rb") as f:
+        raw = zlib.decompress(f.read())
+    if info.get("kind") != "delta":
+        return raw
+    base = _read_object(doc, info["base"], _depth + 1)
+    prefix, suffix = info["prefix"], info["suffix"]
+    return base[:prefix] + raw + (base[len(base) - suffix:] if suffix else b"")
+
+
+def _common_prefix_len(a, b):
+    # bisect over slice comparisons (memcmp) instead of a per-byte loop
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _make_delta(base, content):
+    # common prefix/suffix diff: exact and cheap for appended rounds
+    prefix = _common_prefix_len(base, content)
+    limit = min(len(base), len(content)) - prefix
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if base[len(base) - mid:] == content[len(content) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    suffix = lo
+    return prefix, suffix, content[prefix:len(content) - suffix]
+
+
+def _chain(doc, digest):
+    """Digests an object depends on, itself first."""
+    out = []
+    while digest in doc["objects"] and digest not in out:
+        out.append(digest)
+        info = doc["objects"][digest]
+        digest = info.get("base") if info.get("kind") == "delta" else None
+    return out
+
+
+def backup_file(file_path, now=None):
+    """Back up `file_path`; returns the content digest or None.
+
+    Nothing new is written when the content matches the latest backup.
+    """
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    now = now or datetime.datetime.now()
+    key = os.path.basename(file_path)
+    with _lock:
+        doc = _load_manifest()
+        doc.setdefault("objects", {})
+        history = doc["files"].setdefault(key, [])
+        if history and history[-1].get("hash") == digest:
+            return digest
+        if digest not in doc["objects"]:
+            _store_object(doc, digest, content, history[-1].get("hash") if history else None)
+        history.append({"hash": digest, "time": now.isoformat(timespec="seconds")})
+        _prune(doc, now)
+        _save_manifest(doc)
+        return digest
+
+
+def _keep_set(history, now):
+    keep = set(range(max(0, len(history) - KEEP_LAST), len(history)))
+    days, weeks = {}, {}
+    for i, e in enumerate(history):
+        try:
+            t = datetime.datetime.fromisoformat(e.get("time"))
+        except Exception:
+            continue
+        age = (now.date() - t.date()).days
+        if age < KEEP_DAILY:
+            days[t.date()] = i  # later entries win: newest of the day
+        if age < KEEP_WEEKLY * 7:
+            weeks[t.isocalendar()[:2]] = i
+    keep.update(days.values())
+    keep.update(weeks.values())
+    return keep
+
+
+def _store_object(doc, digest, content, prev):
+    """Write `content` as a delta against `prev` when smaller, else in full."""
+    os.makedirs(os.path.dirname(_object_path(digest)), exist_ok=True)
+    full = zlib.compress(content, 6)
+    info = {"kind": "full", "size": len(content)}
+    payload = full
+    chain = _chain(doc, prev) if prev else []
+    # never base an object on a chain that leads back to itself
+    if chain and digest not in chain and len(chain) <= MAX_CHAIN:
+        try:
+            base = _read_object(doc, prev)
+            prefix, suffix, middle = _make_delta(base, content)
+            delta = zlib.compress(middle, 6)
+            if len(delta) < len(full):
+                payload = delta
+                info = {"kind": "delta", "base": prev, "prefix": prefix,
+                        "suffix": suffix, "size": len(content)}
+        except Exception:
+            pass
+    tmp = _object_path(digest) + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, _object_path(digest))
+    doc["objects"][digest] = info
+
+
+def _prune(doc, now):
+    needed = set()
+    for key, history in doc["files"].items():
+        keep = _keep_set(history, now)
+        doc["files"][key] = [e for i, e in enumerate(history) if i in keep]
+        needed.update(e.get("hash") for e in doc["files"][key])
+    # a kept delta whose base is being dropped is re-encoded against the
+    # previous kept backup (or in full), oldest first so bases stay valid
+    for key, history in doc["files"].items():
+        prev = None
+        for e in history:
+            digest = e.get("hash")
+            info = doc["objects"].get(digest)
+            if info and info.get("kind") == "delta" and info.get("base") not in needed:
+                try:
+                    _store_object(doc, digest, _read_object(doc, digest), prev)
+                except Exception:
+                    pass
+            prev = digest
+    # anything still referenced as a base stays
+    stack = list(needed)
+    while stack:
+        info = doc["objects"].get(stack.pop())
+        base = info.get("base") if info else None
+        if base and base not in needed:
+            needed.add(base)
+            stack.append(base)
+    for digest in list(doc["objects"]):
+        if digest not in needed:
+            doc["objects"].pop(digest, None)
+            try:
+                os.remove(_object_path(digest))
+            except Exception:
+                pass
+
+
+def list_backups(file_path):
+    """Return [{'hash', 'time'}] for `file_path`, oldest first."""
+    with _lock:
+        return list(_load_manifest()["files"].get(os.path.basename(file_path), []))
+
+
+def read_backup(digest):
+    """Return the full bytes of a backup."""
+    with _lock:
+        return _read_object(_load_manifest(), digest)
+
+
+def restore_backup(digest, file_path):
+    """Atomically replace `file_path` with the content of backup `digest`."""
+    atomic_write_bytes(file_path, read_backup(digest))
@@ -0,0 +1,265 @@
+"""Compact binary columnar export format (.psb).
+
+Layout, all little-endian::
+
+    header   magic b"PSCB", version u16, reserved u16,
+             n_players u32, n_names u32, n_rounds u32, n_fields u32,
+             names_off u64, columns_off u64, meta_off u64, meta_len u64,
+             ids_off u64
+    names    n_names x (u16 byte length + utf-8), game players first
+    columns  per field in FIELD_NAMES order:
+               n_rounds presence bytes (1 = the round has this map),
+               padded to 4 bytes, then n_rounds x n_names int32 values
+               (MISSING marks a player without a value)
+    ids      round ids (roundindex.ID_KEY) as a string table: n_rounds + 1
+             u32 offsets into the utf-8 blob that follows (an empty string
+             is a round without id)
+    meta     utf-8 JSON: other top-level keys plus rounds that carry other
+             extra keys or cannot be stored as int32
+
+Version 1 files (no ids table, ids kept in meta) are still read.
+
+BinaryGameReader maps the file with mmap and decodes single rounds or whole
+columns on demand instead of materializing every round.
+"""
+import json, mmap, struct, sys
+from array import array
+
+from model import Game, FIELDS, FIELD_NAMES
+from roundindex import ID_KEY
+from storage import atomic_write_bytes
+
+MAGIC = b"PSCB"
+VERSION = 2
+MISSING = -2 ** 31
+_HEADER = struct.Struct("<4sHHIIIIQQQQQ")
+_HEADER_V1 = struct.Struct("<4sHHIIIIQQQQ")
+_MAGIC_VERSION = struct.Struct("<4sH")
+_INT32_MIN, _INT32_MAX = MISSING + 1, 2 ** 31 - 1
+_LOC = dict(FIELDS)
+
+
+def _pad4(n):
+    return (n + 3) & ~3
+
+
+def dump_binary(data, path):
+    """Write the JSON-schema document `data` to `path` in .psb format."""
+    game = Game.from_dict(data)
+    names = game.names
+    n_names = len(names)
+    n_rounds = len(game.rounds)
+    meta_rounds = {}
+    ids = [b""] * n_rounds
+    cols = {f: array('i', [MISSING]) * (n_rounds * n_names) for f in FIELD_NAMES}
+    flags = {f: bytearray(n_rounds) for f in FIELD_NAMES}
+    for r_i, rnd in enumerate(game.rounds):
+        if rnd.raw is not None:
+            meta_rounds[str(r_i)] = {"raw": rnd.raw}
+            continue
+        staged = {}
+        try:
+            for f in FIELD_NAMES:
+                col = getattr(rnd, f)
+                if col is None:
+                    continue
+                mask = rnd.masks[f]
+                for i in range(len(col)):
+                    if (mask >> i) & 1:
+                        v = col[i]
+                        if not _INT32_MIN <= v <= _INT32_MAX:
+                            raise OverflowError(f)
+                        staged[(f, i)] = v
+        except OverflowError:
+            meta_rounds[str(r_i)] = {"raw": game.round_to_dict(rnd)}
+            continue
+        base = r_i * n_names
+        for (f, i), v in staged.items():
+            cols[f][base + i] = v
+        for f in FIELD_NAMES:
+            if getattr(rnd, f) is not None:
+                flags[f][r_i] = 1
+        extra = rnd.extra
+        if extra and isinstance(extra.get(ID_KEY), str):
+            ids[r_i] = extra[ID_KEY].encode("utf-8")
+            extra = {k: v for k, v in extra.items() if k != ID_KEY}
+        if extra:
+            meta_rounds[str(r_i)] = {"extra": extra}
+
+    name_blob = bytearray()
+    for nm in names:
+        b = nm.encode("utf-8")
+        name_blob += struct.pack("<H", len(b)) + b
+    names_off = _HEADER.size
+    columns_off = _pad4(names_off + len(name_blob))
+    col_blob = bytearray()
+    for f in FIELD_NAMES:
+        col_blob += flags[f] + bytes(_pad4(n_rounds) - n_rounds)
+        c = cols[f]
+        if sys.byteorder != "little":
+            c = array('i', c)
+            c.byteswap()
+        col_blob += c.tobytes()
+    players = [p.name for p in game.players]
+    meta_doc = {"doc": game.extra, "rounds": meta_rounds}
+    if players != names[:len(players)]:
+        # duplicate names in the players list; keep it verbatim
+        meta_doc["players"] = players
+    meta = json.dumps(meta_doc, ensure_ascii=False).encode("utf-8")
+    offsets = array('I', [0])
+    for b in ids:
+        offsets.append(offsets[-1] + len(b))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    id_blob = offsets.tobytes() + b"".join(ids)
+    ids_off = columns_off + len(col_blob)
+    meta_off = ids_off + len(id_blob)
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(game.players), n_names, n_rounds, len(FIELD_NAMES),
+                          names_off, columns_off, meta_off, len(meta), ids_off)
+    out = bytearray(header)
+    out += name_blob
+    out += bytes(columns_off - len(out))
+    out += col_blob
+    out += id_blob
+    out += meta
+    atomic_write_bytes(path, bytes(out))
+
+
+class BinaryGameReader:
+    """Memory-mapped reader for .psb files."""
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._f.close()
+            raise
+        magic, version = _MAGIC_VERSION.unpack_from(self._mm, 0)
+        if magic != MAGIC or version not in (1, VERSION):
+            self.close()
+            raise ValueError("not a score binary file")
+        if version == 1:
+            fields = _HEADER_V1.unpack_from(self._mm, 0) + (None,)
+        else:
+            fields = _HEADER.unpack_from(self._mm, 0)
+        (_m, _v, _r, self.n_players, self.n_names, self.n_rounds, n_fields,
+         names_off, self._columns_off, meta_off, meta_len, self._ids_off) = fields
+        if n_fields != len(FIELD_NAMES):
+            self.close()
+            raise ValueError("not a score binary file")
+        names = []
+        pos = names_off
+        for _ in range(self.n_names):
+            (ln,) = struct.unpack_from("<H", self._mm, pos)
+            names.append(bytes(self._mm[pos + 2:pos + 2 + ln]).decode("utf-8"))
+            pos += 2 + ln
+        self.names = names
+        self.players = names[:self.n_players]
+        meta = json.loads(bytes(self._mm[meta_off:meta_off + meta_len]).decode("utf-8") or "{}")
+        if isinstance(meta.get("players"), list):
+            self.players = meta["players"]
+        self._doc = meta.get("doc") or {}
+        self._meta_rounds = meta.get("rounds") or {}
+        self._field_size = _pad4(self.n_rounds) + 4 * self.n_rounds * self.n_names
+
+    def close(self):
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+        try:
+            self._f.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_rounds
+
+    @property
+    def extra(self):
+        """Top-level document keys other than players and rounds."""
+        return dict(self._doc)
+
+    def _field_offsets(self, field):
+        base = self._columns_off + FIELD_NAMES.index(field) * self._field_size
+        return base, base + _pad4(self.n_rounds)
+
+    def column(self, field):
+        """Return the whole field as int32 values, round-major, without copying
+        (a memoryview) on little-endian hosts."""
+        _flags_off, off = self._field_offsets(field)
+        view = memoryview(self._mm)[off:off + 4 * self.n_rounds * self.n_names]
+        if sys.byteorder == "little":
+            return view.cast("i")
+        a = array('i', bytes(view))
+        a.byteswap()
+        return a
+
+    def value(self, round_idx, field, player_idx):
+        """Single value or None when missing."""
+        _flags_off, off = self._field_offsets(field)
+        (v,) = struct.unpack_from("<i", self._mm, off + 4 * (round_idx * self.n_names + player_idx))
+        return None if v == MISSING else v
+
+    def round_id(self, i):
+        """Id of round `i`, or None if it has none (or is kept in meta)."""
+        if self._ids_off is None:
+            return None
+        start, end = struct.unpack_from("<II", self._mm, self._ids_off + 4 * i)
+        if start == end:
+            return None
+        blob = self._ids_off + 4 * (self.n_rounds + 1)
+        return bytes(self._mm[blob + start:blob + end]).decode("utf-8")
+
+    def round(self, i):
+        """Decode round `i` into the JSON round schema."""
+        special = self._meta_rounds.get(str(i)) or {}
+        if "raw" in special:
+            return special["raw"]
+        rd = {}
+        rid = self.round_id(i)
+        if rid is not None:
+            rd[ID_KEY] = rid
+        extra = dict(special.get("extra") or {})
+        bd_rest = extra.pop("breakdown", None)
+        row = struct.Struct("<%di" % self.n_names)
+        for f in FIELD_NAMES:
+            flags_off, off = self._field_offsets(f)
+            if not self._mm[flags_off + i]:
+                continue
+            vals = row.unpack_from(self._mm, off + 4 * i * self.n_names)
+            loc = _LOC[f]
+            parent = rd
+            for k in loc[:-1]:
+                parent = parent.setdefault(k, {})
+            parent[loc[-1]] = {self.names[j]: v for j, v in enumerate(vals) if v != MISSING}
+        if bd_rest is not None:
+            rd["breakdown"] = dict(bd_rest, **(rd.get("breakdown") or {}))
+        rd.update(extra)
+        return rd
+
+    def iter_rounds(self):
+        for i in range(self.n_rounds):
+            yield self.round(i)
+
+    def to_dict(self):
+        data = {"players": list(self.players), "rounds": list(self.iter_rounds())}
+        data.update(self._doc)
+        return data
+
+
+def load_binary(path):
+    """Read a .psb file back into the JSON-schema document."""
+    with BinaryGameReader(path) as r:
+        return r.to_dict()
+
+
+def is_binary_path(path):
+    return str(path).lower().endswith(".psb")
@@ -0,0 +1,354 @@
+"""Virtualized, canvas-drawn score board.
+
+``ScoreTable`` is a single widget that draws a grid of cells straight onto
+its canvas: one border rectangle for the drawn area, one background
+rectangle per cell (batched by color) and one textured rectangle per text,
+all in a single InstructionGroup in local coordinates. Text textures come
+from the shared texcache. There are no child widgets, bindings or layout
+passes per cell, and only the cells inside the viewport (plus OVERSCAN
+cells) are drawn.
+
+``ScoreBoard`` arranges tables into a sticky header row, a sticky round
+column and a sticky totals row around a 2-D scrolling body.
+
+Cells are plain dicts: 'text', 'bg' (name of a theme color, resolved at draw
+time so a theme change only needs a redraw), 'rank' (1 or 'last' for a
+trophy) and optionally 'highlight'.
+"""
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.scrollview import ScrollView
+from kivy.uix.widget import Widget
+from kivy.graphics import Color, Rectangle, InstructionGroup, PushMatrix, PopMatrix, Translate
+from kivy.clock import Clock
+from kivy.metrics import dp
+
+import theme as _theme
+from texcache import get_texture
+
+# extra cells drawn beyond each edge of the viewport
+OVERSCAN = 2
+FIRST_W = dp(120)
+PLAYER_W = dp(100)
+
+_TROPHY_COLORS = {1: (1.0, 0.84, 0.0, 1), 'last': (0.6, 0.6, 0.63, 1)}
+
+
+def _theme_color(name):
+    try:
+        return tuple(getattr(_theme, name))
+    except Exception:
+        return (1, 1, 1, 1)
+
+
+class ScoreTable(Widget):
+    """Grid of `cols` columns drawn on one canvas; see module docstring."""
+
+    def __init__(self, cols=1, col_width=PLAYER_W, row_height=None, **kw):
+        kw.setdefault('size_hint', (None, None))
+        super().__init__(**kw)
+        self.cols = max(1, cols)
+        self.col_width = col_width
+        self.row_height = row_height or _theme.ROW_HEIGHT
+        self.cells = []
+        self._view = None
+        self._drawn = None
+        with self.canvas:
+            PushMatrix()
+            self._translate = Translate(self.x, self.y)
+            self._group = InstructionGroup()
+            PopMatrix()
+        self.bind(pos=self._on_pos)
+        self._trigger_redraw = Clock.create_trigger(self._redraw, -1)
+        self._resize()
+
+    def _on_pos(self, *_a):
+        # scrolling only moves the translation; the cells stay put
+        self._translate.xy = self.pos
+
+    @property
+    def rows(self):
+        return (len(self.cells) + self.cols - 1) // self.cols
+
+    def _resize(self):
+        self.width = self.cols * self.col_width
+        self.height = self.rows * self.row_height
+
+    # ---- data ----
+    def set_cols(self, cols):
+        self.cols = max(1, cols)
+        self._changed()
+
+    def set_cells(self, cells):
+        self.cells = list(cells)
+        self._changed()
+
+    def extend(self, cells):
+        self.cells.extend(cells)
+        self._changed()
+
+    def replace(self, start, cells):
+        self.cells[start:start + len(cells)] = cells
+        self._changed()
+
+    def _changed(self):
+        self._resize()
+        self._drawn = None
+        self._trigger_redraw()
+
+    def release(self):
+        """Drop the cells and the drawn instructions (and with them the
+        texture references) right away rather than on the next frame."""
+        self.cells = []
+        self._group.clear()
+        self._changed()
+
+    def refresh(self):
+        self._drawn = None
+        self._trigger_redraw()
+
+    # ---- viewport ----
+    def set_viewport(self, view):
+        """(x, y, w, h) in local coordinates, or None to draw everything."""
+        self._view = view
+        if self._visible_range() != self._drawn:
+            self._trigger_redraw()
+
+    def _visible_range(self):
+        return visible_range(self.rows, self.cols, self.col_width, self.row_height, self.height, self._view)
+
+    # ---- drawing ----
+    def _redraw(self, *_a):
+        self._group.clear()
+        rng = self._visible_range()
+        self._drawn = rng
+        draw_cells(self._group, self.cells, self.cols, self.col_width, self.row_height, self.height, rng)
+
+
+def visible_range(rows, cols, col_width, row_height, height, view):
+    """(r0, r1, c0, c1) of the cells of a grid `height` high that intersect
+    `view` = (x, y, w, h) in the grid's coordinates (None: all of them)."""
+    if view is None:
+        return (0, rows, 0, cols)
+    x, y, w, h = view
+    rh, cw = row_height, col_width
+    # row 0 is at the top
+    top = height - (y + h)
+    r0 = max(0, int(top // rh) - OVERSCAN)
+    r1 = min(rows, int((top + h) // rh) + 1 + OVERSCAN)
+    c0 = max(0, int(x // cw) - OVERSCAN)
+    c1 = min(cols, int((x + w) // cw) + 1 + OVERSCAN)
+    return (r0, max(r0, r1), c0, max(c0, c1))
+
+
+def _texture(text, color, font_name=None, width=None):
+    return get_texture(text, font_name or _theme.FONT_NAME, _theme.SMALL_FONT, color, width)
+
+
+def draw_cells(g, cells, cols, cw, rh, height, rng, ox=0, oy=0):
+    """Add the instructions for cells `rng` of a grid to group `g`; the grid's
+    bottom-left corner is at (ox, oy)."""
+    r0, r1, c0, c1 = rng
+    if r1 <= r0 or c1 <= c0:
+        return
+    top = oy + height
+    inset = dp(1)
+    # one border rectangle under the whole drawn area
+    g.add(Color(*_theme_color('BORDER_COLOR')))
+    g.add(Rectangle(pos=(ox + c0 * cw, top - r1 * rh), size=((c1 - c0) * cw, (r1 - r0) * rh)))
+    by_color = {}
+    texts = []
+    accent = _theme_color('ACCENT')
+    n = len(cells)
+    for r in range(r0, r1):
+        y = top - (r + 1) * rh
+        base = r * cols
+        for c in range(c0, c1):
+            i = base + c
+            if i >= n:
+                break
+            cell = cells[i]
+            x = ox + c * cw
+            if cell.get('highlight'):
+                bg = (accent[0], accent[1], accent[2], 0.18)
+            else:
+                bg = _theme_color(cell.get('bg', 'ROW_DARK'))
+            by_color.setdefault(bg, []).append((x + inset, y + inset))
+            texts.append((x, y, cell))
+    size = (max(0, cw - 2 * inset), max(0, rh - 2 * inset))
+    for bg, spots in by_color.items():
+        g.add(Color(*bg))
+        for pos in spots:
+            g.add(Rectangle(pos=pos, size=size))
+    g.add(Color(1, 1, 1, 1))
+    text_color = _theme_color('TEXT_COLOR')
+    trophy_w = dp(20)
+    glyph, glyph_font = ('\uf091', _theme.FA_FONT) if _theme.FA_FONT else ('🏆', None)
+    for x, y, cell in texts:
+        rank_color = _TROPHY_COLORS.get(cell.get('rank'))
+        avail = cw - (trophy_w if rank_color else 0)
+        text = cell.get('text', '')
+        tex = _texture(text, text_color, width=avail) if text else None
+        if tex is not None:
+            tw, th = tex.size
+            g.add(Rectangle(texture=tex, size=(tw, th),
+                            pos=(int(x + (avail - tw) / 2), int(y + (rh - th) / 2))))
+        tex = _texture(glyph, rank_color, font_name=glyph_font) if rank_color else None
+        if tex is not None:
+            tw, th = tex.size
+            g.add(Rectangle(texture=tex, size=(tw, th),
+                            pos=(int(x + avail + (trophy_w - tw) / 2), int(y + (rh - th) / 2))))
+
+
+# ---- cell records shared by the screen and the exporter ----
+def round_values(game, i, players):
+    """(total, basic, duns_raw, rank) per player for round i of `game`."""
+    rd = game.rounds[i]
+    value = game.value
+    rank_field = rd.rank_field()
+    return [(value(rd, 'total', p), value(rd, 'basic', p), value(rd, 'duns_raw', p),
+             value(rd, rank_field, p, None)) for p in players]
+
+
+def round_row(i, vals):
+    """(label cell, player cells) of board row i."""
+    n = len(vals)
+    bg = 'ROW_DARK' if (i % 2 == 0) else 'ROW_LIGHT'
+    cells = []
+    for t, b, d, player_rank in vals:
+        rank = 1 if player_rank == 1 else 'last' if player_rank == n else None
+        cells.append({'text': f"{t}\n基:{b:+}  顿:{d}", 'bg': bg, 'rank': rank})
+    return {'text': f"第{i + 1}局", 'bg': bg}, cells
+
+
+def total_cells(totals, players):
+    """Totals-row cells from aggregates.player_totals()."""
+    return [{'text': f"基:{t['basic']:+}  顿:{t['duns_raw']}\n总:{t['total']}", 'bg': 'TOTAL_BG'}
+            for t in (totals[p] for p in players)]
+
+
+def _scroller(table, **kw):
+    """ScrollView around `table` that keeps the table's viewport in sync."""
+    sv = ScrollView(**kw)
+    sv.add_widget(table)
+
+    def _update(*_a):
+        w, h = sv.size
+        x = max(0, table.width - w) * sv.scroll_x
+        y = max(0, table.height - h) * sv.scroll_y
+        table.set_viewport((x, y, w, h))
+
+    sv.bind(scroll_x=_update, scroll_y=_update, size=_update)
+    table.bind(size=_update)
+    _update()
+    return sv
+
+
+class ScoreBoard(BoxLayout):
+    """Sticky header row, round column and totals row around a 2-D body."""
+
+    def __init__(self, **kw):
+        kw.setdefault('orientation', 'vertical')
+        super().__init__(**kw)
+        rh = _theme.ROW_HEIGHT
+
+        self.corner = ScoreTable(col_width=FIRST_W)
+        self.corner.set_cells([{'text': '局/玩家', 'bg': 'HEADER_BG'}])
+        self.header = ScoreTable()
+        self.header_sv = _scroller(self.header, do_scroll_x=False, do_scroll_y=False, bar_width=0)
+        top = BoxLayout(size_hint_y=None, height=rh)
+        top.add_widget(self.corner)
+        top.add_widget(self.header_sv)
+
+        self.column = ScoreTable(col_width=FIRST_W)
+        self.column_sv = _scroller(self.column, size_hint_x=None, width=FIRST_W,
+                                   do_scroll_x=False, do_scroll_y=False, bar_width=0)
+        self.body = ScoreTable()
+        self.body_sv = _scroller(self.body, do_scroll_x=True, do_scroll_y=True,
+                                 scroll_type=['bars', 'content'])
+        middle = BoxLayout()
+        middle.add_widget(self.column_sv)
+        middle.add_widget(self.body_sv)
+
+        self.total_label = ScoreTable(col_width=FIRST_W)
+        self.total_label.set_cells([{'text': '合计', 'bg': 'TOTAL_BG'}])
+        self.footer = ScoreTable()
+        self.footer_sv = _scroller(self.footer, do_scroll_x=False, do_scroll_y=False, bar_width=0)
+        self.bottom = BoxLayout(size_hint_y=None, height=rh)
+        self.bottom.add_widget(self.total_label)
+        self.bottom.add_widget(self.footer_sv)
+
+        self.add_widget(top)
+        self.add_widget(middle)
+        self.add_widget(self.bottom)
+        # the body drives the sticky parts
+        self.body_sv.bind(scroll_x=self._sync_x, scroll_y=self._sync_y)
+        self.show_totals(False)
+
+    def _sync_x(self, _inst, value):
+        self.header_sv.scroll_x = value
+        self.footer_sv.scroll_x = value
+
+    def _sync_y(self, _inst, value):
+        self.column_sv.scroll_y = value
+
+    def _tables(self):
+        return (self.corner, self.header, self.column, self.body, self.total_label, self.footer)
+
+    # ---- data ----
+    def set_columns(self, names):
+        n = max(1, len(names))
+        for t in (self.header, self.body, self.footer):
+            t.set_cols(n)
+        self.header.set_cells([{'text': p, 'bg': 'HEADER_BG'} for p in names])
+
+    def clear(self):
+        for t in (self.header, self.column, self.body, self.footer):
+            t.release()
+        self.show_totals(False)
+
+    def append_rows(self, rows):
+        """rows: [(label cell, [player cells])]."""
+        self.column.extend([lbl for lbl, _cells in rows])
+        body = []
+        for _lbl, cells in rows:
+            body.extend(cells)
+        self.body.extend(body)
+
+    def set_row(self, i, label, cells):
+        self.column.replace(i, [label])
+        self.body.replace(i * self.body.cols, cells)
+
+    def truncate_rows(self, count):
+        """Drop every row from `count` on."""
+        self.column.set_cells(self.column.cells[:count])
+        self.body.set_cells(self.body.cells[:count * self.body.cols])
+
+    def set_totals(self, cells):
+        self.footer.set_cells(cells)
+        self.show_totals(bool(cells))
+
+    def show_totals(self, visible):
+        self.bottom.height = _theme.ROW_HEIGHT if visible else 0
+        self.bottom.opacity = 1 if visible else 0
+
+    def set_highlight(self, i, on):
+        """Tint (or untint) row i."""
+        try:
+            self.column.replace(i, [dict(self.column.cells[i], highlight=on)])
+            cols = self.body.cols
+            start = i * cols
+            self.body.replace(start, [dict(c, highlight=on) for c in self.body.cells[start:start + cols]])
+        except Exception:
+            pass
+
+    def restyle(self):
+        """Redraw with the current theme colors (no data change)."""
+        for t in self._tables():
+            t.refresh()
+
+    def scroll_to_row(self, i):
+        n = self.column.rows
+        if n <= 1:
+            return
+        # scroll_y runs bottom (0) to top (1)
+        self.body_sv.scroll_y = max(0.0, min(1.0, 1.0 - i / (n - 1)))
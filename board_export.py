@@ -0,0 +1,324 @@
+"""Render a whole score board to a PNG file without building the board.
+
+The board is laid out straight from the score document (header row, one row
+per round, totals row; the same cells and colors as the score screen, see
+board.py) and drawn tile by tile into an offscreen ``Fbo`` no larger than
+TILE pixels (or the GPU's texture limit) per side. Tiles are rendered one
+horizontal band at a time and streamed into the PNG encoder, so memory stays
+at a band or two however long the game is. The PNG is written with
+zlib/struct from the standard library. In the app, export_png_async() renders
+one tile per frame and writes the file on a worker thread.
+
+Batch export of archived games, headless (a hidden window provides the GL
+context)::
+
+    python board_export.py [--out DIR] [GAME_ID ...]
+"""
+import os
+import queue
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+TILE = 2048
+# uncompressed bytes buffered per IDAT chunk
+IDAT_SIZE = 1 << 16
+# rendered bands waiting for the PNG writer thread (export_png_async)
+QUEUED = 2
+
+
+class PNGWriter:
+    """Minimal streaming encoder for 8-bit RGBA PNGs, fed top row first."""
+
+    def __init__(self, f, width, height):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self._z = zlib.compressobj(6)
+        self._buf = []
+        self._size = 0
+        f.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, kind, payload):
+        self.f.write(struct.pack('>I', len(payload)))
+        self.f.write(kind)
+        self.f.write(payload)
+        self.f.write(struct.pack('>I', zlib.crc32(payload, zlib.crc32(kind)) & 0xffffffff))
+
+    def write_row(self, row):
+        # filter type 0 (none) per scanline
+        self._buf.append(b'\x00')
+        self._buf.append(row)
+        self._size += len(row) + 1
+        self.rows += 1
+        if self._size >= IDAT_SIZE:
+            self._emit(self._z.compress(b''.join(self._buf)))
+
+    def _emit(self, data):
+        self._buf = []
+        self._size = 0
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError(f'PNG expects {self.height} rows, got {self.rows}')
+        data = self._z.compress(b''.join(self._buf))
+        self._emit(data + self._z.flush())
+        self._chunk(b'IEND', b'')
+
+
+def layout(data):
+    """Grids of the full board for score document `data`.
+
+    Returns (width, height, grids); each grid is a dict with 'cells',
+    'cols', 'cw', 'rows' and its bottom-left corner 'x', 'y' in image
+    coordinates (y up, as in GL).
+    """
+    import aggregates
+    from model import Game
+    from board import FIRST_W, PLAYER_W, round_values, round_row, total_cells
+    from theme import ROW_HEIGHT as rh
+
+    game = Game.from_dict(data)
+    players = [pl.name for pl in game.players]
+    count = len(game.rounds)
+    cols = max(1, len(players))
+    labels, body = [], []
+    for i in range(count):
+        label, cells = round_row(i, round_values(game, i, players))
+        labels.append(label)
+        body.extend(cells)
+    footer = total_cells(aggregates.player_totals(data, players), players) if count and players else []
+    foot_h = rh if footer else 0
+    width = int(round(FIRST_W + cols * PLAYER_W))
+    height = int(round(rh + count * rh + foot_h))
+    body_y = foot_h
+    top_y = foot_h + count * rh
+
+    def grid(cells, ncols, cw, rows, x, y):
+        return {'cells': cells, 'cols': ncols, 'cw': cw, 'rows': rows, 'x': x, 'y': y}
+
+    grids = [
+        grid([{'text': '局/玩家', 'bg': 'HEADER_BG'}], 1, FIRST_W, 1, 0, top_y),
+        grid([{'text': p, 'bg': 'HEADER_BG'} for p in players], cols, PLAYER_W, 1, FIRST_W, top_y),
+        grid(labels, 1, FIRST_W, count, 0, body_y),
+        grid(body, cols, PLAYER_W, count, FIRST_W, body_y),
+    ]
+    if footer:
+        grids.append(grid([{'text': '合计', 'bg': 'TOTAL_BG'}], 1, FIRST_W, 1, 0, 0))
+        grids.append(grid(footer, cols, PLAYER_W, 1, FIRST_W, 0))
+    return width, height, grids
+
+
+def _tile_group(grids, tx, ty, tw, th):
+    """Instructions drawing the part of `grids` inside one tile, shifted so
+    the tile's bottom-left corner is the origin."""
+    from kivy.graphics import InstructionGroup
+    from board import visible_range, draw_cells
+    from theme import ROW_HEIGHT as rh
+
+    g = InstructionGroup()
+    for gr in grids:
+        gh = gr['rows'] * rh
+        view = (tx - gr['x'], ty - gr['y'], tw, th)
+        rng = visible_range(gr['rows'], gr['cols'], gr['cw'], rh, gh, view)
+        draw_cells(g, gr['cells'], gr['cols'], gr['cw'], rh, gh, rng, ox=gr['x'] - tx, oy=gr['y'] - ty)
+    return g
+
+
+def render_tile(grids, tx, ty, tw, th):
+    """RGBA pixels (bottom row first) of one tile, drawn in an Fbo."""
+    from kivy.graphics import Fbo, ClearColor, ClearBuffers
+    import theme as _theme
+
+    fbo = Fbo(size=(tw, th), with_stencilbuffer=False)
+    with fbo:
+        ClearColor(*tuple(_theme.COLOR_BG))
+        ClearBuffers()
+    fbo.add(_tile_group(grids, tx, ty, tw, th))
+    fbo.draw()
+    return fbo.pixels
+
+
+def max_tile():
+    """TILE, capped by the GPU's texture size limit when it is known."""
+    try:
+        from kivy.graphics.opengl import glGetIntegerv, GL_MAX_TEXTURE_SIZE
+        limit = glGetIntegerv(GL_MAX_TEXTURE_SIZE)
+        limit = int(limit[0] if isinstance(limit, (list, tuple)) else limit)
+        if limit > 0:
+            return min(TILE, limit)
+    except Exception:
+        pass
+    return TILE
+
+
+def _render_bands(grids, width, height, tile):
+    """Draw the image tile by tile, bands from the top of the image down (GL
+    y grows upwards). Yields None after each tile and (band height,
+    [(row bytes, pixels)]) once its band is complete."""
+    for top in range(0, height, tile):
+        bh = min(tile, height - top)
+        ty = height - top - bh
+        tiles = []
+        for tx in range(0, width, tile):
+            tw = min(tile, width - tx)
+            tiles.append((tw * 4, render_tile(grids, tx, ty, tw, bh)))
+            yield None
+        yield bh, tiles
+
+
+def _write_png(path, width, height, bands):
+    """Encode `bands` (see _render_bands) into the PNG file `path`; the file
+    is replaced only once the image is complete."""
+    d = os.path.dirname(os.path.abspath(path)) or '.'
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=d)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            png = PNGWriter(f, width, height)
+            for bh, tiles in bands:
+                for k in range(bh - 1, -1, -1):
+                    png.write_row(b''.join(px[k * stride:(k + 1) * stride] for stride, px in tiles))
+            png.close()
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+
+
+def export_png(data, path, tile=None):
+    """Render score document `data` to the PNG file `path`; returns (width, height)."""
+    width, height, grids = layout(data)
+    bands = _render_bands(grids, width, height, tile or max_tile())
+    _write_png(path, width, height, (band for band in bands if band is not None))
+    return width, height
+
+
+def export_png_async(data, path, on_done=None, tile=None):
+    """export_png() without stalling the UI; returns the scheduler Job.
+
+    The tiles are rendered by a scheduler job, one tile per step, since GL
+    calls have to stay on the UI thread; finished bands go to a worker thread
+    that encodes and writes the PNG. ``on_done(error)`` is called on the UI
+    thread once the file is written (error None) or the export failed.
+    """
+    import scheduler
+    width, height, grids = layout(data)
+    tile = tile or max_tile()
+    bands = queue.Queue()
+
+    def feed():
+        while True:
+            band = bands.get()
+            if band is None:
+                return
+            if isinstance(band, BaseException):
+                raise band if isinstance(band, Exception) else RuntimeError('export cancelled')
+            yield band
+
+    def write():
+        error = None
+        try:
+            _write_png(path, width, height, feed())
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        if on_done is not None:
+            from kivy.clock import Clock
+            Clock.schedule_once(lambda dt: on_done(error), 0)
+
+    writer = threading.Thread(target=write, name='png-export', daemon=True)
+
+    def render():
+        writer.start()
+        try:
+            for band in _render_bands(grids, width, height, tile):
+                if band is not None:
+                    # the writer is behind: wait for it a frame at a time
+                    while bands.qsize() >= QUEUED and writer.is_alive():
+                        yield
+                    if not writer.is_alive():
+                        return
+                    bands.put(band)
+                yield
+        except BaseException as e:
+            bands.put(e)
+            raise
+        bands.put(None)
+
+    return scheduler.run(render())
+
+
+def export_archive(out_dir, game_ids=None):
+    """Export archived games (default: all) to <out_dir>/<game id>.png.
+
+    Returns [(game_id, path or None, error or None)].
+    """
+    import archive
+    if game_ids is None:
+        game_ids = [e.get('id') for e in archive.load_index() if e.get('id')]
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    for gid in game_ids:
+        body = archive.load_game(gid)
+        if body is None:
+            results.append((gid, None, 'not found'))
+            continue
+        path = os.path.join(out_dir, f'{gid}.png')
+        try:
+            export_png(body, path)
+            results.append((gid, path, None))
+        except Exception as e:
+            results.append((gid, None, str(e)))
+    return results
+
+
+def default_path(out_dir='exports'):
+    os.makedirs(out_dir, exist_ok=True)
+    return os.path.join(out_dir, time.strftime('score_%Y%m%d_%H%M%S.png'))
+
+
+def gl_context():
+    """Create the GL context Fbo rendering needs when running outside the app.
+
+    Kivy creates its GL context together with the core window, so this opens
+    the window (hidden by main()). Returns the window, or None when no window
+    provider could be loaded.
+    """
+    from kivy.core.window import Window
+    return Window
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    out_dir = 'exports'
+    if '--out' in argv:
+        i = argv.index('--out')
+        out_dir = argv[i + 1]
+        del argv[i:i + 2]
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    from kivy.config import Config
+    Config.set('graphics', 'window_state', 'hidden')
+    if gl_context() is None:
+        print('no GL context available')
+        return 1
+    failed = 0
+    for gid, path, err in export_archive(out_dir, argv or None):
+        if err:
+            failed += 1
+            print(f'{gid}: {err}')
+        else:
+            print(f'{gid}: {path}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
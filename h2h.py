@@ -0,0 +1,210 @@
+"""Head-to-head records between every pair of players, across all games.
+
+For each pair of players in a round we count who finished ahead (by the
+round's ranks, ranking.round_ranks) and add up the difference of their round
+totals. Players are keyed by ``ratings.player_id`` so the same person is one
+player in every game.
+
+The result is a sum of independent per-game contributions, each computed in
+one pass over that game's rounds. Contributions of archived games are cached
+in CACHE_NAME next to the archive, keyed by the game file's signature, and
+their sum is kept in memory: archiving a game adds just its contribution, a
+changed or deleted game takes its old one out, and the cache file is read
+once per process and written only when a game's entry changed. The current
+game's contribution is kept in memory too; appended rounds are folded in one
+by one and any other change recomputes that game alone.
+"""
+
+import archive
+import ratings
+from ranking import round_ranks
+
+CACHE_NAME = 'h2h.json'
+CACHE_VERSION = 1
+
+# per-pair record fields, from the point of view of the first player
+AHEAD, BEHIND, TIED, NET, ROUNDS = range(5)
+
+
+def _int(v):
+    try:
+        return int(v)
+    except Exception:
+        return None
+
+
+def new_result():
+    """{'pairs': {(a, b): [ahead, behind, tied, net, rounds]}, 'names': {id: name}}
+    with a < b; see record() for either order."""
+    return {'pairs': {}, 'names': {}}
+
+
+def fold_round(result, rd):
+    """Add one round dict to `result` in place."""
+    ranks = round_ranks(rd)
+    if len(ranks) < 2:
+        return
+    total = rd.get('total') if isinstance(rd.get('total'), dict) else {}
+    names = result['names']
+    field = []
+    for name, r in ranks.items():
+        pid = ratings.player_id(name)
+        names[pid] = name
+        field.append((pid, r, _int(total.get(name))))
+    field.sort()
+    pairs = result['pairs']
+    for i, (a, ra, ta) in enumerate(field):
+        for b, rb, tb in field[i + 1:]:
+            if a == b:
+                continue
+            rec = pairs.get((a, b))
+            if rec is None:
+                rec = pairs[(a, b)] = [0, 0, 0, 0, 0]
+            rec[AHEAD if ra < rb else BEHIND if ra > rb else TIED] += 1
+            if ta is not None and tb is not None:
+                rec[NET] += ta - tb
+            rec[ROUNDS] += 1
+
+
+def game_result(rounds):
+    """The contribution of one game's rounds, in one pass."""
+    result = new_result()
+    for rd in rounds or []:
+        fold_round(result, rd)
+    return result
+
+
+def merge(into, result, sign=1):
+    """Add `result` to `into` in place (subtract it with sign=-1) and return
+    `into`. Pairs left with no rounds are dropped."""
+    pairs = into['pairs']
+    for key, rec in result['pairs'].items():
+        mine = pairs.get(key)
+        if mine is None:
+            mine = pairs[key] = [0, 0, 0, 0, 0]
+        for i, v in enumerate(rec):
+            mine[i] += sign * v
+        if not mine[ROUNDS]:
+            del pairs[key]
+    if sign > 0:
+        into['names'].update(result['names'])
+    return into
+
+
+def copy_result(result):
+    return {'pairs': {k: list(v) for k, v in result['pairs'].items()}, 'names': dict(result['names'])}
+
+
+def record(result, a, b):
+    """[ahead, behind, tied, net, rounds] of player id `a` against `b`."""
+    if a < b:
+        return list(result['pairs'].get((a, b)) or (0, 0, 0, 0, 0))
+    rec = result['pairs'].get((b, a))
+    if rec is None:
+        return [0, 0, 0, 0, 0]
+    return [rec[BEHIND], rec[AHEAD], rec[TIED], -rec[NET], rec[ROUNDS]]
+
+
+# ---- archived games ----
+def _dump(result):
+    return {'pairs': [[a, b] + rec for (a, b), rec in result['pairs'].items()],
+            'names': result['names']}
+
+
+def _undump(doc):
+    result = new_result()
+    for item in doc.get('pairs') or []:
+        result['pairs'][(item[0], item[1])] = list(item[2:])
+    result['names'].update(doc.get('names') or {})
+    return result
+
+
+class _Archived:
+    """Contributions of the archived games and their running sum."""
+
+    def __init__(self):
+        # {archive id: (file signature, contribution)}; None until the cache
+        # file has been read
+        self.games = None
+        self.total = new_result()
+
+    def update(self):
+        cached = None
+        if self.games is None:
+            self.games = {}
+            cached = archive.load_derived_cache(CACHE_NAME, CACHE_VERSION)
+            if not isinstance(cached, dict):
+                cached = {}
+        sigs = {e.get('id'): list(archive.game_signature(e.get('id')) or ()) for e in archive.chronological()}
+        dirty = cached is not None and set(cached) != set(sigs)
+        for gid in [gid for gid, (sig, _r) in self.games.items() if sigs.get(gid) != sig]:
+            merge(self.total, self.games.pop(gid)[1], -1)
+            dirty = True
+        for gid, sig in sigs.items():
+            if gid in self.games:
+                continue
+            entry = (cached or {}).get(gid)
+            if isinstance(entry, dict) and entry.get('sig') == sig:
+                result = _undump(entry['h2h'])
+            else:
+                result = game_result(archive.read_game(gid)['rounds'])
+                dirty = True
+            self.games[gid] = (sig, result)
+            merge(self.total, result)
+        if dirty:
+            games = {gid: {'sig': sig, 'h2h': _dump(result)} for gid, (sig, result) in self.games.items()}
+            archive.save_derived_cache(CACHE_NAME, CACHE_VERSION, games)
+
+    def matrix(self, exclude=None):
+        """Sum over the archived games except `exclude` (a fresh copy)."""
+        self.update()
+        out = copy_result(self.total)
+        if exclude in self.games:
+            merge(out, self.games[exclude][1], -1)
+        return out
+
+
+_ARCHIVED = _Archived()
+
+
+# ---- the current game ----
+class _Live:
+    """Contribution of the current game's rounds seen so far."""
+
+    def __init__(self):
+        self.rev = None
+        self.count = 0
+        self.result = new_result()
+
+    def update(self, rounds):
+        import storage
+        changes = storage.STORE.changes_since(self.rev) if self.rev is not None else None
+        if changes is None or any(ch[0] != 'append' for ch in changes) or len(rounds) < self.count:
+            self.count = 0
+            self.result = new_result()
+        for rd in rounds[self.count:]:
+            fold_round(self.result, rd)
+        self.count = len(rounds)
+        self.rev = storage.STORE.revision
+        return self.result
+
+
+_LIVE = _Live()
+
+
+def matrix():
+    """Head-to-head records over every archived game and the current one."""
+    import storage
+    data = storage.load_data()
+    rounds = data.get('rounds') if isinstance(data.get('rounds'), list) else []
+    meta = data.get('meta') if isinstance(data.get('meta'), dict) else {}
+    return merge(_ARCHIVED.matrix(meta.get('archive_id')), _LIVE.update(rounds))
+
+
+def players(result):
+    """Player ids in `result`, most rounds played against others first."""
+    played = {}
+    for (a, b), rec in result['pairs'].items():
+        played[a] = played.get(a, 0) + rec[ROUNDS]
+        played[b] = played.get(b, 0) + rec[ROUNDS]
+    return sorted(played, key=lambda pid: (-played[pid], pid))
@@ -0,0 +1,281 @@
+"""Streaming, cancellable import of exported score files.
+
+``iter_document`` parses a JSON export incrementally and yields the rounds
+one at a time instead of loading the whole file; ``ImportJob`` runs that
+parser on a worker thread and hands rounds to the UI thread in chunks, where
+they are merged into the store, so a large import never blocks a frame.
+"""
+import codecs, json, os, re, threading
+
+import aggregates
+import ranking
+import storage
+
+CHUNK_BYTES = 64 * 1024
+CHUNK_ROUNDS = 200
+
+_WS = re.compile(r'[ \t\n\r]*')
+# characters that can continue a JSON number
+_NUM_TAIL = re.compile(r'[0-9.eE+\-]*')
+_DECODER = json.JSONDecoder()
+
+
+class _Stream:
+    """Buffered text reader with just enough structure for a JSON object."""
+
+    def __init__(self, f, chunk_size=CHUNK_BYTES):
+        self._f = f
+        self._chunk = chunk_size
+        self._dec = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        raw = self._f.read(self._chunk)
+        self.bytes_read += len(raw)
+        if not raw:
+            self.eof = True
+        text = self._dec.decode(raw, final=not raw)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f'expected {ch!r} at byte ~{self.bytes_read}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # a number running up to the end of the buffer ("2." | "75") may
+            # continue in the next chunk
+            if not self.eof and isinstance(obj, (int, float)) and \
+                    _NUM_TAIL.match(self.buf, end).end() == len(self.buf):
+                self._fill()
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_document(path, chunk_size=CHUNK_BYTES):
+    """Yield ('round', dict) for each round and ('key', name, value) for every
+    other top-level entry of a JSON export, plus ('progress', fraction) as
+    the file is consumed. Raises ValueError if the file is not a JSON object.
+    """
+    size = max(1, os.path.getsize(path))
+    with open(path, 'rb') as f:
+        st = _Stream(f, chunk_size)
+        st.expect('{')
+        if st.peek() == '}':
+            return
+        while True:
+            key = st.value()
+            if not isinstance(key, str):
+                raise ValueError('object key expected')
+            st.expect(':')
+            if key == 'rounds' and st.peek() == '[':
+                st.pos += 1
+                if st.peek() == ']':
+                    st.pos += 1
+                else:
+                    while True:
+                        yield ('round', st.value())
+                        yield ('progress', min(1.0, st.bytes_read / size))
+                        nxt = st.peek()
+                        st.pos += 1
+                        if nxt == ']':
+                            break
+                        if nxt != ',':
+                            raise ValueError('malformed rounds array')
+            else:
+                yield ('key', key, st.value())
+            nxt = st.peek()
+            st.pos += 1
+            if nxt == '}':
+                break
+            if nxt != ',':
+                raise ValueError('malformed object')
+    yield ('progress', 1.0)
+
+
+def _iter_binary(path):
+    from binfmt import BinaryGameReader
+    with BinaryGameReader(path) as r:
+        yield ('key', 'players', list(r.players))
+        for k, v in r.extra.items():
+            yield ('key', k, v)
+        n = max(1, len(r))
+        for i in range(len(r)):
+            yield ('round', r.round(i))
+            yield ('progress', (i + 1) / n)
+
+
+def iter_import(path):
+    from binfmt import is_binary_path
+    if is_binary_path(path):
+        return _iter_binary(path)
+    return iter_document(path)
+
+
+def _post_to_ui(fn):
+    try:
+        from kivy.clock import Clock
+        Clock.schedule_once(lambda dt: fn(), 0)
+    except Exception:
+        fn()
+
+
+class ImportJob:
+    """Import `path` in 'merge' or 'replace' mode without blocking the UI.
+
+    Parsing happens on a worker thread. Every CHUNK_ROUNDS rounds a chunk is
+    posted to the UI thread and merged into the store there (merge mode) or
+    staged (replace mode). ``on_progress(fraction)`` and ``on_done(result)``
+    are called on the UI thread; ``result`` has 'ok', 'cancelled', 'rounds'
+    and 'error'. A cancelled merge is rolled back to the original rounds.
+
+    Merging is idempotent: rounds already in the game (by content hash or
+    round id, see roundindex.py) are skipped and counted in 'skipped', and
+    rounds whose id is known but whose content differs are left out and
+    counted in 'conflicts'.
+    """
+
+    def __init__(self, path, mode='merge', on_progress=None, on_done=None,
+                 chunk_rounds=CHUNK_ROUNDS, post=None):
+        self.path = path
+        self.mode = mode
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.chunk_rounds = chunk_rounds
+        self._post = post or _post_to_ui
+        self._cancel = threading.Event()
+        self._thread = None
+        self._base_count = None
+        self._merged = 0
+        self._merger = None
+        self._staged = []
+        self._finished = False
+
+    def start(self):
+        # one compaction after the import instead of one per chunk
+        storage.hold_compaction()
+        if self.mode == 'merge':
+            data = storage.load_data()
+            self._base_count = len(data.get('rounds') or [])
+            # snapshot of the existing rounds; the hash-join runs per chunk
+            self._merger = storage.round_index().merger()
+        self._thread = threading.Thread(target=self._run, name='score-import', daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    # ---- worker thread ----
+    def _run(self):
+        chunk = []
+        keys = {}
+        last_progress = -1.0
+        try:
+            for ev in iter_import(self.path):
+                if self._cancel.is_set():
+                    break
+                kind = ev[0]
+                if kind == 'round':
+                    chunk.append(ev[1])
+                    if len(chunk) >= self.chunk_rounds:
+                        self._post(lambda c=chunk: self._apply(c))
+                        chunk = []
+                elif kind == 'key':
+                    keys[ev[1]] = ev[2]
+                elif kind == 'progress':
+                    # throttle UI updates to whole percents
+                    if ev[1] - last_progress >= 0.01 or ev[1] >= 1.0:
+                        last_progress = ev[1]
+                        self._post(lambda p=ev[1]: self._progress(p))
+        except Exception as e:
+            self._post(lambda err=str(e): self._finish(error=err))
+            return
+        if self._cancel.is_set():
+            self._post(self._finish)
+            return
+        if chunk:
+            self._post(lambda c=chunk: self._apply(c))
+        self._post(lambda: self._finish(keys=keys))
+
+    # ---- UI thread ----
+    def _progress(self, fraction):
+        if self.on_progress is not None and not self._finished:
+            try:
+                self.on_progress(fraction)
+            except Exception:
+                pass
+
+    def _apply(self, rounds):
+        if self._cancel.is_set() or self._finished:
+            return
+        rounds = [rd for rd in rounds if isinstance(rd, dict)]
+        for rd in rounds:
+            ranking.ensure_score_ranks(rd)
+        if self.mode == 'merge':
+            rounds = self._merger.filter(rounds)
+            storage.append_rounds(rounds)
+            self._merged += len(rounds)
+        else:
+            self._staged.extend(rounds)
+
+    def _finish(self, keys=None, error=None):
+        if self._finished:
+            return
+        self._finished = True
+        result = {'ok': False, 'cancelled': self._cancel.is_set(), 'rounds': 0,
+                  'skipped': 0, 'conflicts': 0, 'error': error}
+        if error is not None or result['cancelled']:
+            if self.mode == 'merge' and self._merged:
+                storage.STORE.truncate_rounds(self._base_count)
+        else:
+            keys = keys or {}
+            if self.mode == 'merge':
+                data = storage.load_data()
+                if keys.get('players') and not data.get('players'):
+                    data['players'] = keys.get('players')
+                    storage.save_data(data)
+                result['rounds'] = self._merged
+                result['skipped'] = self._merger.skipped
+                result['conflicts'] = self._merger.conflicts
+            else:
+                doc = dict(keys)
+                # the imported file's accumulators are not trusted; they are
+                # rebuilt from the imported rounds on first use
+                aggregates.invalidate(doc)
+                doc['rounds'] = self._staged
+                doc.setdefault('players', [])
+                storage.save_data(doc)
+                result['rounds'] = len(doc['rounds'])
+            result['ok'] = True
+        storage.release_compaction()
+        if self.on_done is not None:
+            try:
+                self.on_done(result)
+            except Exception:
+                pass
@@ -1,7 +1,7 @@
 from typing import Dict, List
 
 from kivy.metrics import sp, dp
-from theme import ROW_HEIGHT, FONT_NAME
+from theme import ROW_HEIGHT, FONT_NAME, FA_FONT
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
@@ -13,7 +13,12 @@ from kivy.uix.filechooser import FileChooserListView
 from kivy.uix.textinput import TextInput
 
 from widgets import L, ScoreInputItem, IconButton, IconTextButton, TrophyWidget, BTN
-from storage import load_data, save_data, to_int, DUN_VALUE
+from storage import load_data, save_data, append_round, to_int, DUN_VALUE
+from roundindex import new_round_id
+from ranking import competition_ranks
+import scheduler
+import lifecycle
+from reconcile import Reconciler, reorder
 from kivy.app import App
 from kivy.core.window import Window
 from kivy.clock import Clock
@@ -67,6 +72,8 @@ class InputScreen(Screen):
 		self.rows_container = GridLayout(cols=1, spacing=8, size_hint_y=None)
 		self.rows_container.bind(minimum_height=self.rows_container.setter('height'))
 		self.middle.add_widget(self.rows_container)
+		self._rows = Reconciler(self.rows_container, self._create_player_row,
+			patch=self._patch_player_row, remove=self._remove_player_row)
 		root.add_widget(self.middle)
 
 		# Local save bar: the 保存本局 按钮 lives only on the Input screen (visible when this screen is active)
@@ -95,17 +102,17 @@ class InputScreen(Screen):
 		self.add_widget(outer)
 
 	def set_players(self, players: List[str]):
-		"""Store the players list and clear previous input maps."""
-		# store and clear previous inputs
+		"""Store the players list; rows of players that left are dropped
+		together with their input map entries, and the rows that stay start
+		over with empty inputs."""
 		self.players = list(players) if players else []
-		self.hand_inputs.clear()
-		self.dun_inputs.clear()
-		self.row_by_name.clear()
 		# Debug: print received players so we can verify SetupScreen handed them over
 		try:
 			print(f"[DEBUG] InputScreen.set_players called with: {self.players}")
 		except Exception:
 			pass
+		# kept rows would otherwise still show the last round's values
+		self._clear_inputs()
 		# rebuild rows according to players length and pass the names so they are filled
 		self._build_player_rows(len(self.players), names=self.players)
 		# ensure the scrollview scrolls to bottom so the save button (under rows) is visible
@@ -116,6 +123,14 @@ class InputScreen(Screen):
 			pass
 
 
+	def _clear_inputs(self):
+		"""Reset every row's inputs to their initial values."""
+		for row in list(self.rows_container.children):
+			try:
+				row.input_container.reset()
+			except Exception:
+				pass
+
 	def _find_row_for_widget(self, widget):
 		"""Walk up from `widget` to find the direct child of rows_container.
 		Returns the row BoxLayout or None.
@@ -151,54 +166,119 @@ class InputScreen(Screen):
 			self._start_simple_drag(row, touch)
 
 	def _build_player_rows(self, n: int, names: List[str] = None):
-		# clear
-		self.rows_container.clear_widgets()
-		if n <= 0:
-			return
+		# rows are keyed by player (see reconcile.py): rows of players that
+		# stay are kept with their inputs and only re-ranked, new players get
+		# new rows, built in frame-budgeted slices (see scheduler.py)
+		items = []
+		seen = set()
 		for i in range(1, n + 1):
-			# horizontal row: rank | trophy | input container
-			row = BoxLayout(orientation='horizontal', size_hint_y=None, height=dp(56), spacing=8)
-			# rank (use styled label so color/font are correct)
-			rank_lbl = L(text=str(i), font_size=sp(16), size_hint_x=None, width=dp(36))
-			row.add_widget(rank_lbl)
-
-			# trophy: use lightweight TrophyWidget (no gray background)
-			if i == 1:
-				w = TrophyWidget(rank=1, size=36)
-			elif i == n:
-				w = TrophyWidget(rank='last', size=36)
-			else:
-				w = TrophyWidget(rank=None, size=36)
-			row.add_widget(w)
-
-			# input container (ScoreInputItem) - name displayed inside the container at first position
-			# determine name for this row
 			name_text = ''
 			if names and len(names) >= i:
 				name_text = names[i-1]
-			container = ScoreInputItem(name=name_text)
-			# remember inputs so they can be queried/saved later. Use a stable key: the provided name if present,
-			# otherwise fall back to an index-based key so maps remain usable.
 			key = name_text if name_text else f"player{i}"
+			if key in seen:
+				key = f"{key}#{i}"
+			seen.add(key)
+			items.append((key, (name_text, i, n)))
+		if not items:
+			scheduler.cancel('input:rows')
+			self._rows.update([])
+			return
+		scheduler.run(self._rows.iter_update(items), tag='input:rows', on_done=self._after_player_rows)
+
+	def _create_player_row(self, rkey, props):
+		name_text, i, n = props
+		# horizontal row: rank | trophy | input container
+		row = BoxLayout(orientation='horizontal', size_hint_y=None, height=dp(56), spacing=8)
+		# rank (use styled label so color/font are correct)
+		rank_lbl = L(text=str(i), font_size=sp(16), size_hint_x=None, width=dp(36))
+		row.add_widget(rank_lbl)
+
+		# trophy: use lightweight TrophyWidget (no gray background)
+		if i == 1:
+			w = TrophyWidget(rank=1, size=36)
+		elif i == n:
+			w = TrophyWidget(rank='last', size=36)
+		else:
+			w = TrophyWidget(rank=None, size=36)
+		row.add_widget(w)
+
+		# input container (ScoreInputItem) - name displayed inside the container at first position
+		container = ScoreInputItem(name=name_text)
+		# remember inputs so they can be queried/saved later, under the row's
+		# reconciler key (the name, playerN without one, name#i for a repeat)
+		key = rkey
+		try:
+			self.hand_inputs[key] = container.base_input
+		except Exception:
+			pass
+		try:
+			self.dun_inputs[key] = container.dun_input
+		except Exception:
+			pass
+		row.add_widget(container)
+
+		# expose row attributes for later access
+		row.rank_label = rank_lbl
+		row.trophy_label = w
+		row.name_label = container.name_label
+		row.input_container = container
+		row.input_key = key
+		# remember row by its key (see above)
+		self.row_by_name[key] = row
+		lifecycle.own(self.name, row)
+		# bind long-press on name to start a simple overlay drag
+		try:
+			if row.name_label is not None:
+				row.name_label.bind(on_long_press=self._on_name_long_press_global)
+		except Exception:
+			pass
+		return row
+
+	def _patch_player_row(self, row, props):
+		_name_text, i, n = props
+		self._set_row_rank(row, i - 1, n)
+
+	def _remove_player_row(self, rkey, row):
+		key = getattr(row, 'input_key', None)
+		lifecycle.release(self.name, row)
+		if key is None:
+			return
+		if self.row_by_name.get(key) is row:
+			self.row_by_name.pop(key, None)
+		container = getattr(row, 'input_container', None)
+		if self.hand_inputs.get(key) is getattr(container, 'base_input', None):
+			self.hand_inputs.pop(key, None)
+		if self.dun_inputs.get(key) is getattr(container, 'dun_input', None):
+			self.dun_inputs.pop(key, None)
+
+	def _set_row_rank(self, row, idx, count):
+		"""Position-based rank number and trophy for the row at top->bottom `idx`."""
+		rank_lbl = getattr(row, 'rank_label', None)
+		if rank_lbl is not None:
 			try:
-				self.hand_inputs[key] = container.base_input
+				rank_lbl.text = str(idx + 1)
 			except Exception:
 				pass
+		# update trophy: top gets gold, bottom gets gray, others empty
+		trophy_lbl = getattr(row, 'trophy_label', None)
+		if trophy_lbl is not None:
 			try:
-				self.dun_inputs[key] = container.dun_input
+				glyph = '\uf091' if FA_FONT else '🏆'
+				if idx == 0:
+					# gold trophy
+					trophy_lbl.text = glyph
+					trophy_lbl.color = (1.0, 0.84, 0.0, 1)
+				elif idx == count - 1:
+					# gray trophy for last
+					trophy_lbl.text = glyph
+					trophy_lbl.color = (0.6, 0.6, 0.63, 1)
+				else:
+					trophy_lbl.text = ''
 			except Exception:
 				pass
-			row.add_widget(container)
 
-			# expose row attributes for later access
-			row.rank_label = rank_lbl
-			row.trophy_label = w
-			row.name_label = container.name_label
-			row.input_container = container
-			# remember row by stable key (name or playerN)
-			self.row_by_name[key] = row
-
-			self.rows_container.add_widget(row)
+	def _after_player_rows(self):
 		# Debug: show what was rendered and what input mappings we saved
 		try:
 			rendered = [getattr(r, 'name_label').text if getattr(r, 'name_label', None) is not None else '' for r in self.rows_container.children[::-1]]
@@ -214,16 +294,11 @@ class InputScreen(Screen):
 		except Exception:
 			pass
 
-		# bind long-press on name to start a simple overlay drag (no reordering yet)
+		# kept rows may have been dragged since they were ranked
 		try:
-			# bind global handler to each name_label so drag can be started regardless of re-renders
-			for row in list(self.rows_container.children)[::-1]:
-				nl = getattr(row, 'name_label', None)
-				if nl is not None and hasattr(nl, 'bind'):
-					try:
-						nl.bind(on_long_press=self._on_name_long_press_global)
-					except Exception:
-						pass
+			rows = list(self.rows_container.children)[::-1]
+			for idx, row in enumerate(rows):
+				self._set_row_rank(row, idx, len(rows))
 		except Exception:
 			pass
 		# after rendering rows, update the middle ScrollView height so it hugs
@@ -306,18 +381,8 @@ class InputScreen(Screen):
 			pass
 		# actually render
 		try:
-			self.rows_container.clear_widgets()
-			# add in top->bottom order so children[::-1] yields the same top->bottom
-			for w in top_down_list:
-				self.rows_container.add_widget(w)
-			# ensure each row's name_label is bound to our global handler (survives re-renders)
-			for row in list(self.rows_container.children)[::-1]:
-				nl = getattr(row, 'name_label', None)
-				if nl is not None and hasattr(nl, 'bind'):
-					try:
-						nl.bind(on_long_press=self._on_name_long_press_global)
-					except Exception:
-						pass
+			# move only the rows that changed place (see reconcile.py)
+			reorder(self.rows_container, list(top_down_list))
 		except Exception:
 			pass
 		# debug: after adding, show actual children top->bottom
@@ -339,29 +404,7 @@ class InputScreen(Screen):
 			children_tb = list(self.rows_container.children)[::-1]
 			count = len(children_tb)
 			for idx, row in enumerate(children_tb):
-				# update rank label text to reflect position (1-based)
-				rank_lbl = getattr(row, 'rank_label', None)
-				if rank_lbl is not None:
-					try:
-						rank_lbl.text = str(idx + 1)
-					except Exception:
-						pass
-				# update trophy: top gets gold, bottom gets gray, others empty
-				trophy_lbl = getattr(row, 'trophy_label', None)
-				if trophy_lbl is not None:
-					try:
-						if idx == 0:
-							# gold trophy
-							trophy_lbl.text = '🏆'
-							trophy_lbl.color = (1.0, 0.84, 0.0, 1)
-						elif idx == count - 1:
-							# gray trophy for last
-							trophy_lbl.text = '🏆'
-							trophy_lbl.color = (0.6, 0.6, 0.63, 1)
-						else:
-							trophy_lbl.text = ''
-					except Exception:
-						pass
+				self._set_row_rank(row, idx, count)
 		except Exception:
 			pass
 
@@ -599,6 +642,8 @@ class InputScreen(Screen):
 
 	def _on_save_round(self, *_):
 		"""Collect current inputs and persist a new round to storage."""
+		# the rows may still be mid-build; read them only once they are complete
+		scheduler.finish('input:rows')
 		try:
 			data = load_data() or {}
 		except Exception:
@@ -655,6 +700,7 @@ class InputScreen(Screen):
 
 		# build round dict similar to existing format
 		round_obj = {
+			"id": new_round_id(),
 			"breakdown": {
 				"basic": basic,
 				"dun": dun_vals,
@@ -662,20 +708,27 @@ class InputScreen(Screen):
 			},
 			"total": total,
 			"ranks": ranks,
+			# score order with ties sharing a rank (1224)
+			"ranks_by_score": competition_ranks(total),
 		}
 
 		# append and save
 		try:
-			if 'rounds' not in data or data.get('rounds') is None:
-				data['rounds'] = []
-			data['rounds'].append(round_obj)
-			# ensure players list exists and contains current known players (preserve order if available)
-			try:
-				if not data.get('players'):
+			if data.get('players'):
+				# common case: one small journal append instead of rewriting the whole history
+				append_round(round_obj)
+			else:
+				if 'rounds' not in data or data.get('rounds') is None:
+					data['rounds'] = []
+				data['rounds'].append(round_obj)
+				# ensure players list exists and contains current known players (preserve order if available)
+				try:
 					data['players'] = [getattr(r, 'text', '').strip() or f"player{i+1}" for i, r in enumerate(children_tb)]
-			except Exception:
-				pass
-			save_data(data)
+				except Exception:
+					pass
+				save_data(data)
+			# the next round starts from empty inputs
+			self._clear_inputs()
 			try:
 				# use unified overlay so the confirmation is always visible
 				self._overlay_dialog('保存', '保存本局成功')
@@ -720,7 +773,7 @@ class InputScreen(Screen):
 		if FONT_NAME:
 			_label_kwargs['font_name'] = FONT_NAME
 		header = Label(text='导入 JSON', **_label_kwargs)
-		chooser = FileChooserListView(path='.', filters=['*.json'], size_hint=(1,1))
+		chooser = FileChooserListView(path='.', filters=['*.json', '*.psb'], size_hint=(1,1))
 		_info_kwargs = {'size_hint_y': None, 'height': dp(44), 'color': (0,0,0,1)}
 		if FONT_NAME:
 			_info_kwargs['font_name'] = FONT_NAME
@@ -758,39 +811,63 @@ class InputScreen(Screen):
 			except Exception:
 				pass
 
+		job_ref = {'job': None}
+
+		def _on_progress(fraction):
+			try:
+				info.text = f'导入中… {int(fraction * 100)}%  (点击取消可中止)'
+			except Exception:
+				pass
+
+		def _on_done(result):
+			job_ref['job'] = None
+			_dismiss()
+			if result.get('error'):
+				self._safe_popup('导入失败', result['error'])
+			elif result.get('cancelled'):
+				self._safe_popup('导入取消', '已取消导入，数据未改变')
+			elif mode_ref.get('mode') == 'merge':
+				msg = f"已合并导入 {result.get('rounds', 0)} 局"
+				if result.get('skipped'):
+					msg += f"，跳过重复 {result['skipped']} 局"
+				if result.get('conflicts'):
+					msg += f"，{result['conflicts']} 局与本地记录冲突（保留本地）"
+				self._safe_popup('导入成功', msg)
+			else:
+				self._safe_popup('导入成功', '已覆盖并导入')
+
+		mode_ref = {}
+
 		def _do_import(mode):
+			if job_ref['job'] is not None:
+				return
 			sel = chooser.selection
 			if not sel:
 				self._safe_popup('导入失败', '未选择文件')
 				return
 			path = sel[0]
-			from storage import safe_load_json, load_data, save_data
-			imp = safe_load_json(path)
-			if not isinstance(imp, dict):
-				self._safe_popup('导入失败', '文件内容不是合法 JSON 对象')
+			from importer import ImportJob
+			mode_ref['mode'] = mode
+			try:
+				merge_btn.disabled = True
+				replace_btn.disabled = True
+			except Exception:
+				pass
+			_on_progress(0)
+			# parse on a worker thread; chunks are merged back on the UI thread
+			job_ref['job'] = ImportJob(path, mode=mode, on_progress=_on_progress, on_done=_on_done).start()
+
+		def _on_cancel(*_a):
+			job = job_ref['job']
+			if job is not None:
+				# the job rolls back and then calls _on_done, which dismisses
+				job.cancel()
 				return
-			if mode == 'merge':
-				data = load_data() or {'players': [], 'rounds': []}
-				if imp.get('rounds'):
-					data.setdefault('rounds', []).extend(imp.get('rounds') or [])
-				if imp.get('players') and not data.get('players'):
-					data['players'] = imp.get('players')
-				try:
-					save_data(data)
-					self._safe_popup('导入成功', '已合并导入')
-				except Exception as e:
-					self._safe_popup('导入失败', str(e))
-			else:
-				try:
-					save_data(imp)
-					self._safe_popup('导入成功', '已覆盖并导入')
-				except Exception as e:
-					self._safe_popup('导入失败', str(e))
 			_dismiss()
 
 		merge_btn.bind(on_press=lambda *_: _do_import('merge'))
 		replace_btn.bind(on_press=lambda *_: _do_import('replace'))
-		cancel_btn.bind(on_press=_dismiss)
+		cancel_btn.bind(on_press=_on_cancel)
 
 	def export_json_dialog(self):
 		"""Open an export dialog allowing user to pick a directory and filename
@@ -821,7 +898,7 @@ class InputScreen(Screen):
 		_info_kwargs = {'size_hint_y': None, 'height': dp(36), 'color': (0,0,0,1)}
 		if FONT_NAME:
 			_info_kwargs['font_name'] = FONT_NAME
-		info = Label(text='选择目录并输入文件名，然后点击保存。', **_info_kwargs)
+		info = Label(text='选择目录并输入文件名，然后点击保存（以 .psb 结尾则保存为二进制格式）。', **_info_kwargs)
 
 		btn_row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(8))
 		save_btn = Button(text='保存', background_normal='', background_color=(0.8,0.9,1,1), color=(0,0,0,1), **({'font_name': FONT_NAME} if FONT_NAME else {}))
@@ -859,9 +936,14 @@ class InputScreen(Screen):
 				return
 			full = os.path.join(dirpath, fname)
 			from storage import load_data, safe_save_json
+			from binfmt import is_binary_path, dump_binary
 			try:
 				data = load_data() or {}
-				safe_save_json(full, data)
+				if is_binary_path(full):
+					# compact columnar format for large archives
+					dump_binary(data, full)
+				else:
+					safe_save_json(full, data)
 				self._safe_popup('导出成功', f'已保存到 {full}')
 			except Exception as e:
 				self._safe_popup('导出失败', str(e))
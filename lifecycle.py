@@ -0,0 +1,84 @@
+"""Ownership and live-widget accounting per screen.
+
+Screens register the widgets they build with ``own(owner, widget)`` and hand
+them back with ``release`` when they take them down. Ownership is weak, so
+it never keeps a widget alive; what it gives is a count of the owned widgets
+that are still alive, which ``report`` puts next to the number of widgets
+actually mounted in each screen's tree. A widget that is alive but no longer
+mounted ("detached") is one that something still references after its
+screen dropped it, which is what a leak looks like.
+"""
+import gc
+import weakref
+
+_owned = {}
+
+
+def own(owner, widget):
+    """Record `widget` as built by `owner` (a screen name); returns it."""
+    try:
+        _owned.setdefault(owner, weakref.WeakSet()).add(widget)
+    except TypeError:
+        pass
+    return widget
+
+
+def own_tree(owner, root):
+    """own() `root` and every widget under it; returns `root`."""
+    for w in _walk(root):
+        own(owner, w)
+    return root
+
+
+def release(owner, widget):
+    """Take `widget` down: detach it, drop its children and forget it."""
+    owned = _owned.get(owner)
+    if owned is not None:
+        owned.discard(widget)
+    teardown(widget)
+
+
+def teardown(widget):
+    try:
+        parent = widget.parent
+        if parent is not None:
+            parent.remove_widget(widget)
+    except Exception:
+        pass
+    try:
+        widget.clear_widgets()
+    except Exception:
+        pass
+
+
+def _walk(widget):
+    stack = [widget]
+    while stack:
+        w = stack.pop()
+        yield w
+        stack.extend(getattr(w, 'children', ()))
+
+
+def mounted(root):
+    """Number of widgets in the tree under `root`, root included."""
+    return sum(1 for _w in _walk(root))
+
+
+def report(manager, collect=True):
+    """{screen name: {'mounted', 'owned', 'detached'}} for a ScreenManager.
+
+    With collect=True garbage is collected first, so 'owned' counts only
+    widgets that something still references.
+    """
+    if collect:
+        gc.collect()
+    out = {}
+    for screen in list(getattr(manager, 'screens', ())):
+        tree = set(map(id, _walk(screen)))
+        owned = list(_owned.get(screen.name, ()))
+        out[screen.name] = {
+            'mounted': len(tree),
+            'owned': len(owned),
+            'detached': sum(1 for w in owned if id(w) not in tree),
+        }
+    return out
@@ -7,13 +7,18 @@ from kivy.uix.floatlayout import FloatLayout
 
 # Lightweight entry that restores theme/meta on startup and saves them on exit.
 from screens import SetupScreen, InputScreen, ScoreScreen, StatisticsScreen
-from storage import load_data, save_data
+from storage import load_data, save_data, flush as flush_data
 from theme import apply_theme
 import theme as _theme
 from widgets import IconTextButton
 from kivy.clock import Clock
+import os
 import time
 
+# set POKER_DEBUG_LIFECYCLE=1 to print live widget counts per screen on each
+# tab switch (walks every screen's widget tree, so it is off by default)
+DEBUG_LIFECYCLE = bool(os.environ.get('POKER_DEBUG_LIFECYCLE'))
+
 
 class PokerScoreApp(App):
     def build(self):
@@ -28,6 +33,12 @@ class PokerScoreApp(App):
             data = load_data() or {}
         except Exception:
             data = {}
+        # older rounds lack score-order ranks: add them in one pass (one save)
+        try:
+            import ranking
+            ranking.backfill_store()
+        except Exception:
+            pass
         meta = data.get('meta', {}) if isinstance(data, dict) else {}
         theme_name = meta.get('theme')
         try:
@@ -120,6 +131,12 @@ class PokerScoreApp(App):
                         pass
                 except Exception:
                     pass
+                # drop half-built content of the screen we are leaving
+                try:
+                    import scheduler
+                    scheduler.cancel_except(name)
+                except Exception:
+                    pass
                 # set current immediately so UI switches; run heavier init on next frame
                 try:
                     try:
@@ -135,6 +152,13 @@ class PokerScoreApp(App):
                     print(f"[NAV-DBG] ts={time.time():.3f} requested={name} sm.current={getattr(sm,'current',None)} root_children={root_children}")
                 except Exception:
                     pass
+                # live widgets per screen: 'detached' should stay at 0
+                if DEBUG_LIFECYCLE:
+                    try:
+                        import lifecycle
+                        print(f"[LIFECYCLE] {lifecycle.report(sm, collect=False)}")
+                    except Exception:
+                        pass
                 try:
                     def _do_init(dt):
                         try:
@@ -201,7 +225,7 @@ class PokerScoreApp(App):
                                 else:
                                     # clear board when game not started
                                     try:
-                                        scr.board_box.clear_widgets()
+                                        scr.clear_board()
                                     except Exception:
                                         pass
                         except Exception:
@@ -326,27 +350,14 @@ class PokerScoreApp(App):
                 except Exception:
                     pass
                 try:
-                    # refresh score board (rebuild uses theme constants)
+                    # board cells resolve theme colors when shown; just refresh them
                     scr_score = sm.get_screen('score')
-                    if hasattr(scr_score, 'rebuild_board'):
-                        scr_score.rebuild_board()
-                except Exception:
-                    pass
-                try:
-                    # let setup screen refresh any loaded UI
-                    scr_setup = sm.get_screen('setup')
-                    if hasattr(scr_setup, 'refresh_loaded'):
-                        scr_setup.refresh_loaded()
-                except Exception:
-                    pass
-                try:
-                    # re-render input rows so ranks/trophy colors update
-                    scr_input = sm.get_screen('input')
-                    if hasattr(scr_input, 'rows_container') and hasattr(scr_input, '_render_rows_from_order'):
-                        children_tb = list(scr_input.rows_container.children)[::-1]
-                        scr_input._render_rows_from_order(children_tb)
+                    if hasattr(scr_score, 'restyle_board'):
+                        scr_score.restyle_board()
                 except Exception:
                     pass
+                # labels, inputs and buttons on the other screens are bound to
+                # theme.STATE and recolor themselves; nothing is rebuilt here
 
             try:
                 _theme.register_theme_listener(_on_theme_change)
@@ -394,8 +405,30 @@ class PokerScoreApp(App):
                 exp_btn.size_hint_x = 1
             except Exception:
                 pass
+            img_btn = IconTextButton(text='导出图片', icon='file-download')
+            img_btn.size_hint_x = 1
+
+            def _export_image(*_a):
+                notify = sm.get_screen('input')._safe_popup
+
+                def _done(path, error):
+                    img_btn.disabled = False
+                    if error:
+                        notify('导出失败', error)
+                    else:
+                        notify('导出成功', f'已保存到 {path}')
+                try:
+                    # one export at a time; the button comes back when it is written
+                    img_btn.disabled = True
+                    sm.get_screen('score').export_image(on_done=_done)
+                except Exception as e:
+                    img_btn.disabled = False
+                    notify('导出失败', str(e))
+
+            img_btn.bind(on_release=_export_image)
             global_ops.add_widget(imp_btn)
             global_ops.add_widget(exp_btn)
+            global_ops.add_widget(img_btn)
             # add to content (bottom of the page container)
             try:
                 content.add_widget(global_ops)
@@ -451,6 +484,11 @@ class PokerScoreApp(App):
             save_data(data)
         except Exception:
             pass
+        # saves are group-committed; make sure the last one reaches the disk
+        try:
+            flush_data()
+        except Exception:
+            pass
 
 
 if __name__ == '__main__':
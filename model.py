@@ -0,0 +1,194 @@
+"""Compact typed view of the score document.
+
+The JSON document keeps every round as five dicts keyed by player name. Here
+a ``Game`` holds an interned player table and each ``Round`` keeps one
+``array`` of ints per field, indexed by player position, plus a bitmask of
+which players have a value. Classes use ``__slots__`` so large histories stay
+small, and ``Game.to_dict()`` round-trips to the original schema.
+"""
+import sys
+from array import array
+
+import ranking
+
+# field name -> location of the per-player map inside a round dict
+FIELDS = (
+    ('basic', ('breakdown', 'basic')),
+    ('dun', ('breakdown', 'dun')),
+    ('duns_raw', ('breakdown', 'duns_raw')),
+    ('total', ('total',)),
+    ('rank', ('ranks',)),
+    ('rank_by_score', ('ranks_by_score',)),
+)
+FIELD_NAMES = tuple(f for f, _ in FIELDS)
+_LOC = dict(FIELDS)
+
+
+class Player:
+    __slots__ = ('name', 'index')
+
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+    def __repr__(self):
+        return f"Player({self.name!r}, {self.index})"
+
+
+class Round:
+    """One round: an int array per field plus a presence mask per field.
+
+    A field whose map was absent in the JSON has ``None`` for both array and
+    mask. Rounds that cannot be represented as ints keep their original dict
+    in ``raw`` and are written back unchanged.
+    """
+    __slots__ = FIELD_NAMES + ('masks', 'extra', 'raw')
+
+    def __init__(self):
+        for f in FIELD_NAMES:
+            setattr(self, f, None)
+        self.masks = {}
+        self.extra = None
+        self.raw = None
+
+    def get(self, field, idx, default=0):
+        col = getattr(self, field)
+        if col is None or idx >= len(col) or not (self.masks[field] >> idx) & 1:
+            return default
+        return col[idx]
+
+    def rank_field(self):
+        """Column of the ranks this round is ranked by (see ranking.rank_key)."""
+        if self.raw is not None:
+            rd = self.raw
+        else:
+            # a mask is non-zero exactly when its rank map is non-empty
+            rd = {ranking.DRAG_KEY: self.masks.get('rank'), ranking.SCORE_KEY: self.masks.get('rank_by_score')}
+        return 'rank' if ranking.rank_key(rd) == ranking.DRAG_KEY else 'rank_by_score'
+
+    def has(self, field, idx):
+        col = getattr(self, field)
+        return col is not None and idx < len(col) and bool((self.masks[field] >> idx) & 1)
+
+
+def _lookup(rd, loc):
+    parent = rd
+    for k in loc[:-1]:
+        parent = parent.get(k) if isinstance(parent, dict) else None
+    if isinstance(parent, dict):
+        return parent.get(loc[-1])
+    return None
+
+
+class Game:
+    __slots__ = ('players', 'names', '_index', 'rounds', 'extra')
+
+    def __init__(self, players=()):
+        self.names = []
+        self._index = {}
+        self.players = []
+        for p in players:
+            idx = self.intern(p)
+            self.players.append(Player(self.names[idx], idx))
+        self.rounds = []
+        self.extra = {}
+
+    def intern(self, name):
+        """Return the position of `name` in the player table, adding it if new."""
+        idx = self._index.get(name)
+        if idx is None:
+            name = sys.intern(str(name))
+            idx = len(self.names)
+            self.names.append(name)
+            self._index[name] = idx
+        return idx
+
+    def index_of(self, name):
+        return self._index.get(name)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data if isinstance(data, dict) else {}
+        game = cls(p for p in (data.get('players') or []) if isinstance(p, str))
+        for rd in data.get('rounds') or []:
+            game.append_dict(rd)
+        game.extra = {k: v for k, v in data.items() if k not in ('players', 'rounds')}
+        return game
+
+    def append_dict(self, rd):
+        """Convert one JSON round and append it; returns the Round."""
+        r = Round()
+        try:
+            cols = {}
+            for f, loc in FIELDS:
+                mp = _lookup(rd, loc)
+                if mp is None:
+                    continue
+                if not isinstance(mp, dict):
+                    raise ValueError(f)
+                cols[f] = mp
+            for mp in cols.values():
+                for name in mp:
+                    self.intern(name)
+            width = len(self.names)
+            for f, mp in cols.items():
+                col = array('q', bytes(8 * width))
+                mask = 0
+                for name, v in mp.items():
+                    if type(v) is not int:
+                        raise ValueError(name)
+                    i = self._index[name]
+                    col[i] = v
+                    mask |= 1 << i
+                setattr(r, f, col)
+                r.masks[f] = mask
+            known = {'breakdown', 'total', 'ranks', 'ranks_by_score'}
+            extra = {k: v for k, v in rd.items() if k not in known}
+            bd = rd.get('breakdown')
+            if isinstance(bd, dict):
+                rest = {k: v for k, v in bd.items() if k not in ('basic', 'dun', 'duns_raw')}
+                if rest or not any(f in cols for f in ('basic', 'dun', 'duns_raw')):
+                    extra['breakdown'] = rest
+            elif 'breakdown' in rd:
+                raise ValueError('breakdown')
+            r.extra = extra or None
+        except Exception:
+            r = Round()
+            r.raw = rd
+        self.rounds.append(r)
+        return r
+
+    def value(self, rnd, field, name, default=0):
+        if rnd.raw is not None:
+            mp = _lookup(rnd.raw, _LOC[field])
+            return mp.get(name, default) if isinstance(mp, dict) else default
+        idx = self._index.get(name)
+        return default if idx is None else rnd.get(field, idx, default)
+
+    def round_to_dict(self, rnd):
+        if rnd.raw is not None:
+            return rnd.raw
+        out = {}
+        extra = dict(rnd.extra or {})
+        bd_rest = extra.pop('breakdown', None)
+        if bd_rest is not None or any(getattr(rnd, f) is not None for f in ('basic', 'dun', 'duns_raw')):
+            out['breakdown'] = dict(bd_rest or {})
+        for f, loc in FIELDS:
+            col = getattr(rnd, f)
+            if col is None:
+                continue
+            mask = rnd.masks[f]
+            parent = out
+            for k in loc[:-1]:
+                parent = parent.setdefault(k, {})
+            parent[loc[-1]] = {self.names[i]: col[i] for i in range(len(col)) if (mask >> i) & 1}
+        out.update(extra)
+        return out
+
+    def to_dict(self):
+        data = {
+            'players': [p.name for p in self.players],
+            'rounds': [self.round_to_dict(r) for r in self.rounds],
+        }
+        data.update(self.extra)
+        return data
@@ -0,0 +1,124 @@
+"""Score-order ranks of a round.
+
+Every round carries the drag order the players were put in (``ranks``) and
+the ranks their totals give (``ranks_by_score``). Score ranks use standard
+competition ranking: higher total ranks first and equal totals share the
+best rank, with the next rank skipped ("1224"). ``ranks_by_score`` is
+derived data, so it is left out of round content hashes (roundindex.py).
+"""
+DRAG_KEY = 'ranks'
+SCORE_KEY = 'ranks_by_score'
+
+
+def competition_ranks(scores):
+    """{name: rank} for {name: score}, higher scores first, ties share."""
+    items = []
+    for name, v in scores.items():
+        try:
+            items.append((int(v), name))
+        except Exception:
+            pass
+    items.sort(key=lambda it: -it[0])
+    ranks = {}
+    prev = None
+    for i, (v, name) in enumerate(items):
+        if v != prev:
+            rank, prev = i + 1, v
+        ranks[name] = rank
+    return ranks
+
+
+def _frac_ranks(xs):
+    return [sum(1 for y in xs if y < x) + (sum(1 for y in xs if y == x) + 1) / 2.0 for x in xs]
+
+
+def pair_agreement(pts):
+    """(tau, rho, discordant) of one round's [(drag rank, score rank)] pairs:
+    Kendall tau-b, Spearman rho (Pearson correlation of tie-averaged ranks)
+    and the number of discordant pairs. tau/rho are None with fewer than two
+    players or when either order is all ties."""
+    conc = disc = n1 = n2 = 0
+    for i in range(len(pts)):
+        for j in range(i + 1, len(pts)):
+            a = (pts[i][0] > pts[j][0]) - (pts[i][0] < pts[j][0])
+            b = (pts[i][1] > pts[j][1]) - (pts[i][1] < pts[j][1])
+            conc += a * b > 0
+            disc += a * b < 0
+            n1 += a != 0
+            n2 += b != 0
+    tau = (conc - disc) / (n1 * n2) ** 0.5 if n1 * n2 else None
+    rho = None
+    if len(pts) > 1:
+        fd = _frac_ranks([p[0] for p in pts])
+        fs = _frac_ranks([p[1] for p in pts])
+        md, ms = sum(fd) / len(fd), sum(fs) / len(fs)
+        cov = sum((x - md) * (y - ms) for x, y in zip(fd, fs))
+        den = (sum((x - md) ** 2 for x in fd) * sum((y - ms) ** 2 for y in fs)) ** 0.5
+        rho = cov / den if den else None
+    return tau, rho, disc
+
+
+def rank_key(rd):
+    """Key of the ranks a round dict is ranked by: the drag order, falling
+    back to the score ranks when it is empty."""
+    return DRAG_KEY if rd.get(DRAG_KEY) or not rd.get(SCORE_KEY) else SCORE_KEY
+
+
+def round_ranks(rd):
+    """{name: int rank} of a round dict, by rank_key(); ranks that are not
+    numbers are left out."""
+    if not isinstance(rd, dict):
+        return {}
+    ranks = rd.get(rank_key(rd))
+    if not isinstance(ranks, dict):
+        return {}
+    out = {}
+    for name, r in ranks.items():
+        try:
+            out[name] = int(r)
+        except Exception:
+            pass
+    return out
+
+
+def ensure_score_ranks(rd):
+    """Fill in a round's missing ``ranks_by_score``; True if it was added."""
+    if not isinstance(rd, dict) or rd.get(SCORE_KEY):
+        return False
+    total = rd.get('total')
+    if not isinstance(total, dict) or not total:
+        return False
+    ranks = competition_ranks(total)
+    if not ranks:
+        return False
+    rd[SCORE_KEY] = ranks
+    return True
+
+
+def backfill(data):
+    """Add ``ranks_by_score`` to every round of `data` lacking it, in one
+    pass; returns how many rounds changed."""
+    rounds = data.get('rounds') if isinstance(data, dict) else None
+    if not isinstance(rounds, list):
+        return 0
+    changed = 0
+    for rd in rounds:
+        if ensure_score_ranks(rd):
+            changed += 1
+    return changed
+
+
+def backfill_store():
+    """backfill() the current game and save it once if anything changed.
+
+    The aggregates are dropped then: their fingerprint leaves score ranks
+    out, so it would not notice the rank counts they were built from changed.
+    """
+    import aggregates
+    import storage
+    data = storage.load_data()
+    changed = backfill(data)
+    if changed:
+        aggregates.invalidate(data)
+        storage.save_data(data)
+    return changed
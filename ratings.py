@@ -0,0 +1,234 @@
+"""Player ratings across every game, updated round by round.
+
+Each round with ranks is scored as a set of pairwise matches: a player who
+finished ahead of another won against them, equal ranks draw. Every pairwise
+result moves ratings Elo-style, scaled by K / (n - 1) so a round is worth
+the same whatever the table size. Ratings start at DEFAULT and are keyed by
+``player_id`` (normalized name), so the same person in different games or
+spelled with stray spaces or different case is one player.
+
+Games are replayed in the order they were played: archived games oldest
+first, then the current game. The state after each archived game is cached
+in CACHE_NAME next to the archive, keyed by the game's file signature, so
+only the games from the earliest changed one on are replayed. The chain
+always covers every archived game. While one of them is open as the current
+game, the current game takes its place in that order: it is rated from the
+snapshot before it, and the archived games after it (kept in memory) are
+replayed on top whenever it changes, so a re-opened game moves ratings by
+what it did when it was archived. The shared cache is not touched for that.
+Within the current game the rounds seen so far are remembered by content
+hash with a checkpoint every CHECKPOINT rounds; a saved round is one
+O(players^2) step, and after an edit or import only the rounds from the
+earliest changed one (from the checkpoint before it) are replayed.
+"""
+import unicodedata
+
+import archive
+from ranking import round_ranks
+from roundindex import round_hash
+
+DEFAULT = 1500.0
+K = 32.0
+CHECKPOINT = 100
+CACHE_NAME = 'ratings.json'
+CACHE_VERSION = 1
+
+
+def player_id(name):
+    """Stable identity of a player name: NFKC, trimmed, case-folded."""
+    return ' '.join(unicodedata.normalize('NFKC', str(name)).split()).casefold()
+
+
+def new_state():
+    """{'r': {id: rating}, 'n': {id: rated rounds}, 'names': {id: display name}}"""
+    return {'r': {}, 'n': {}, 'names': {}}
+
+
+def copy_state(state):
+    return {k: dict(v) for k, v in state.items()}
+
+
+def rate_round(state, rd):
+    """Apply one round dict to `state` in place."""
+    ranks = round_ranks(rd)
+    if len(ranks) < 2:
+        return
+    rating, rounds, names = state['r'], state['n'], state['names']
+    field = []
+    for name, r in ranks.items():
+        pid = player_id(name)
+        names[pid] = name
+        field.append((pid, r, rating.get(pid, DEFAULT)))
+    k = K / (len(field) - 1)
+    for pid, r, own in field:
+        delta = 0.0
+        for other, ro, theirs in field:
+            if other == pid:
+                continue
+            score = 1.0 if r < ro else 0.5 if r == ro else 0.0
+            expected = 1.0 / (1.0 + 10.0 ** ((theirs - own) / 400.0))
+            delta += score - expected
+        rating[pid] = own + k * delta
+        rounds[pid] = rounds.get(pid, 0) + 1
+
+
+def rate_game(state, rounds):
+    for rd in rounds:
+        rate_round(state, rd)
+    return state
+
+
+# ---- archived games ----
+def _chain():
+    """[{'id', 'sig', 'state'}]: ratings after each archived game, oldest
+    first, replaying only the games after the longest still-valid cached
+    prefix. The chain covers every archived game, so it does not depend on
+    which one is open."""
+    games = [(e['id'], list(archive.game_signature(e['id']) or ())) for e in archive.chronological()]
+    cached = archive.load_derived_cache(CACHE_NAME, CACHE_VERSION, k=K)
+    if not isinstance(cached, list):
+        cached = []
+    keep = 0
+    for (gid, sig), snap in zip(games, cached):
+        if snap.get('id') != gid or snap.get('sig') != sig:
+            break
+        keep += 1
+    if keep == len(games) and keep == len(cached):
+        return cached
+    chain = cached[:keep]
+    state = copy_state(chain[-1]['state']) if chain else new_state()
+    for gid, sig in games[keep:]:
+        rate_game(state, archive.read_game(gid)['rounds'])
+        chain.append({'id': gid, 'sig': sig, 'state': copy_state(state)})
+    archive.save_derived_cache(CACHE_NAME, CACHE_VERSION, chain, k=K)
+    return chain
+
+
+def archived_state(exclude=None):
+    """(ratings after the archived games played before `exclude`, ids of the
+    archived games played after it). `exclude` is the archive id of the game
+    currently open; without it, every archived game comes before. Reads the
+    shared chain and leaves the cache alone."""
+    chain = _chain()
+    ids = [snap['id'] for snap in chain]
+    if exclude not in ids:
+        return (copy_state(chain[-1]['state']) if chain else new_state()), []
+    i = ids.index(exclude)
+    return (copy_state(chain[i - 1]['state']) if i else new_state()), ids[i + 1:]
+
+
+# ---- the current game ----
+class _Live:
+    """Ratings through the rounds of the current game seen so far."""
+
+    def __init__(self):
+        self.base_key = None
+        self.base = None
+        self.rev = None
+        self.hashes = []
+        self.checkpoints = {}
+        self.state = None
+        # rounds of the archived games played after the current one, and
+        # the ratings after them as of `final_epoch` (bumped on every change
+        # of `state`)
+        self.later = []
+        self.epoch = 0
+        self.final = None
+        self.final_epoch = None
+
+    def reset(self, base_key, base, later=()):
+        self.base_key = base_key
+        self.base = base
+        self.hashes = []
+        self.checkpoints = {0: copy_state(base)}
+        self.state = copy_state(base)
+        self.later = list(later)
+        self.epoch += 1
+
+    def rewind(self, i):
+        """Go back to just before round i (via the checkpoint at or before it)."""
+        c = max(k for k in self.checkpoints if k <= i)
+        for k in [k for k in self.checkpoints if k > c]:
+            del self.checkpoints[k]
+        self.state = copy_state(self.checkpoints[c])
+        del self.hashes[c:]
+        self.epoch += 1
+
+    def fold(self, rounds):
+        if len(rounds) > len(self.hashes):
+            self.epoch += 1
+        for rd in rounds[len(self.hashes):]:
+            rate_round(self.state, rd)
+            self.hashes.append(round_hash(rd))
+            if len(self.hashes) % CHECKPOINT == 0:
+                self.checkpoints[len(self.hashes)] = copy_state(self.state)
+
+    def final_state(self):
+        """Ratings after the current game and the archived games after it."""
+        if not self.later:
+            return self.state
+        if self.final_epoch != self.epoch:
+            state = copy_state(self.state)
+            for rounds in self.later:
+                rate_game(state, rounds)
+            self.final = state
+            self.final_epoch = self.epoch
+        return self.final
+
+    def first_changed(self, rounds):
+        n = min(len(rounds), len(self.hashes))
+        for i in range(n):
+            if round_hash(rounds[i]) != self.hashes[i]:
+                return i
+        return n
+
+
+_LIVE = _Live()
+
+
+def _archive_key(exclude):
+    return (exclude, tuple((e.get('id'), archive.game_signature(e.get('id'))) for e in archive.chronological()))
+
+
+def current_state():
+    """(ratings after every game, ratings before the current game, ratings
+    right after it). The current game is rated at its place among the
+    archived games (last unless it was opened from the archive)."""
+    import storage
+    data = storage.load_data()
+    rounds = data.get('rounds') if isinstance(data.get('rounds'), list) else []
+    meta = data.get('meta') if isinstance(data.get('meta'), dict) else {}
+    exclude = meta.get('archive_id')
+    live = _LIVE
+    key = _archive_key(exclude)
+    if key != live.base_key:
+        base, later = archived_state(exclude)
+        live.reset(key, base, [archive.read_game(gid)['rounds'] for gid in later])
+        live.rev = None
+    changes = storage.STORE.changes_since(live.rev) if live.rev is not None else None
+    if changes is None:
+        start = live.first_changed(rounds)
+        if start < len(live.hashes):
+            live.rewind(start)
+    else:
+        edited = [ch[1] for ch in changes if ch[0] == 'update']
+        if edited and min(edited) < len(live.hashes):
+            live.rewind(min(edited))
+    if len(rounds) < len(live.hashes):
+        live.rewind(len(rounds))
+    live.fold(rounds)
+    live.rev = storage.STORE.revision
+    return live.final_state(), live.base, live.state
+
+
+def standings():
+    """[(display name, rating, rated rounds, change in the current game)],
+    best first."""
+    state, before, after = current_state()
+    out = []
+    for pid, r in state['r'].items():
+        start = before['r'].get(pid, DEFAULT)
+        out.append((state['names'].get(pid, pid), r, state['n'].get(pid, 0),
+                    after['r'].get(pid, start) - start))
+    out.sort(key=lambda it: -it[1])
+    return out
@@ -0,0 +1,174 @@
+"""Keyed reconciliation of screen content against what is already mounted.
+
+Screens describe their content as an ordered list of ``(key, props)`` pairs,
+keyed by something stable (player name, input slot, round id). ``Reconciler``
+remembers which widget it mounted for each key and the props it was built or
+last patched with, and on ``update`` it
+
+* removes the widgets whose key is gone,
+* creates widgets for new keys,
+* patches widgets whose props changed,
+* moves only the widgets that are out of order: the longest run of kept
+  widgets that is already in the right relative order stays where it is.
+
+Widgets whose key and props are unchanged are not touched at all, so a
+screen can describe its whole state on every refresh. The reconciler owns
+its container: children it did not mount are dropped on update.
+
+``diff_rows`` is the same idea for list-backed content (the canvas-drawn
+score board), where a "widget" is a row record at a position.
+"""
+from bisect import bisect_left
+
+
+def stable_keys(old_keys, new_keys):
+    """Keys present in both lists whose relative order can be kept
+    (a longest increasing subsequence of their new positions)."""
+    pos = {k: i for i, k in enumerate(new_keys)}
+    seq = [k for k in old_keys if k in pos]
+    # patience sorting with back-pointers, O(n log n)
+    tails, tail_idx, prev = [], [], [None] * len(seq)
+    for i, k in enumerate(seq):
+        p = pos[k]
+        j = bisect_left(tails, p)
+        if j == len(tails):
+            tails.append(p)
+            tail_idx.append(i)
+        else:
+            tails[j] = p
+            tail_idx[j] = i
+        prev[i] = tail_idx[j - 1] if j else None
+    out = set()
+    i = tail_idx[-1] if tail_idx else None
+    while i is not None:
+        out.add(seq[i])
+        i = prev[i]
+    return out
+
+
+def reorder(container, widgets, keep=None):
+    """Make `container`'s children exactly `widgets`, top to bottom.
+
+    Children not in `widgets` are removed; of the rest only those outside
+    `keep` (by default the longest run already in order) are moved.
+    """
+    wanted = {id(w) for w in widgets}
+    for w in list(container.children):
+        if id(w) not in wanted:
+            container.remove_widget(w)
+    current = list(container.children)[::-1]
+    if keep is None:
+        keep = stable_keys([id(w) for w in current], [id(w) for w in widgets])
+    moved = 0
+    for w in current:
+        if id(w) not in keep:
+            container.remove_widget(w)
+    for i, w in enumerate(widgets):
+        if id(w) in keep:
+            continue
+        # kivy keeps children bottom-first: index = widgets after this one
+        container.add_widget(w, index=len(container.children) - i)
+        moved += 1
+    return moved
+
+
+class Reconciler:
+    """Keeps one container's children in sync with a keyed description.
+
+    create(key, props) -> widget builds a new widget; patch(widget, props)
+    updates one in place (default: recreate it); remove(key, widget) is
+    called after a widget was unmounted.
+    """
+
+    def __init__(self, container, create, patch=None, remove=None):
+        self.container = container
+        self.create = create
+        self.patch = patch
+        self.remove = remove
+        self.mounted = {}
+        self.stats = {'added': 0, 'moved': 0, 'patched': 0, 'removed': 0}
+
+    def widget(self, key):
+        entry = self.mounted.get(key)
+        return entry[0] if entry else None
+
+    def keys(self):
+        """Mounted keys, top to bottom."""
+        by_id = {id(w): k for k, (w, _p) in self.mounted.items()}
+        return [by_id[id(w)] for w in self.container.children[::-1] if id(w) in by_id]
+
+    def update(self, items):
+        """Reconcile against `items`; returns the counts of this pass."""
+        for _ in self.iter_update(items):
+            pass
+        return dict(self.stats)
+
+    def iter_update(self, items):
+        """Generator version of update that yields after each widget it
+        creates, for use as a scheduler job (see scheduler.py)."""
+        stats = self.stats = {'added': 0, 'moved': 0, 'patched': 0, 'removed': 0}
+        container = self.container
+        items = list(items)
+        new_keys = [k for k, _p in items]
+        wanted = set(new_keys)
+        # drop children we do not own and keys that are gone
+        owned = {id(w) for w, _p in self.mounted.values()}
+        for w in list(container.children):
+            if id(w) not in owned:
+                container.remove_widget(w)
+        for key in [k for k in self.mounted if k not in wanted]:
+            w, _p = self.mounted.pop(key)
+            container.remove_widget(w)
+            stats['removed'] += 1
+            if self.remove is not None:
+                self.remove(key, w)
+        keep = stable_keys(self.keys(), new_keys)
+        for key in self.keys():
+            if key not in keep:
+                container.remove_widget(self.mounted[key][0])
+        for i, (key, props) in enumerate(items):
+            entry = self.mounted.get(key)
+            created = False
+            if entry is None:
+                w = self.create(key, props)
+                created = True
+                stats['added'] += 1
+            else:
+                w, old = entry
+                if old != props:
+                    if self.patch is not None:
+                        self.patch(w, props)
+                    else:
+                        if w.parent is container:
+                            container.remove_widget(w)
+                        w = self.create(key, props)
+                        keep.discard(key)
+                    stats['patched'] += 1
+                if key not in keep:
+                    stats['moved'] += 1
+            self.mounted[key] = (w, props)
+            if key not in keep:
+                container.add_widget(w, index=len(container.children) - i)
+            if created:
+                yield
+
+    def clear(self):
+        for key, (w, _p) in list(self.mounted.items()):
+            try:
+                self.container.remove_widget(w)
+            except Exception:
+                pass
+            if self.remove is not None:
+                self.remove(key, w)
+        self.mounted.clear()
+
+
+def diff_rows(old, new):
+    """Positions to redraw when row records `old` become `new`.
+
+    Records are (key, values) pairs. Returns (changed, cut): the indices
+    below min(len(old), len(new)) whose record differs, and the length both
+    lists share, from which rows are appended or truncated.
+    """
+    cut = min(len(old), len(new))
+    return [i for i in range(cut) if old[i] != new[i]], cut
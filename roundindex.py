@@ -0,0 +1,107 @@
+"""Content-hash index over the rounds of a game.
+
+Every round hashes to a stable digest of its canonical JSON (the optional
+``id`` key and the derived ``ranks_by_score`` excluded), so the same round
+imported twice is recognised no matter which file or device it came from.
+Rounds saved by this app also carry a random ``id``; a known id with a
+different digest is a conflict (the round was edited elsewhere) rather than
+a new round.
+"""
+import hashlib, json, uuid
+from collections import Counter
+
+ID_KEY = 'id'
+# keys left out of the content hash: the id, and ranks derived from totals
+# (backfilled into old rounds, see ranking.py)
+_UNHASHED = (ID_KEY, 'ranks_by_score')
+
+
+def new_round_id():
+    return uuid.uuid4().hex[:16]
+
+
+def round_hash(rd):
+    """Hex digest of the round content, independent of key order, id and
+    derived score ranks."""
+    if isinstance(rd, dict) and any(k in rd for k in _UNHASHED):
+        rd = {k: v for k, v in rd.items() if k not in _UNHASHED}
+    try:
+        text = json.dumps(rd, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    except Exception:
+        text = repr(rd)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _round_id(rd):
+    rid = rd.get(ID_KEY) if isinstance(rd, dict) else None
+    return rid if isinstance(rid, str) and rid else None
+
+
+class RoundIndex:
+    """Multiset of round hashes plus id -> hash for the rounds of a game."""
+    __slots__ = ('counts', 'ids')
+
+    def __init__(self, rounds=()):
+        self.counts = Counter()
+        self.ids = {}
+        for rd in rounds:
+            self.add(rd)
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def add(self, rd):
+        h = round_hash(rd)
+        self.counts[h] += 1
+        rid = _round_id(rd)
+        if rid is not None:
+            self.ids[rid] = h
+        return h
+
+    def merger(self):
+        return Merger(self)
+
+
+class Merger:
+    """Classifies incoming rounds against a snapshot of a RoundIndex.
+
+    Each existing round matches at most one incoming round, so a file that
+    legitimately holds two identical rounds still merges both once, and
+    merging the same file again adds nothing.
+    """
+
+    def __init__(self, index):
+        self._avail = Counter(index.counts)
+        self._ids = dict(index.ids)
+        self.new = 0
+        self.skipped = 0
+        self.conflicts = 0
+
+    def classify(self, rd):
+        """Return 'new', 'duplicate' or 'conflict' and update the counters."""
+        h = round_hash(rd)
+        rid = _round_id(rd)
+        if rid is not None and rid in self._ids:
+            if self._ids[rid] == h:
+                self._take(h)
+                self.skipped += 1
+                return 'duplicate'
+            self.conflicts += 1
+            return 'conflict'
+        if rid is None and self._avail.get(h):
+            self._take(h)
+            self.skipped += 1
+            return 'duplicate'
+        self.new += 1
+        return 'new'
+
+    def _take(self, h):
+        n = self._avail.get(h, 0)
+        if n > 1:
+            self._avail[h] = n - 1
+        else:
+            self._avail.pop(h, None)
+
+    def filter(self, rounds):
+        """The rounds of `rounds` that are new, in order."""
+        return [rd for rd in rounds if self.classify(rd) == 'new']
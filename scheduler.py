@@ -0,0 +1,154 @@
+"""Cooperative, frame-budgeted runner for heavy UI work.
+
+A job is a generator that does a small slice of work (build one row, one
+chunk of board rows, ...) between ``yield``s. Jobs run on the Kivy clock: each
+frame the scheduler resumes pending jobs until FRAME_BUDGET seconds are
+spent, then lets the frame render. The first budget is spent immediately when
+a job is started, so the content that comes first (what is on screen) shows
+up in the same frame.
+
+A job that raises is logged and marked ``failed``; its ``on_done`` is not
+called, so a view never records a half-built result as current.
+
+Jobs carry a tag such as ``'score:board'``. Starting a job cancels the
+pending job with the same tag, and ``cancel_except('input')`` drops every job
+not belonging to the 'input' screen, which is what a tab switch does.
+"""
+import time, traceback
+
+FRAME_BUDGET = 0.008
+
+_jobs = []
+_event = None
+
+
+class Job:
+    __slots__ = ('tag', 'gen', 'on_done', 'done', 'cancelled', 'failed')
+
+    def __init__(self, tag, gen, on_done=None):
+        self.tag = tag
+        self.gen = gen
+        self.on_done = on_done
+        self.done = False
+        self.cancelled = False
+        self.failed = False
+
+    def step(self):
+        """Run one slice; returns False once the job has finished or failed."""
+        try:
+            next(self.gen)
+            return True
+        except StopIteration:
+            pass
+        except Exception:
+            self.done = True
+            self.failed = True
+            _log_failure(self)
+            return False
+        self.done = True
+        if self.on_done is not None:
+            try:
+                self.on_done()
+            except Exception:
+                pass
+        return False
+
+    def cancel(self):
+        if self.done:
+            return
+        self.cancelled = True
+        self.done = True
+        try:
+            self.gen.close()
+        except Exception:
+            pass
+
+
+def _log_failure(job):
+    # called from the except block, so the traceback is the job's
+    try:
+        from kivy.logger import Logger
+        Logger.exception(f"Scheduler: job {job.tag!r} failed")
+    except Exception:
+        traceback.print_exc()
+
+
+def _clock():
+    from kivy.clock import Clock
+    return Clock
+
+
+def _ensure_ticking():
+    global _event
+    if _event is None and _jobs:
+        try:
+            _event = _clock().schedule_interval(_tick, 0)
+        except Exception:
+            # no clock (headless use): finish everything now
+            while _jobs:
+                _run(float('inf'))
+
+
+def _run(budget):
+    deadline = time.perf_counter() + budget
+    while _jobs and time.perf_counter() < deadline:
+        # round-robin so one long job cannot starve the others
+        job = _jobs.pop(0)
+        if job.done:
+            continue
+        if job.step():
+            _jobs.append(job)
+
+
+def _tick(dt):
+    global _event
+    _run(FRAME_BUDGET)
+    if not _jobs:
+        _event = None
+        return False
+
+
+def run(gen, tag=None, on_done=None, sync=True):
+    """Start generator `gen` as a job; returns the Job.
+
+    With sync=True the first FRAME_BUDGET of work runs before returning.
+    """
+    if tag is not None:
+        cancel(tag)
+    job = Job(tag, gen, on_done)
+    if sync:
+        deadline = time.perf_counter() + FRAME_BUDGET
+        while time.perf_counter() < deadline:
+            if not job.step():
+                return job
+    _jobs.append(job)
+    _ensure_ticking()
+    return job
+
+
+def pending(tag):
+    return any(j.tag == tag and not j.done for j in _jobs)
+
+
+def cancel(tag):
+    for job in list(_jobs):
+        if job.tag == tag:
+            job.cancel()
+            _jobs.remove(job)
+
+
+def cancel_except(screen):
+    """Cancel every tagged job whose tag is not '<screen>:...'."""
+    for job in list(_jobs):
+        if job.tag is not None and not job.tag.startswith(screen + ':'):
+            job.cancel()
+            _jobs.remove(job)
+
+
+def finish(tag):
+    """Run the pending job with `tag` to completion right now."""
+    for job in list(_jobs):
+        if job.tag == tag:
+            _jobs.remove(job)
+            while job.step():
+                pass
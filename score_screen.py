@@ -1,86 +1,172 @@
 from kivy.uix.screenmanager import Screen
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
-from kivy.metrics import dp
 
-from storage import load_data, save_data
-from theme import ROW_DARK, ROW_LIGHT, TOTAL_BG, ACCENT, ROW_HEIGHT
-from widgets import cell_bg, cell_bg_with_trophy
+from storage import load_data, save_data, load_model, STORE
+import aggregates
+import scheduler
+import lifecycle
+from board import ScoreBoard, round_values, round_row, total_cells
+from reconcile import diff_rows
+from roundindex import round_hash, ID_KEY
+
+# rounds appended to the board per scheduler slice during a full build
+BUILD_CHUNK = 40
+# rounds compared per slice when reconciling a reload against the board
+DIFF_CHUNK = 400
 
 
 class ScoreScreen(Screen):
     def __init__(self, **kw):
         super().__init__(**kw)
-        self.board_sv = ScrollView(size_hint=(1,1))
-        self.board_box = GridLayout(cols=1, size_hint_y=None, spacing=dp(6))
-        self.board_box.bind(minimum_height=self.board_box.setter('height'))
-        self.board_sv.add_widget(self.board_box)
-        self.add_widget(self.board_sv)
-        self._round_widgets = []
-        self._last_round_widgets = None
-
-    def rebuild_board(self):
-        self.board_box.clear_widgets()
-        data = load_data()
-        players = data.get('players', [])
-        rounds = data.get('rounds', [])
+        # canvas-drawn board: a fixed handful of widgets however many rounds
+        # there are (see board.py); clear_board drops the drawn data
+        self.board = lifecycle.own_tree(self.name, ScoreBoard())
+        self.add_widget(self.board)
+        self.clear_board()
+
+    def clear_board(self):
+        scheduler.cancel('score:board')
+        self.board.clear()
+        self._board_rev = None
+        self._board_players = None
+        # one (round key, values) record per board row
+        self._rows = []
+        self._highlight_ev = None
+
+    def rebuild_board(self, force=False):
+        """Bring the board up to date with the store.
+
+        Rounds appended or edited since the last call are applied as row
+        deltas; anything else (other players, a full save, force=True) reloads
+        the board's data, in frame-budgeted slices (see scheduler.py) with the
+        top rows first. A reload for the same players is reconciled against
+        the rows already drawn, so only the rows that differ are redrawn.
+        """
+        game = load_model()
+        players = tuple(pl.name for pl in game.players)
+        changes = None
+        if not force and self._board_rev is not None and players and players == self._board_players:
+            changes = STORE.changes_since(self._board_rev)
+        if changes is None:
+            self._build_full(game, players)
+            return
+        for ch in changes:
+            if ch[0] == 'append':
+                start = len(self._rows)
+                stop = min(ch[1] + ch[2], len(game.rounds))
+                if ch[1] == start and stop > start:
+                    self._append_rows(game, start, stop)
+            elif ch[0] == 'update' and ch[1] < len(self._rows):
+                self._patch_row(game, ch[1])
+        self._update_totals()
+        self._board_rev = STORE.revision
+
+    def restyle_board(self):
+        """Apply the current theme without touching the board's data."""
+        self.board.restyle()
+
+    def _build_full(self, game, players):
+        if players and players == self._board_players and self._board_rev is not None \
+                and not scheduler.pending('score:board'):
+            self._reconcile(game)
+            return
+        self.clear_board()
+        self._board_players = players
         if not players:
+            self._board_rev = STORE.revision
             return
-        cols = len(players) + 1
-        self.board_box.cols = cols
-        first_w = dp(120)
-        per_player_w = dp(100)
-        total_w = first_w + per_player_w * len(players)
-        self.board_box.size_hint_x = None
-        self.board_box.width = total_w
-        rows = max(1, len(rounds) + 2)
-        self.board_box.size_hint_y = None
-        self.board_box.height = ROW_HEIGHT * rows
-        header_bg = ROW_HEIGHT and (0.95,0.95,0.97,1)
-        self.board_box.add_widget(cell_bg("局/玩家", first_w, ROW_HEIGHT, header_bg))
-        for p in players:
-            self.board_box.add_widget(cell_bg(p, per_player_w, ROW_HEIGHT, header_bg))
-        for i, rd in enumerate(rounds, start=1):
-            this_round_widgets = []
-            totals = rd.get('total', {})
-            ranks = rd.get('ranks', {})
-            breakdown = rd.get('breakdown', {})
-            basics = breakdown.get('basic', {}) if isinstance(breakdown.get('basic', {}), dict) else {}
-            duns_raw = breakdown.get('duns_raw', {}) if isinstance(breakdown.get('duns_raw', {}), dict) else {}
-            bg = ROW_DARK if (i % 2 == 1) else ROW_LIGHT
-            round_text = f"第{i}局"
-            w = cell_bg(round_text, first_w, ROW_HEIGHT, bg)
-            self.board_box.add_widget(w)
-            this_round_widgets.append(w)
-            ranks_map = rd.get('ranks') or rd.get('ranks_by_score') or {}
-            for idx, p in enumerate(players, start=1):
-                t = totals.get(p, 0)
-                b = basics.get(p, 0)
-                d = duns_raw.get(p, 0)
-                text = f"{t}\n基:{b:+}  顿:{d}"
-                player_rank = ranks_map.get(p)
-                if player_rank == 1:
-                    w2 = cell_bg_with_trophy(text, per_player_w, ROW_HEIGHT, bg, rank=1)
-                elif player_rank == len(players):
-                    w2 = cell_bg_with_trophy(text, per_player_w, ROW_HEIGHT, bg, rank='last')
-                else:
-                    w2 = cell_bg(text, per_player_w, ROW_HEIGHT, bg)
-                self.board_box.add_widget(w2)
-                this_round_widgets.append(w2)
-            self._round_widgets.append(this_round_widgets)
-        if rounds:
-            total_bg = TOTAL_BG
-            self.board_box.add_widget(cell_bg("合计", first_w, ROW_HEIGHT, total_bg))
-            sum_total = {p: sum(r.get('total', {}).get(p, 0) for r in rounds) for p in players}
-            sum_basic = {p: sum((r.get('breakdown', {}).get('basic', {}) or {}).get(p, 0) for r in rounds) for p in players}
-            sum_duns_raw = {p: sum((r.get('breakdown', {}).get('duns_raw', {}) or {}).get(p, 0) for r in rounds) for p in players}
-            for p in players:
-                txt = f"基:{sum_basic.get(p,0):+}  顿:{sum_duns_raw.get(p,0)}\n总:{sum_total.get(p,0)}"
-                self.board_box.add_widget(cell_bg(txt, per_player_w, ROW_HEIGHT, total_bg))
-        try:
-            self._last_round_widgets = self._round_widgets[-1] if self._round_widgets else None
-        except Exception:
-            self._last_round_widgets = None
+        self.board.set_columns(players)
+        # totals come from the aggregates, so they can show before the rows
+        self._update_totals()
+        rev = STORE.revision
+        count = len(game.rounds)
+
+        def _rows():
+            for start in range(0, count, BUILD_CHUNK):
+                self._append_rows(game, start, min(count, start + BUILD_CHUNK))
+                yield
+
+        def _done():
+            # deltas that arrived during the build are applied next time
+            self._board_rev = rev
+
+        scheduler.run(_rows(), tag='score:board', on_done=_done)
+
+    def _reconcile(self, game):
+        """Diff the reloaded rounds against the drawn rows (see reconcile.py)."""
+        rev = STORE.revision
+        rounds = load_data().get('rounds') or []
+        count = min(len(game.rounds), len(rounds))
+        new = []
+
+        def _records():
+            for start in range(0, count, DIFF_CHUNK):
+                for i in range(start, min(count, start + DIFF_CHUNK)):
+                    new.append(self._row_record(game, rounds, i))
+                yield
+
+        def _apply():
+            changed, cut = diff_rows(self._rows, new)
+            for i in changed:
+                self._rows[i] = new[i]
+                label, cells = self._row_cells(i, new[i][1])
+                self.board.set_row(i, label, cells)
+            if len(self._rows) > cut:
+                del self._rows[cut:]
+                self.board.truncate_rows(cut)
+            if len(new) > cut:
+                rows = []
+                for i in range(cut, len(new)):
+                    rows.append(self._row_cells(i, new[i][1]))
+                    self._rows.append(new[i])
+                self.board.append_rows(rows)
+            self._update_totals()
+            self._board_rev = rev
+
+        scheduler.run(_records(), tag='score:board', on_done=_apply)
+
+    def _row_record(self, game, rounds, i):
+        rd = rounds[i]
+        key = rd.get(ID_KEY) if isinstance(rd, dict) else None
+        return (key or round_hash(rd), self._row_values(game, i))
+
+    def _row_values(self, game, i):
+        return round_values(game, i, self._board_players)
+
+    def _row_cells(self, i, vals):
+        return round_row(i, vals)
+
+    def _append_rows(self, game, start, stop):
+        rounds = load_data().get('rounds') or []
+        rows = []
+        for i in range(start, min(stop, len(rounds))):
+            record = self._row_record(game, rounds, i)
+            rows.append(self._row_cells(i, record[1]))
+            self._rows.append(record)
+        self.board.append_rows(rows)
+
+    def _patch_row(self, game, i):
+        record = self._row_record(game, load_data().get('rounds') or [], i)
+        self._rows[i] = record
+        label, cells = self._row_cells(i, record[1])
+        self.board.set_row(i, label, cells)
+
+    def _update_totals(self):
+        if not self._board_players or not load_data().get('rounds'):
+            self.board.set_totals([])
+            return
+        # persisted running aggregates: O(players) once they are current
+        totals = aggregates.player_totals(load_data(), self._board_players)
+        self.board.set_totals(total_cells(totals, self._board_players))
+
+    def export_image(self, path=None, on_done=None):
+        """Render the current game to a PNG without the board widgets (see
+        board_export.py), in the background; ``on_done(path, error)`` is
+        called once the file is written. Returns the file path."""
+        import board_export
+        path = path or board_export.default_path()
+        done = None if on_done is None else (lambda error: on_done(path, error))
+        board_export.export_png_async(load_data(), path, on_done=done)
+        return path
 
     def set_players(self, players):
         try:
@@ -96,58 +182,22 @@ class ScoreScreen(Screen):
             pass
 
     def highlight_last_round(self, duration=2.0):
-        widgets = getattr(self, '_last_round_widgets', None)
-        if not widgets:
+        scheduler.finish('score:board')
+        i = len(self._rows) - 1
+        if i < 0:
             return
-        saved_bg = []
-        saved_label = []
+        from kivy.clock import Clock
         try:
-            tint = (ACCENT[0], ACCENT[1], ACCENT[2], 0.18)
+            if self._highlight_ev is not None:
+                self._highlight_ev.cancel()
         except Exception:
-            tint = ACCENT
-        for cont in widgets:
-            try:
-                if hasattr(cont, '_bg_color_instr') and cont._bg_color_instr is not None:
-                    try:
-                        orig = tuple(getattr(cont._bg_color_instr, 'rgba', cont._bg_color or (1,1,1,1)))
-                    except Exception:
-                        orig = tuple(getattr(cont, '_bg_color', (1,1,1,1)))
-                    saved_bg.append((cont, orig))
-                    try:
-                        cont._bg_color_instr.rgba = tint
-                    except Exception:
-                        try:
-                            cont._bg_color = tint
-                        except Exception:
-                            pass
-                else:
-                    for ch in getattr(cont, 'children', []):
-                        if hasattr(ch, 'color'):
-                            saved_label.append((ch, ch.color))
-                            try:
-                                ch.color = ACCENT
-                            except Exception:
-                                pass
-            except Exception:
-                pass
+            pass
+        self.board.scroll_to_row(i)
+        self.board.set_highlight(i, True)
 
         def _restore(dt):
-            for cont, orig in saved_bg:
-                try:
-                    if hasattr(cont, '_bg_color_instr') and cont._bg_color_instr is not None:
-                        cont._bg_color_instr.rgba = orig
-                    else:
-                        try:
-                            cont._bg_color = orig
-                        except Exception:
-                            pass
-                except Exception:
-                    pass
-            for ch, col in saved_label:
-                try:
-                    ch.color = col
-                except Exception:
-                    pass
+            self._highlight_ev = None
+            if i < len(self._rows):
+                self.board.set_highlight(i, False)
 
-        from kivy.clock import Clock
-        Clock.schedule_once(_restore, duration)
+        self._highlight_ev = Clock.schedule_once(_restore, duration)
@@ -4,7 +4,11 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.metrics import dp
 
 from widgets import H, L, TI, IconButton, IconTextButton
-from storage import load_data, save_data, ensure_backup
+from storage import load_data, save_data, ensure_backup, STORE
+from archive import archive_game, load_index, load_game
+import scheduler
+import lifecycle
+from reconcile import Reconciler
 from theme import ROW_HEIGHT, CURRENT_THEME, ACCENT, FONT_NAME
 from kivy.uix.floatlayout import FloatLayout
 from kivy.graphics import Color, Rectangle
@@ -85,6 +89,10 @@ class SetupScreen(Screen):
         self.names_area = BoxLayout(orientation='vertical', spacing=dp(6), size_hint_y=None)
         self.names_area.bind(minimum_height=self.names_area.setter('height'))
         content.add_widget(self.names_area)
+        # name inputs keyed by slot: changing the count adds or drops only
+        # the inputs at the end, and typed names stay in their widgets
+        self._names = Reconciler(self.names_area, self._create_name_input, patch=self._patch_name_input,
+                                 remove=lambda _slot, ti: lifecycle.release(self.name, ti))
         btn_row = BoxLayout(size_hint_y=None, height=ROW_HEIGHT, spacing=dp(6))
         btn_reset = IconTextButton(text='重新开始', icon='delete')
         try:
@@ -110,6 +118,11 @@ class SetupScreen(Screen):
             pass
         btn_row.add_widget(start_btn)
         content.add_widget(btn_row)
+        # finished games archived on reset; only the small index is read here
+        content.add_widget(H(text='历史牌局', size_hint_y=None, height=dp(40)))
+        self.history_area = BoxLayout(orientation='vertical', spacing=dp(4), size_hint_y=None)
+        self.history_area.bind(minimum_height=self.history_area.setter('height'))
+        content.add_widget(self.history_area)
         self.refresh_loaded()
 
     def confirm_reset(self, *_):
@@ -119,7 +132,11 @@ class SetupScreen(Screen):
         if root is None:
             # fallback: perform reset without UI
             try:
-                ensure_backup('score_data.json')
+                archive_game(load_data())
+            except Exception:
+                pass
+            try:
+                ensure_backup(STORE.path)
             except Exception:
                 pass
             try:
@@ -184,9 +201,14 @@ class SetupScreen(Screen):
 
         def _do_reset(*_):
             try:
+                # keep the finished game in the archive before clearing it
+                try:
+                    archive_game(load_data())
+                except Exception:
+                    pass
                 # backup existing file if present
                 try:
-                    ensure_backup('score_data.json')
+                    ensure_backup(STORE.path)
                 except Exception:
                     pass
                 save_data({'players': [], 'rounds': []})
@@ -237,6 +259,69 @@ class SetupScreen(Screen):
             self.generate_name_inputs(prefill=self.players)
         else:
             self.generate_name_inputs(prefill=None)
+        self._render_history()
+
+    def _render_history(self):
+        area = getattr(self, 'history_area', None)
+        if area is None:
+            return
+        area.clear_widgets()
+        try:
+            entries = load_index()
+        except Exception:
+            entries = []
+        if not entries:
+            area.add_widget(L(text='暂无历史牌局', size_hint_y=None, height=dp(32)))
+            return
+        for e in entries:
+            totals = e.get('totals') or {}
+            winner = max(totals, key=lambda p: totals[p]) if totals else ''
+            date = (e.get('date') or '').replace('T', ' ')[:16]
+            txt = f"{date}  {e.get('rounds', 0)}局  {len(e.get('players') or [])}人"
+            if winner:
+                txt += f"  第一: {winner}({totals[winner]})"
+            row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(6))
+            row.add_widget(L(text=txt, halign='left'))
+            btn = IconTextButton(text='打开', icon='play', size_hint_x=None)
+            try:
+                btn.width = dp(86)
+            except Exception:
+                pass
+            btn.bind(on_press=lambda _b, gid=e.get('id'): self.open_archived_game(gid))
+            row.add_widget(btn)
+            area.add_widget(row)
+
+    def open_archived_game(self, game_id):
+        """Load an archived game's rounds and make it the current game."""
+        body = load_game(game_id)
+        if body is None:
+            return
+        try:
+            current = load_data() or {}
+        except Exception:
+            current = {}
+        # don't lose the game in progress
+        try:
+            archive_game(current)
+        except Exception:
+            pass
+        meta = dict(current.get('meta') or {}) if isinstance(current, dict) else {}
+        meta['archive_id'] = game_id
+        body['meta'] = meta
+        try:
+            save_data(body)
+        except Exception:
+            return
+        self.refresh_loaded()
+        try:
+            self.manager.get_screen('input').set_players(body.get('players') or [])
+        except Exception:
+            pass
+        try:
+            self.manager.get_screen('score').set_players(body.get('players') or [])
+            self.manager.current = 'score'
+        except Exception:
+            pass
 
     def generate_name_inputs(self, *_args, prefill=None):
         old = []
@@ -246,18 +331,31 @@ class SetupScreen(Screen):
                     old.append(ti.text)
         except Exception:
             old = []
-        self.names_area.clear_widgets()
+        # a build still in progress knows the names it was going to show
+        pending = getattr(self, '_pending_names', None)
+        if pending is not None and scheduler.pending('setup:names'):
+            old = pending
         n = max(self._min_players, min(self._max_players, int(getattr(self, 'count', 4))))
+        texts = []
         for i in range(n):
             pre = None
             if prefill and i < len(prefill):
                 pre = prefill[i]
             elif i < len(old):
                 pre = old[i]
-            ti = TI(text=(pre if pre is not None else f"玩家{i+1}"))
-            ti.size_hint_y = None
-            ti.height = dp(40)
-            self.names_area.add_widget(ti)
+            texts.append(pre if pre is not None else f"玩家{i+1}")
+        self._pending_names = texts
+        scheduler.run(self._names.iter_update(list(enumerate(texts))), tag='setup:names')
+
+    def _create_name_input(self, _slot, text):
+        ti = TI(text=text)
+        ti.size_hint_y = None
+        ti.height = dp(40)
+        return lifecycle.own(self.name, ti)
+
+    def _patch_name_input(self, ti, text):
+        if ti.text != text:
+            ti.text = text
 
     def _change_count(self, delta):
         try:
@@ -275,6 +373,7 @@ class SetupScreen(Screen):
             pass
 
     def start_game(self, *_):
+        scheduler.finish('setup:names')
         names = []
         for ti in reversed(self.names_area.children):
             names.append((ti.text or "").strip() or f"玩家{len(names)+1}")
@@ -289,6 +388,7 @@ class SetupScreen(Screen):
         self.manager.current = 'score'
 
     def start_and_input(self, *_):
+        scheduler.finish('setup:names')
         names = []
         for ti in reversed(self.names_area.children):
             names.append((ti.text or "").strip() or f"玩家{len(names)+1}")
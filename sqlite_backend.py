@@ -0,0 +1,173 @@
+"""Optional SQLite persistence for the storage module.
+
+Each round is one row (its JSON body keyed by position) and every other
+top-level key of the document one row of a key/value table, so appending a
+round inserts just that round and a full save rewrites only the rounds and
+document keys that changed (tracked by a content digest per round). The
+backend loads and saves the same document shape as ``storage.load_data()``
+/ ``storage.save_data()``; per-player figures come from the aggregates kept
+in the document (aggregates.py), not from queries.
+
+Migrate an existing JSON file once with::
+
+    python sqlite_backend.py [score_data.json] [score_data.db]
+
+After that ``storage`` picks the database up automatically on start.
+"""
+import hashlib, json, os, sqlite3
+
+import storage
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    seq INTEGER PRIMARY KEY,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS doc (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _dumps(v):
+    return json.dumps(v, ensure_ascii=False)
+
+
+def _digest(body):
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=16).digest()
+
+
+class SqliteBackend:
+    """storage backend keeping the document in an SQLite database."""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._conn = None
+        # what the database holds, as of the last load or write: one digest
+        # per round (by seq) and the JSON of every document key
+        self._digests = None
+        self._doc = None
+
+    @property
+    def path(self):
+        return self._path or storage.DB_FILE
+
+    def _db(self):
+        if self._conn is None:
+            # all calls are serialized by the storage lock, but the debounced
+            # writer runs on a timer thread
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.executescript(SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def signature(self):
+        try:
+            st = os.stat(self.path)
+            return (self.path, st.st_mtime_ns, st.st_size)
+        except Exception:
+            return (self.path, None)
+
+    def needs_compaction(self):
+        return False
+
+    def load(self):
+        db = self._db()
+        rounds, digests = [], []
+        for (body,) in db.execute('SELECT body FROM rounds ORDER BY seq'):
+            try:
+                rd = json.loads(body)
+            except Exception:
+                rd = {}
+            rounds.append(rd)
+            digests.append(_digest(body))
+        data = {'players': [], 'rounds': rounds}
+        doc = {}
+        for key, value in db.execute('SELECT key, value FROM doc'):
+            try:
+                data[key] = json.loads(value)
+                doc[key] = value
+            except Exception:
+                pass
+        self._digests = digests
+        self._doc = doc
+        return data
+
+    def write(self, data):
+        """Save `data`, touching only the rows that differ from the database."""
+        db = self._db()
+        data = data if isinstance(data, dict) else {}
+        if self._digests is None:
+            self.load()
+        bodies = [_dumps(rd) for rd in data.get('rounds') or []]
+        digests = [_digest(b) for b in bodies]
+        doc = {k: _dumps(v) for k, v in data.items() if k != 'rounds'}
+        doc.setdefault('players', '[]')
+        old = self._digests
+        with db:
+            if len(old) > len(bodies):
+                db.execute('DELETE FROM rounds WHERE seq >= ?', (len(bodies),))
+            db.executemany('INSERT OR REPLACE INTO rounds(seq, body) VALUES (?, ?)',
+                           [(seq, body) for seq, (body, d) in enumerate(zip(bodies, digests))
+                            if seq >= len(old) or old[seq] != d])
+            for key in set(self._doc) - set(doc):
+                db.execute('DELETE FROM doc WHERE key = ?', (key,))
+            db.executemany('INSERT OR REPLACE INTO doc(key, value) VALUES (?, ?)',
+                           [(k, v) for k, v in doc.items() if self._doc.get(k) != v])
+        self._digests = digests
+        self._doc = doc
+
+    def append_rounds(self, round_objs, at):
+        db = self._db()
+        bodies = [_dumps(rd) for rd in round_objs]
+        with db:
+            seq = db.execute('SELECT COALESCE(MAX(seq) + 1, 0) FROM rounds').fetchone()[0]
+            db.executemany('INSERT INTO rounds(seq, body) VALUES (?, ?)',
+                           [(seq + i, body) for i, body in enumerate(bodies)])
+        if self._digests is not None:
+            self._digests.extend(_digest(b) for b in bodies)
+        return False
+
+
+def migrate_json_to_sqlite(json_path=None, db_path=None, overwrite=False):
+    """Copy the JSON document (snapshot + journal) into a new database.
+
+    Switches the running store to the database when it was serving json_path.
+    Returns the backend, or None if db_path already exists and not overwrite.
+    """
+    json_path = json_path or storage.DATA_FILE
+    db_path = db_path or storage.DB_FILE
+    if os.path.exists(db_path) and not overwrite:
+        return None
+    storage.flush()
+    src = storage.JsonBackend(json_path)
+    backend = SqliteBackend(db_path)
+    backend.write(src.load())
+    try:
+        if isinstance(storage.STORE.backend, storage.JsonBackend) and \
+                os.path.abspath(storage.STORE.path) == os.path.abspath(json_path):
+            storage.use_backend(backend)
+    except Exception:
+        pass
+    return backend
+
+
+if __name__ == '__main__':
+    import sys
+    args = sys.argv[1:]
+    b = migrate_json_to_sqlite(args[0] if args else None, args[1] if len(args) > 1 else None)
+    if b is None:
+        print('database already exists; nothing to do')
+    else:
+        print(f'migrated to {b.path}')
@@ -1,25 +1,274 @@
+import itertools
+
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.label import Label
+from kivy.uix.scrollview import ScrollView
+from kivy.uix.widget import Widget
+from kivy.graphics import Color, Line, InstructionGroup
+from kivy.clock import Clock
+from kivy.logger import Logger
 from kivy.metrics import dp, sp
-from theme import TEXT_COLOR
+
+import theme as _theme
+from widgets import L, H
+from storage import load_data, STORE
+import aggregates
+from board import ScoreTable
+import scheduler
+import archive
+import ratings
+import h2h
+
+# (header, formatter of a per-player stats dict)
+COLUMNS = (
+    ('玩家', None),
+    ('局数', lambda st: str(st['rounds'])),
+    ('总分', lambda st: str(st['sum'])),
+    ('平均', lambda st: f"{st['mean']:.1f}"),
+    ('标准差', lambda st: f"{st['var'] ** 0.5:.1f}"),
+    ('最高', lambda st: '-' if st['max'] is None else str(st['max'])),
+    ('最低', lambda st: '-' if st['min'] is None else str(st['min'])),
+    ('胜率', lambda st: f"{st['win_rate'] * 100:.0f}%"),
+    ('末位率', lambda st: f"{st['last_rate'] * 100:.0f}%"),
+    ('名次分布', lambda st: ' '.join(f"{r}:{c}" for r, c in st['ranks'].items()) or '-'),
+    ('最长连胜', lambda st: str(st['win_streak'])),
+    ('最长连末', lambda st: str(st['last_streak'])),
+)
+
+RATING_COLUMNS = ('玩家', '等级分', '本局变化', '计分局数')
+RATINGS_TITLE = '等级分（所有对局）'
+H2H_TITLE = '对战记录（所有对局，行对列：领先-落后 净分差）'
+# what the cross-game sections can fail on: unreadable files or caches and
+# archived games listed in the index that cannot be read
+LOAD_ERRORS = (OSError, ValueError, archive.ArchiveError)
+
+# line colors of the cumulative chart, one per player (cycled)
+PALETTE = ((0.20, 0.50, 0.90, 1), (0.90, 0.35, 0.25, 1), (0.20, 0.70, 0.35, 1), (0.85, 0.65, 0.10, 1),
+           (0.55, 0.35, 0.80, 1), (0.10, 0.70, 0.75, 1), (0.90, 0.40, 0.65, 1), (0.45, 0.45, 0.45, 1))
+
+
+def _hex(color):
+    return ''.join(f"{int(c * 255):02x}" for c in color[:3])
+
+
+class CumulativeChart(Widget):
+    """Running total per player, one line each, drawn on the canvas.
+
+    Series are sampled down to at most one point per horizontal pixel, so
+    drawing cost depends on the widget's width, not on the number of rounds.
+    """
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.series = []
+        self._group = InstructionGroup()
+        self.canvas.add(self._group)
+        self._trigger = Clock.create_trigger(self._redraw, -1)
+        self.bind(pos=self._trigger, size=self._trigger)
+
+    def set_series(self, series):
+        """series: [(color, values)] with one value per round."""
+        self.series = series
+        self._trigger()
+
+    def _sample(self, n):
+        k = max(2, int(self.width))
+        if n <= k:
+            return list(range(n))
+        step = (n - 1) / (k - 1)
+        return [int(round(i * step)) for i in range(k)]
+
+    def _redraw(self, *_a):
+        g = self._group
+        g.clear()
+        g.add(Color(*_theme.TEXT_COLOR[:3], 0.25))
+        g.add(Line(rectangle=(self.x, self.y, self.width, self.height), width=1))
+        n = max((len(v) for _c, v in self.series), default=0)
+        if n < 2:
+            return
+        idx = self._sample(n)
+        # None (no value yet) is drawn as 0
+        sampled = [(c, [float(v[i] or 0) for i in idx]) for c, v in self.series if len(v) == n]
+        lo = min(min(v) for _c, v in sampled)
+        hi = max(max(v) for _c, v in sampled)
+        span = (hi - lo) or 1.0
+        pad = dp(4)
+        w, h = self.width - 2 * pad, self.height - 2 * pad
+        x0, y0 = self.x + pad, self.y + pad
+        if lo < 0 < hi:
+            # zero line
+            zy = y0 + (0 - lo) / span * h
+            g.add(Color(*_theme.TEXT_COLOR[:3], 0.35))
+            g.add(Line(points=[x0, zy, x0 + w, zy], width=1))
+        last = len(idx) - 1
+        for color, vals in sampled:
+            pts = []
+            for j, v in enumerate(vals):
+                pts.append(x0 + j / last * w)
+                pts.append(y0 + (v - lo) / span * h)
+            g.add(Color(*color))
+            g.add(Line(points=pts, width=dp(1.2)))
 
 
 class StatisticsScreen(Screen):
     def __init__(self, **kw):
         super().__init__(**kw)
-        root = BoxLayout(orientation='vertical', padding=dp(8))
+        # sections stacked at their natural heights in one vertical scroll
+        root = BoxLayout(orientation='vertical', padding=dp(8), spacing=dp(6), size_hint_y=None)
+        root.bind(minimum_height=root.setter('height'))
+        self.title = H('统计', size_hint_y=None, height=dp(36))
+        root.add_widget(self.title)
+        self.summary = L('', size_hint_y=None, height=dp(24))
+        root.add_widget(self.summary)
+
+        self.table, table_sv = self._table(len(COLUMNS), dp(84))
+        root.add_widget(table_sv)
+
+        # ratings across all games (see ratings.py)
+        self.ratings_title = L(RATINGS_TITLE, size_hint_y=None, height=dp(24))
+        root.add_widget(self.ratings_title)
+        self.ratings_table, ratings_sv = self._table(len(RATING_COLUMNS), dp(96))
+        root.add_widget(ratings_sv)
+
+        # head-to-head across all games (see h2h.py): row player vs column player
+        self.h2h_title = L(H2H_TITLE, size_hint_y=None, height=dp(24))
+        root.add_widget(self.h2h_title)
+        self.h2h_table, h2h_sv = self._table(1, dp(110))
+        root.add_widget(h2h_sv)
+
+        root.add_widget(L('累计得分', size_hint_y=None, height=dp(24)))
+        self.chart = CumulativeChart(size_hint_y=None, height=dp(200))
+        root.add_widget(self.chart)
+        self.legend = L('', markup=True, size_hint_y=None, height=dp(24), font_size=sp(13))
+        root.add_widget(self.legend)
+        # drag order vs score order (see aggregates.agreement)
+        self.agreement = L('', size_hint_y=None, height=dp(60), font_size=sp(13))
+        root.add_widget(self.agreement)
+        self.agreement_chart = CumulativeChart(size_hint_y=None, height=dp(120))
+        root.add_widget(self.agreement_chart)
+
+        outer = ScrollView(do_scroll_x=False, do_scroll_y=True)
+        outer.add_widget(root)
+        self.add_widget(outer)
+
+        self._rev = None
+        # table cells and chart lines resolve theme colors when drawn
+        _theme.STATE.fbind('name', self._restyle)
+
+    @staticmethod
+    def _table(cols, col_w):
+        """A ScoreTable in a horizontal scroller as tall as the table."""
+        table = ScoreTable(cols=cols, col_width=col_w)
+        sv = ScrollView(do_scroll_x=True, do_scroll_y=False, size_hint_y=None, height=0,
+                        scroll_type=['bars', 'content'])
+        sv.add_widget(table)
+        table.bind(height=lambda _t, h: setattr(sv, 'height', h))
+        return table, sv
+
+    def on_pre_enter(self, *_a):
+        self.refresh()
+
+    def refresh(self, force=False):
+        """Redraw when the store changed since the last time.
+
+        Everything shown comes from the running accumulators kept with the
+        game (aggregates.py) and the in-memory charts next to them, which
+        saved rounds extend as they are appended, so this is O(players). Only
+        when they have to be built (first visit, or after an import, reset or
+        edit) is the history folded in again, as a frame-budgeted job (see
+        scheduler.py).
+        """
+        data = load_data()
+        rev = STORE.revision
+        if not force and rev == self._rev:
+            return
+        if not aggregates.current(data) or not aggregates.charts_current(data):
+            scheduler.run(itertools.chain(aggregates.iter_ensure(data), aggregates.iter_charts(data)),
+                          tag='statistics:aggregates', on_done=lambda: self.refresh(force=True))
+            return
+        self._rev = rev
+        players = list(data.get('players') or [])
+        self.show_table(len(data.get('rounds') or []), players, aggregates.player_stats(data, players))
+        try:
+            self.show_ratings(ratings.standings())
+        except LOAD_ERRORS as e:
+            Logger.exception('Statistics: ratings failed')
+            self.show_ratings([], error=e)
         try:
-            lbl = Label(text='统计', halign='center', valign='middle')
-            try:
-                lbl.font_size = sp(18)
-            except Exception:
-                pass
-            try:
-                lbl.color = TEXT_COLOR
-            except Exception:
-                pass
-            root.add_widget(lbl)
-        except Exception:
-            pass
-        self.add_widget(root)
+            self.show_h2h(h2h.matrix())
+        except LOAD_ERRORS as e:
+            Logger.exception('Statistics: head-to-head failed')
+            self.show_h2h(h2h.new_result(), error=e)
+        self.show_chart(players, aggregates.series(data, players))
+        self.show_agreement(aggregates.agreement(data, players))
+
+    def show_table(self, rounds, players, per_player):
+        self.summary.text = f"共 {rounds} 局，{len(players)} 位玩家"
+        cells = [{'text': head, 'bg': 'HEADER_BG'} for head, _f in COLUMNS]
+        for i, name in enumerate(players):
+            st = per_player[name]
+            bg = 'ROW_DARK' if (i % 2 == 0) else 'ROW_LIGHT'
+            cells.append({'text': name, 'bg': bg})
+            cells.extend({'text': fmt(st), 'bg': bg} for _h, fmt in COLUMNS[1:])
+        self.table.set_cells(cells)
+
+    def show_ratings(self, rows, error=None):
+        self.ratings_title.text = RATINGS_TITLE if error is None else f"{RATINGS_TITLE}：无法计算（{error}）"
+        cells = [{'text': head, 'bg': 'HEADER_BG'} for head in RATING_COLUMNS]
+        for i, (name, rating, rounds, change) in enumerate(rows):
+            bg = 'ROW_DARK' if (i % 2 == 0) else 'ROW_LIGHT'
+            rank = 1 if i == 0 else 'last' if i == len(rows) - 1 and i > 0 else None
+            cells.append({'text': name, 'bg': bg, 'rank': rank})
+            cells.extend({'text': text, 'bg': bg} for text in
+                         (f"{rating:.0f}", f"{change:+.0f}", str(rounds)))
+        self.ratings_table.set_cells(cells)
+
+    def show_h2h(self, result, error=None):
+        self.h2h_title.text = H2H_TITLE if error is None else f"{H2H_TITLE}：无法计算（{error}）"
+        ids = h2h.players(result)
+        names = result['names']
+        cells = [{'text': '', 'bg': 'HEADER_BG'}]
+        cells.extend({'text': names.get(pid, pid), 'bg': 'HEADER_BG'} for pid in ids)
+        for i, a in enumerate(ids):
+            bg = 'ROW_DARK' if (i % 2 == 0) else 'ROW_LIGHT'
+            cells.append({'text': names.get(a, a), 'bg': bg})
+            for b in ids:
+                if a == b:
+                    cells.append({'text': '-', 'bg': bg})
+                    continue
+                rec = h2h.record(result, a, b)
+                text = f"{rec[h2h.AHEAD]}-{rec[h2h.BEHIND]} {rec[h2h.NET]:+d}" if rec[h2h.ROUNDS] else '-'
+                cells.append({'text': text, 'bg': bg})
+        self.h2h_table.set_cols(len(ids) + 1)
+        self.h2h_table.set_cells(cells)
+
+    def show_chart(self, players, cumulative):
+        series = []
+        legend = []
+        for i, name in enumerate(players):
+            color = PALETTE[i % len(PALETTE)]
+            series.append((color, cumulative[name]))
+            legend.append(f"[color={_hex(color)}]■[/color] {name}")
+        self.chart.set_series(series)
+        self.legend.text = '   '.join(legend)
+
+    def show_agreement(self, agr):
+        if not agr['compared']:
+            self.agreement.text = '名次一致性：暂无可比较的局'
+            self.agreement_chart.set_series([])
+            return
+        rho = '-' if agr['mean_rho'] is None else f"{agr['mean_rho']:.2f}"
+        self.agreement.text = (
+            f"拖拽名次与分数名次一致性：Kendall τ {agr['mean_tau']:.2f} · Spearman ρ {rho}\n"
+            f"不一致 {agr['disagree_rounds']}/{agr['compared']} 局，"
+            f"逆序对 {agr['discordant']} 个（下图为 τ 的累计平均）\n"
+            "各玩家两种名次不同：" + ' · '.join(
+                f"{name} {st['mismatch']}/{st['compared']}" for name, st in agr['per_player'].items()))
+        self.agreement_chart.set_series([(PALETTE[0], agr['cum_tau'])])
+
+    def _restyle(self, *_a):
+        self.table.refresh()
+        self.ratings_table.refresh()
+        self.h2h_table.refresh()
+        self.chart._trigger()
+        self.agreement_chart._trigger()
@@ -1,20 +1,649 @@
-import json, os, datetime, shutil
+import json, os, threading, tempfile, atexit, uuid
 
 DATA_FILE = "score_data.json"
+# optional SQLite database; used instead of DATA_FILE once it exists
+DB_FILE = "score_data.db"
 DUN_VALUE = 30
 
-def load_data():
-    if os.path.exists(DATA_FILE):
+# Rounds saved during a game are appended to a JSON-lines journal next to the
+# snapshot instead of rewriting the whole document each time. load_data()
+# replays the journal on top of the snapshot; compaction folds it back in.
+JOURNAL_SUFFIX = ".journal"
+# compact in the background once the journal holds this many entries
+COMPACT_THRESHOLD = 50
+# full saves issued within this window (seconds) share one physical write
+SAVE_DELAY = 0.3
+# how many recent changes DataStore remembers for incremental views
+CHANGE_LOG_SIZE = 64
+# Every snapshot carries a generation token and journal entries carry the
+# token of the snapshot they extend, so entries written before a full save
+# are never replayed on top of it (not even if the crash came between
+# writing the snapshot and removing the journal). A compacted snapshot also
+# names its parent generation, whose entries past its rounds still apply.
+GEN_KEY = "journal_gen"
+PARENT_KEY = "journal_parent"
+
+_journal_lock = threading.RLock()
+_compact_thread = None
+# hold_compaction() depth, and whether compaction came due while held
+_compact_holds = 0
+_compact_pending = False
+
+
+def journal_path(path=None):
+    return (path or DATA_FILE) + JOURNAL_SUFFIX
+
+
+def _load_snapshot(path):
+    if os.path.exists(path):
         try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
+            with open(path, "r", encoding="utf-8") as f:
                 return json.load(f)
         except Exception:
             pass
     return {"players": [], "rounds": []}
 
+
+def _new_gen():
+    return uuid.uuid4().hex[:12]
+
+
+def _replay_journal(data, path, gens=(None,)):
+    """Apply journal entries to `data` in place; returns the number applied.
+
+    Only entries whose generation is in `gens` are applied. A torn last line
+    (crash while appending) is ignored so the snapshot plus every complete
+    entry is still readable.
+    """
+    jp = journal_path(path)
+    if not os.path.exists(jp):
+        return 0
+    applied = 0
+    try:
+        with open(jp, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except Exception:
+                    continue
+                op = entry.get("op") if isinstance(entry, dict) else None
+                if op == "round" and entry.get("gen") in gens:
+                    if not isinstance(data.get("rounds"), list):
+                        data["rounds"] = []
+                    # `at` is the round count when the entry was written; if the
+                    # snapshot already holds that round (crash between writing
+                    # the snapshot and removing the journal) skip it
+                    at = entry.get("at")
+                    if isinstance(at, int) and at < len(data["rounds"]):
+                        continue
+                    data["rounds"].append(entry.get("round") or {})
+                    applied += 1
+    except Exception:
+        pass
+    return applied
+
+
+def _fsync_dir(path):
+    # persist the rename itself; not supported on every platform
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except Exception:
+        pass
+
+
+def atomic_write_text(path, text):
+    """Write `text` to `path` via temp file + fsync + rename.
+
+    Readers see either the old or the new content, never a truncated file.
+    """
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_write_bytes(path, payload):
+    tmp = _stage_bytes(path, payload)
+    try:
+        os.replace(tmp, path)
+    except Exception:
+        _discard(tmp)
+        raise
+    _fsync_dir(path)
+
+
+def _stage_bytes(path, payload):
+    """Write `payload` to a synced temp file next to `path`; returns its name."""
+    d = os.path.dirname(os.path.abspath(path)) or "."
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=d)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception:
+        _discard(tmp)
+        raise
+    return tmp
+
+
+def _discard(tmp):
+    try:
+        os.remove(tmp)
+    except Exception:
+        pass
+
+
+def _dump_json(data):
+    # the debounced writer serializes off the UI thread; retry if the
+    # document is mutated mid-dump
+    for _ in range(3):
+        try:
+            return json.dumps(data, ensure_ascii=False, indent=2)
+        except RuntimeError:
+            continue
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def _journal_length(path):
+    try:
+        with open(journal_path(path), "rb") as f:
+            return sum(1 for line in f if line.strip())
+    except Exception:
+        return 0
+
+
+class JsonBackend:
+    """Snapshot + journal persistence in DATA_FILE (the default backend)."""
+
+    def __init__(self, path=None):
+        self._path = path
+        # generation of the snapshot on disk, as last loaded or written
+        self.gen = None
+
+    @property
+    def path(self):
+        return self._path or DATA_FILE
+
+    def _stat(self, p):
+        try:
+            st = os.stat(p)
+            return (st.st_mtime_ns, st.st_size)
+        except Exception:
+            return None
+
+    def signature(self):
+        return (self.path, self._stat(self.path), self._stat(journal_path(self.path)))
+
+    def load(self):
+        data = _load_snapshot(self.path)
+        if not isinstance(data, dict):
+            data = {"players": [], "rounds": []}
+        self.gen = data.pop(GEN_KEY, None)
+        gens = {self.gen}
+        if PARENT_KEY in data:
+            gens.add(data.pop(PARENT_KEY))
+        _replay_journal(data, self.path, gens)
+        return data
+
+    def write(self, data):
+        # a full save is a fresh snapshot under a new generation; anything
+        # journaled is already in it, and left-over entries no longer apply
+        gen = _new_gen()
+        atomic_write_text(self.path, _dump_json(dict(data, **{GEN_KEY: gen})))
+        self.gen = gen
+        try:
+            if os.path.exists(journal_path(self.path)):
+                os.remove(journal_path(self.path))
+        except Exception:
+            pass
+
+    def append_rounds(self, round_objs, at):
+        """Append rounds to the journal in one write; returns True when compaction is due."""
+        head = {"op": "round"}
+        if self.gen is not None:
+            head["gen"] = self.gen
+        lines = "".join(
+            json.dumps(dict(head, at=at + i, round=rd), ensure_ascii=False) + "\n"
+            for i, rd in enumerate(round_objs))
+        with open(journal_path(self.path), "a+b") as f:
+            # start on a fresh line if a previous append was torn mid-write
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = "\n" + lines
+            f.write(lines.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        return _journal_length(self.path) >= COMPACT_THRESHOLD
+
+    def needs_compaction(self):
+        return os.path.exists(journal_path(self.path))
+
+    def stage_compaction(self, data):
+        """Serialize `data` (a copy of the document) to a synced temp file as
+        the next snapshot; no lock needed. Returns a token for commit/abort."""
+        gen = _new_gen()
+        doc = dict(data, **{GEN_KEY: gen, PARENT_KEY: self.gen})
+        return (_stage_bytes(self.path, _dump_json(doc).encode("utf-8")), gen, self.gen)
+
+    def commit_compaction(self, staged, count):
+        """Install a staged snapshot holding the first `count` rounds and keep
+        only the journal entries after them (call under the storage lock).
+        Returns False, discarding it, if a full save came in meanwhile."""
+        tmp, gen, parent = staged
+        if self.gen != parent:
+            _discard(tmp)
+            return False
+        tail = []
+        jp = journal_path(self.path)
+        try:
+            with open(jp, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except Exception:
+                        continue
+                    at = entry.get("at") if isinstance(entry, dict) else None
+                    if isinstance(at, int) and at >= count:
+                        tail.append(line if line.endswith("\n") else line + "\n")
+        except Exception:
+            pass
+        try:
+            os.replace(tmp, self.path)
+        except Exception:
+            _discard(tmp)
+            raise
+        _fsync_dir(self.path)
+        self.gen = gen
+        # the entries appended while the snapshot was written stay valid
+        # under the parent generation; everything before them is folded in
+        try:
+            if tail:
+                atomic_write_text(jp, "".join(tail))
+            elif os.path.exists(jp):
+                os.remove(jp)
+        except Exception:
+            pass
+        return True
+
+    def abort_compaction(self, staged):
+        _discard(staged[0])
+
+
+class DataStore:
+    """Process-wide cache of the parsed data document.
+
+    The document is parsed once and handed out as the same object until the
+    backend's files change on disk (detected via mtime/size), so screens can
+    call load_data() freely. Treat the returned dict as shared: mutate it
+    only when you are about to pass it to save_data().
+
+    Full saves are group-committed: put() updates the cache immediately and
+    schedules one write SAVE_DELAY seconds later, so several saves in quick
+    succession cost a single physical write. Call flush() to force it.
+
+    Every change bumps ``revision`` and is recorded in a short change log so
+    views can apply deltas (see changes_since()) instead of redrawing.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or JsonBackend()
+        self._data = None
+        self._sig = None
+        self._dirty = False
+        self._timer = None
+        self._model = None
+        self._model_src = None
+        self._index = None
+        self._index_src = None
+        self.revision = 0
+        self._changes = []
+
+    @property
+    def path(self):
+        return self.backend.path
+
+    def set_backend(self, backend):
+        with _journal_lock:
+            self.flush()
+            self.backend = backend
+            self._data = None
+            self._sig = None
+
+    def _record(self, change):
+        self.revision += 1
+        self._changes.append((self.revision, change))
+        if len(self._changes) > CHANGE_LOG_SIZE:
+            del self._changes[:len(self._changes) - CHANGE_LOG_SIZE]
+
+    def changes_since(self, revision):
+        """Changes after `revision`, oldest first, or None if a view must redraw.
+
+        Entries are ('append', start, count) and ('update', index); a full
+        save or a reload from disk returns None.
+        """
+        with _journal_lock:
+            if revision == self.revision:
+                return []
+            out = [c for rev, c in self._changes if rev > revision]
+            if revision > self.revision or len(out) != self.revision - revision or \
+                    any(c[0] == 'replace' for c in out):
+                return None
+            return out
+
+    def invalidate(self):
+        with _journal_lock:
+            if self._dirty:
+                self.flush()
+            self._data = None
+            self._sig = None
+
+    def get(self):
+        with _journal_lock:
+            # unwritten changes make the cache authoritative
+            if self._dirty and self._data is not None:
+                return self._data
+            sig = self.backend.signature()
+            if self._data is not None and sig == self._sig:
+                return self._data
+            self._record(('replace',))
+            self._data = self.backend.load()
+            self._sig = sig
+            return self._data
+
+    def model(self):
+        """Return the typed model.Game for the current document.
+
+        Built once per document and extended in place by append_round().
+        """
+        with _journal_lock:
+            data = self.get()
+            rounds = data.get("rounds") if isinstance(data.get("rounds"), list) else []
+            m = self._model
+            if m is None or self._model_src is not data or len(m.rounds) != len(rounds):
+                from model import Game
+                m = Game.from_dict(data)
+                self._model = m
+                self._model_src = data
+            return m
+
+    def round_index(self):
+        """Content-hash index of the current rounds (see roundindex.py).
+
+        Built once per document and extended in place by append_round().
+        """
+        with _journal_lock:
+            data = self.get()
+            rounds = data.get("rounds") if isinstance(data.get("rounds"), list) else []
+            idx = self._index
+            if idx is None or self._index_src is not data or len(idx) != len(rounds):
+                from roundindex import RoundIndex
+                idx = RoundIndex(rounds)
+                self._index = idx
+                self._index_src = data
+            return idx
+
+    def put(self, data):
+        with _journal_lock:
+            self._model = None
+            self._index = None
+            self._data = data
+            self._dirty = True
+            self._record(('replace',))
+            if self._timer is None:
+                try:
+                    t = threading.Timer(SAVE_DELAY, self._on_timer)
+                    t.daemon = True
+                    t.start()
+                    self._timer = t
+                except Exception:
+                    self._write()
+
+    def _on_timer(self):
+        with _journal_lock:
+            self._timer = None
+            if self._dirty:
+                try:
+                    self._write()
+                except Exception:
+                    pass
+
+    def flush(self):
+        """Write any pending save now (call on app stop)."""
+        with _journal_lock:
+            if self._timer is not None:
+                try:
+                    self._timer.cancel()
+                except Exception:
+                    pass
+                self._timer = None
+            if self._dirty:
+                self._write()
+
+    def _write(self):
+        self.backend.write(self._data)
+        self._dirty = False
+        self._sig = self.backend.signature()
+
+    def append_round(self, round_obj):
+        """Persist a single new round without rewriting the history.
+
+        Cost is independent of the number of rounds already saved. With the
+        JSON backend a background compaction starts once the journal grows
+        past COMPACT_THRESHOLD entries.
+        """
+        self.append_rounds([round_obj])
+
+    def append_rounds(self, round_objs):
+        """Persist several new rounds with a single incremental write."""
+        round_objs = list(round_objs)
+        if not round_objs:
+            return
+        with _journal_lock:
+            due = False
+            data = self.get()
+            rounds = data.get("rounds") if isinstance(data.get("rounds"), list) else []
+            # with a full write pending the rounds simply ride along with it
+            if not self._dirty:
+                due = self.backend.append_rounds(round_objs, len(rounds))
+            if not isinstance(data.get("rounds"), list):
+                data["rounds"] = rounds
+            if self._model is not None and self._model_src is data and len(self._model.rounds) == len(rounds):
+                for rd in round_objs:
+                    self._model.append_dict(rd)
+            if self._index is not None and self._index_src is data and len(self._index) == len(rounds):
+                for rd in round_objs:
+                    self._index.add(rd)
+            self._record(('append', len(rounds), len(round_objs)))
+            agg = data.get("aggregates")
+            rounds.extend(round_objs)
+            if isinstance(agg, dict) and agg.get("rounds") == len(rounds) - len(round_objs):
+                import aggregates
+                # a block from an older layout is rebuilt on its next read
+                if agg.get("version") == aggregates.VERSION:
+                    for rd in round_objs:
+                        aggregates.fold(agg, rd)
+            if not self._dirty:
+                self._sig = self.backend.signature()
+        if due:
+            compact_async()
+
+    def snapshot(self):
+        """(backend, copy of the document) for writing it outside the lock.
+
+        Rounds are replaced rather than mutated, so copying the containers is
+        enough; the aggregates block is updated in place (under this lock, see
+        aggregates.ensure) and copied whole.
+        """
+        with _journal_lock:
+            data = self.get()
+            doc = dict(data)
+            for key in ("players", "rounds"):
+                if isinstance(doc.get(key), list):
+                    doc[key] = list(doc[key])
+            if "aggregates" in doc:
+                import aggregates
+                doc["aggregates"] = aggregates.copy(doc["aggregates"])
+            return self.backend, doc
+
+    def adopt_compaction(self, backend, staged, count):
+        """Install a snapshot staged from snapshot(). Its content is what the
+        cache already holds, so no change is recorded and views keep their
+        incremental state."""
+        with _journal_lock:
+            if backend is not self.backend or self._dirty:
+                backend.abort_compaction(staged)
+                return False
+            if not backend.commit_compaction(staged, count):
+                return False
+            self._sig = backend.signature()
+            return True
+
+    def update_round(self, index, round_obj):
+        """Replace round `index` (full save, recorded as a single-row change)."""
+        with _journal_lock:
+            data = self.get()
+            rounds = data.get("rounds")
+            if not isinstance(rounds, list) or not 0 <= index < len(rounds):
+                raise IndexError(index)
+            rounds[index] = round_obj
+            data.pop("aggregates", None)
+            self.put(data)
+            # put() recorded a replace; narrow it to the one row
+            self._changes[-1] = (self.revision, ('update', index))
+
+    def truncate_rounds(self, count):
+        """Drop every round after the first `count` (full save)."""
+        with _journal_lock:
+            data = self.get()
+            rounds = data.get("rounds")
+            if isinstance(rounds, list) and len(rounds) > count:
+                del rounds[count:]
+                data.pop("aggregates", None)
+                self.put(data)
+
+
+def _default_backend():
+    # a migrated database takes over from the JSON file (see sqlite_backend)
+    try:
+        if os.path.exists(DB_FILE):
+            from sqlite_backend import SqliteBackend
+            return SqliteBackend(DB_FILE)
+    except Exception:
+        pass
+    return JsonBackend()
+
+
+STORE = DataStore(_default_backend())
+
+
+def load_data():
+    return STORE.get()
+
+
+def lock():
+    """The lock guarding the cached document. Hold it while changing parts of
+    the document in place outside DataStore (e.g. folding rounds into the
+    aggregates), so background writes and compaction copy a settled state."""
+    return _journal_lock
+
+
 def save_data(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    STORE.put(data)
+
+
+def append_round(round_obj):
+    STORE.append_round(round_obj)
+
+
+def append_rounds(round_objs):
+    STORE.append_rounds(round_objs)
+
+
+def update_round(index, round_obj):
+    STORE.update_round(index, round_obj)
+
+
+def flush():
+    STORE.flush()
+
+
+def load_model():
+    """Typed view (model.Game) of the current document; see model.py."""
+    return STORE.model()
+
+
+def round_index():
+    """Content-hash index of the current rounds; see roundindex.py."""
+    return STORE.round_index()
+
+
+def use_backend(backend):
+    """Switch the process-wide store to another backend (flushes first)."""
+    STORE.set_backend(backend)
+
+
+atexit.register(flush)
+
+
+def compact():
+    """Fold pending incremental writes into the backend's main file.
+
+    Only copying the document happens under the storage lock; serializing
+    and syncing the new snapshot happen outside it, so saves and loads on
+    the UI thread are not held up. Rounds appended meanwhile stay in the
+    journal. Returns True if a snapshot was installed.
+    """
+    with _journal_lock:
+        STORE.flush()
+        if not STORE.backend.needs_compaction():
+            return False
+        backend, doc = STORE.snapshot()
+    staged = backend.stage_compaction(doc)
+    return STORE.adopt_compaction(backend, staged, len(doc.get("rounds") or []))
+
+
+def hold_compaction():
+    """Defer background compaction until the matching release_compaction(),
+    e.g. while an import appends many chunks."""
+    global _compact_holds
+    with _journal_lock:
+        _compact_holds += 1
+
+
+def release_compaction():
+    """End a hold_compaction(); starts the compaction that came due meanwhile."""
+    global _compact_holds, _compact_pending
+    with _journal_lock:
+        _compact_holds = max(0, _compact_holds - 1)
+        due = _compact_pending and not _compact_holds
+        if due:
+            _compact_pending = False
+    if due:
+        compact_async()
+
+
+def compact_async():
+    global _compact_thread, _compact_pending
+    with _journal_lock:
+        if _compact_holds:
+            _compact_pending = True
+            return None
+    try:
+        if _compact_thread is not None and _compact_thread.is_alive():
+            return _compact_thread
+        t = threading.Thread(target=compact, name="journal-compact", daemon=True)
+        t.start()
+        _compact_thread = t
+        return t
+    except Exception:
+        return None
+
 
 def to_int(s, default=0):
     try:
@@ -29,10 +658,15 @@ def to_int(s, default=0):
 
 def ensure_backup(file_path):
     try:
-        if os.path.exists(file_path):
-            bak = file_path + ".bak_" + datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            shutil.copyfile(file_path, bak)
-            return bak
+        # make sure pending and journaled writes are part of the copy
+        if os.path.abspath(file_path) == os.path.abspath(STORE.path):
+            compact()
+    except Exception:
+        pass
+    try:
+        # content-addressed and pruned; see backup.py
+        from backup import backup_file
+        return backup_file(file_path)
     except Exception:
         pass
     return None
@@ -45,5 +679,4 @@ def safe_load_json(path):
         return {}
 
 def safe_save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aggregates  # noqa: E402
+import archive  # noqa: E402
+import h2h  # noqa: E402
+import ranking  # noqa: E402
+import ratings  # noqa: E402
+import storage  # noqa: E402
+
+
+def make_round(total, ranks=None, **extra):
+    """A round dict with `total` and drag-order `ranks` (default: by total)."""
+    if ranks is None:
+        order = sorted(total, key=lambda name: -total[name])
+        ranks = {name: i + 1 for i, name in enumerate(order)}
+    rd = {'breakdown': {'basic': dict(total), 'dun': {n: 0 for n in total}, 'duns_raw': {n: 0 for n in total}},
+          'total': dict(total), 'ranks': dict(ranks)}
+    rd.update(extra)
+    return rd
+
+
+def sample_document():
+    """A document exercising the awkward cases: a late joiner, non-int values,
+    extra round and top-level keys."""
+    rounds = [make_round({'A': 10, 'B': -5, '丙': -5}, id='r0'),
+              make_round({'A': -30, 'B': 30, '丙': 0}, note='late', id='r1'),
+              # a player joining mid-game, and a round kept raw (non-int value)
+              make_round({'A': 1, 'B': 2, '丙': 3, 'D': -6}),
+              {'total': {'A': 'x'}, 'ranks': {'A': 1}},
+              {'breakdown': {'basic': {'A': 1}, 'extra': 2}, 'total': {'A': 1}},
+              {}]
+    for rd in rounds[:3]:
+        ranking.ensure_score_ranks(rd)
+    return {'players': ['A', 'B', '丙'], 'rounds': rounds, 'meta': {'theme': 'dark'}}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh JSON-backed DataStore in an empty working directory, with the
+    process-wide caches that hang off the store reset."""
+    monkeypatch.chdir(tmp_path)
+    s = storage.DataStore(storage.JsonBackend())
+    monkeypatch.setattr(storage, 'STORE', s)
+    monkeypatch.setattr(archive, '_index_cache', None)
+    monkeypatch.setattr(archive, '_index_sig', None)
+    monkeypatch.setattr(ratings, '_LIVE', ratings._Live())
+    monkeypatch.setattr(h2h, '_LIVE', h2h._Live())
+    monkeypatch.setattr(h2h, '_ARCHIVED', h2h._Archived())
+    monkeypatch.setattr(aggregates, '_CHARTS', aggregates._Charts())
+    yield s
+    t = storage._compact_thread
+    if t is not None:
+        t.join()
+    s.flush()
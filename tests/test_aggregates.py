@@ -0,0 +1,145 @@
+"""The stored accumulators and the in-memory charts of aggregates.py."""
+import pytest
+
+import aggregates
+import ranking
+import storage
+from conftest import make_round
+
+
+def _rounds():
+    rounds = [
+        make_round({'A': 10, 'B': -5, 'C': -5}),
+        # drag order against the scores
+        make_round({'A': -20, 'B': 30, 'C': -10}, ranks={'A': 1, 'B': 2, 'C': 3}),
+        make_round({'A': 0, 'B': 0, 'C': 0}),
+        # D joins late; a tie in the middle
+        make_round({'A': 5, 'B': 5, 'C': -15, 'D': 5}, ranks={'D': 1, 'A': 2, 'B': 3, 'C': 4}),
+        make_round({'A': 7, 'B': -7, 'C': 0, 'D': 0}),
+        # no drag order: score ranks stand in
+        {'total': {'A': 3, 'B': -1, 'C': -1, 'D': -1}},
+        make_round({'A': 1, 'B': -1}),
+    ]
+    for rd in rounds:
+        ranking.ensure_score_ranks(rd)
+    return rounds
+
+
+# per-player statistics of _rounds(), worked out by hand
+EXPECTED = {
+    'A': {'rounds': 7, 'sum': 6, 'mean': 6 / 7, 'var': 4052 / 49, 'min': -20, 'max': 10,
+          'min_round': 1, 'max_round': 0, 'basic': 3, 'duns_raw': 0, 'wins': 6, 'lasts': 0,
+          'win_rate': 6 / 7, 'last_rate': 0.0, 'ranks': {1: 6, 2: 1}, 'win_streak': 3, 'last_streak': 0},
+    'B': {'rounds': 7, 'sum': 21, 'mean': 3.0, 'var': 134.0, 'min': -7, 'max': 30,
+          'min_round': 4, 'max_round': 1, 'basic': 22, 'duns_raw': 0, 'wins': 0, 'lasts': 2,
+          'win_rate': 0.0, 'last_rate': 2 / 7, 'ranks': {2: 5, 3: 1, 4: 1}, 'win_streak': 0, 'last_streak': 1},
+    'C': {'rounds': 6, 'sum': -31, 'mean': -31 / 6, 'var': 1145 / 36, 'min': -15, 'max': 0,
+          'min_round': 3, 'max_round': 2, 'basic': -30, 'duns_raw': 0, 'wins': 0, 'lasts': 4,
+          'win_rate': 0.0, 'last_rate': 4 / 6, 'ranks': {2: 2, 3: 3, 4: 1}, 'win_streak': 0, 'last_streak': 4},
+    'D': {'rounds': 3, 'sum': 4, 'mean': 4 / 3, 'var': 62 / 9, 'min': -1, 'max': 5,
+          'min_round': 5, 'max_round': 3, 'basic': 5, 'duns_raw': 0, 'wins': 1, 'lasts': 0,
+          'win_rate': 1 / 3, 'last_rate': 0.0, 'ranks': {1: 1, 2: 1, 3: 1}, 'win_streak': 1, 'last_streak': 0},
+}
+
+
+def test_player_stats():
+    data = {'players': ['A', 'B', 'C', 'D'], 'rounds': _rounds()}
+    per_player = aggregates.player_stats(data)
+    assert set(per_player) == set(EXPECTED)
+    for name, st in EXPECTED.items():
+        assert per_player[name].pop('ranks') == st['ranks']
+        assert per_player[name] == pytest.approx({k: v for k, v in st.items() if k != 'ranks'})
+    assert aggregates.series(data) == {'A': [10, -10, -10, -5, 2, 5, 6], 'B': [-5, 25, 25, 30, 23, 22, 21],
+                                       'C': [-5, -15, -15, -30, -30, -31, -31], 'D': [0, 0, 0, 5, 5, 4, 4]}
+
+
+def test_agreement():
+    data = {'players': ['A', 'B', 'C', 'D'], 'rounds': _rounds()}
+    agreement = aggregates.agreement(data)
+    # Kendall tau-b per round; rounds 2 (scores all tied) and 5 (no drag
+    # order) are not compared
+    tau = [2 / 6 ** 0.5, -1 / 3, None, 1 / 2 ** 0.5, 5 / 30 ** 0.5, None, 1.0]
+    cum, seen = [], []
+    for t in tau:
+        if t is not None:
+            seen.append(t)
+        cum.append(sum(seen) / len(seen))
+    assert agreement['compared'] == 5
+    assert agreement['disagree_rounds'] == 1
+    assert agreement['discordant'] == 2
+    assert agreement['mean_tau'] == pytest.approx(sum(seen) / 5)
+    assert agreement['cum_tau'] == pytest.approx(cum)
+    assert agreement['per_player']['A'] == {'compared': 6, 'mismatch': 2}
+    assert agreement['per_player']['D'] == {'compared': 2, 'mismatch': 1}
+
+
+def test_appended_rounds_match_a_full_rebuild(store):
+    rounds = _rounds()
+    storage.save_data({'players': ['A', 'B', 'C', 'D'], 'rounds': rounds[:2]})
+    aggregates.ensure(storage.load_data())
+    for rd in rounds[2:]:
+        storage.append_round(rd)
+    data = storage.load_data()
+    assert aggregates.current(data)
+    folded = aggregates.copy(data[aggregates.KEY])
+    rebuilt = aggregates.ensure({'rounds': rounds})
+    assert folded == rebuilt
+
+
+def test_chunked_ensure_matches_ensure():
+    data = {'rounds': _rounds() * 3}
+    for _ in aggregates.iter_ensure(data, chunk=2):
+        pass
+    assert data[aggregates.KEY] == aggregates.ensure({'rounds': data['rounds']})
+
+
+def test_edit_and_truncate_drop_the_block(store):
+    rounds = _rounds()
+    storage.save_data({'players': ['A', 'B', 'C', 'D'], 'rounds': rounds})
+    aggregates.ensure(storage.load_data())
+    storage.update_round(1, make_round({'A': 1, 'B': 2, 'C': -3}))
+    data = storage.load_data()
+    assert not aggregates.current(data)
+    assert aggregates.player_totals(data)['A']['total'] == 10 + 1 + 0 + 5 + 7 + 3 + 1
+    storage.STORE.truncate_rounds(2)
+    data = storage.load_data()
+    assert not aggregates.current(data)
+    assert aggregates.series(data)['A'] == [10, 11]
+
+
+def test_stale_block_is_rebuilt():
+    rounds = _rounds()
+    data = {'rounds': rounds[:3]}
+    aggregates.ensure(data)
+    # same count, different last round: the fingerprint catches it
+    data['rounds'] = rounds[:2] + [make_round({'A': 100, 'B': -100})]
+    assert not aggregates.current(data)
+    assert aggregates.player_totals(data, ['A'])['A']['total'] == 10 - 20 + 100
+
+
+def test_saved_block_does_not_grow_with_rounds():
+    def lists(v):
+        if isinstance(v, dict):
+            return any(lists(x) for x in v.values())
+        return isinstance(v, list)
+    agg = aggregates.ensure({'rounds': _rounds() * 50})
+    assert not lists(agg)
+
+
+def test_charts_follow_appends_and_edits(store):
+    rounds = _rounds()
+    storage.save_data({'players': ['A', 'B', 'C', 'D'], 'rounds': rounds[:4]})
+    data = storage.load_data()
+    assert not aggregates.charts_current(data)
+    for _ in aggregates.iter_charts(data, chunk=1):
+        pass
+    line = aggregates.series(data)['A']
+    for rd in rounds[4:]:
+        storage.append_round(rd)
+    assert aggregates.charts_current(data)
+    assert aggregates.series(data)['A'] is line
+    assert line == [10, -10, -10, -5, 2, 5, 6]
+    assert len(aggregates.agreement(data)['cum_tau']) == len(rounds)
+    storage.update_round(0, make_round({'A': 0, 'B': 0}))
+    assert not aggregates.charts_current(data)
+    assert aggregates.series(data)['A'] == [0, -20, -20, -15, -8, -5, -4]
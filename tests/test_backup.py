@@ -0,0 +1,55 @@
+"""Content-addressed backups: dedupe, delta chains, pruning and restore."""
+import datetime
+import json
+import os
+
+import backup
+from conftest import make_round
+
+
+def _write(path, n):
+    doc = {'players': ['A', 'B'], 'rounds': [make_round({'A': i, 'B': -i}) for i in range(n)]}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, indent=2)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_unchanged_file_is_not_stored_twice(store):
+    _write('score.json', 3)
+    first = backup.backup_file('score.json')
+    assert backup.backup_file('score.json') == first
+    assert [e['hash'] for e in backup.list_backups('score.json')] == [first]
+    assert backup.backup_file('missing.json') is None
+
+
+def test_growing_file_is_stored_as_deltas_and_restores(store):
+    contents = {}
+    now = datetime.datetime(2026, 1, 1, 12, 0)
+    for n in range(1, 6):
+        content = _write('score.json', n * 20)
+        digest = backup.backup_file('score.json', now=now + datetime.timedelta(minutes=n))
+        contents[digest] = content
+    manifest = backup._load_manifest()
+    kinds = [manifest['objects'][d]['kind'] for d in contents]
+    assert kinds[0] == 'full' and set(kinds[1:]) == {'delta'}
+    for digest, content in contents.items():
+        assert backup.read_backup(digest) == content
+    first = next(iter(contents))
+    backup.restore_backup(first, 'score.json')
+    with open('score.json', 'rb') as f:
+        assert f.read() == contents[first]
+
+
+def test_pruning_keeps_every_kept_backup_readable(store):
+    start = datetime.datetime(2026, 1, 1, 12, 0)
+    contents = {}
+    for n in range(backup.KEEP_LAST + 5):
+        content = _write('score.json', n + 1)
+        contents[backup.backup_file('score.json', now=start + datetime.timedelta(minutes=n))] = content
+    kept = backup.list_backups('score.json')
+    assert len(kept) == backup.KEEP_LAST
+    for e in kept:
+        assert backup.read_backup(e['hash']) == contents[e['hash']]
+    objects = set(os.listdir(os.path.join(backup.BACKUP_DIR, 'objects')))
+    assert objects == set(backup._load_manifest()['objects'])
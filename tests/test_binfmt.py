@@ -0,0 +1,32 @@
+"""Round-trip of the binary columnar format."""
+import binfmt
+import ranking
+from conftest import make_round, sample_document
+from roundindex import ID_KEY, new_round_id
+
+
+def test_binary_round_trip(tmp_path):
+    doc = sample_document()
+    path = str(tmp_path / 'game.psb')
+    binfmt.dump_binary(doc, path)
+    assert binfmt.load_binary(path) == doc
+    with binfmt.BinaryGameReader(path) as r:
+        assert len(r) == len(doc['rounds'])
+        assert r.round(1) == doc['rounds'][1]
+
+
+def test_round_ids_stay_out_of_meta(tmp_path):
+    # rounds as the input screen saves them
+    rounds = [make_round({'A': i, 'B': -i}, id=new_round_id()) for i in range(50)]
+    rounds[7]['note'] = 'late'
+    rounds[8].pop(ID_KEY)
+    for rd in rounds:
+        ranking.ensure_score_ranks(rd)
+    doc = {'players': ['A', 'B'], 'rounds': rounds}
+    path = str(tmp_path / 'game.psb')
+    binfmt.dump_binary(doc, path)
+    with binfmt.BinaryGameReader(path) as r:
+        assert r._meta_rounds == {'7': {'extra': {'note': 'late'}}}
+        assert r.round_id(3) == rounds[3][ID_KEY]
+        assert r.round_id(8) is None
+    assert binfmt.load_binary(path) == doc
@@ -0,0 +1,118 @@
+"""The incremental head-to-head matrix must match a full recompute."""
+import os
+
+import pytest
+
+import archive
+import h2h
+import storage
+from conftest import make_round
+
+# the reference recompute does not go through the counted function
+_read_game = archive.read_game
+
+
+def _game(seed, n=6, players=('A', 'B', 'C')):
+    rounds = []
+    for i in range(n):
+        scores = [((seed * 7 + i * 3 + j * 5) % 11) - 5 for j in range(len(players))]
+        rounds.append(make_round(dict(zip(players, scores))))
+    return {'players': list(players), 'rounds': rounds}
+
+
+def _full():
+    meta = storage.load_data().get('meta') or {}
+    games = [_read_game(e['id'])['rounds'] for e in archive.chronological()
+             if e['id'] != meta.get('archive_id')]
+    result = h2h.new_result()
+    for rounds in games + [storage.load_data().get('rounds') or []]:
+        h2h.merge(result, h2h.game_result(rounds))
+    return result
+
+
+def _check():
+    assert h2h.matrix()['pairs'] == _full()['pairs']
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Archived games read from here on."""
+    calls = []
+    read_game = archive.read_game
+
+    def counting(gid):
+        calls.append(gid)
+        return read_game(gid)
+    monkeypatch.setattr(archive, 'read_game', counting)
+    return calls
+
+
+def test_record_is_symmetric():
+    result = h2h.game_result([make_round({'A': 10, 'B': -10}), make_round({'A': 0, 'B': 0}, ranks={'A': 1, 'B': 1}),
+                              make_round({'A': -4, 'B': 4}, ranks={'A': 1, 'B': 2})])
+    assert h2h.record(result, 'a', 'b') == [2, 0, 1, 12, 3]
+    assert h2h.record(result, 'b', 'a') == [0, 2, 1, -12, 3]
+    assert h2h.record(result, 'a', 'c') == [0, 0, 0, 0, 0]
+    assert h2h.players(result) == ['a', 'b']
+
+
+def test_merge_and_unmerge_drop_empty_pairs():
+    one = h2h.game_result(_game(1)['rounds'])
+    two = h2h.game_result(_game(2, players=('A', 'D'))['rounds'])
+    total = h2h.merge(h2h.merge(h2h.new_result(), one), two)
+    h2h.merge(total, two, -1)
+    assert total['pairs'] == one['pairs']
+
+
+def test_current_game_edits(store):
+    storage.save_data(_game(1, n=20, players=('A', 'b', 'C', 'D')))
+    _check()
+    storage.append_round(make_round({'A': 5, 'b': -5, 'C': 0, 'D': 0}))
+    _check()
+    storage.update_round(3, make_round({'A': -9, 'b': 9, 'C': 0, 'D': 0}))
+    _check()
+    storage.STORE.truncate_rounds(5)
+    _check()
+    storage.save_data(_game(2, n=10, players=('A', 'B')))
+    _check()
+
+
+def test_archived_games(store, loads):
+    ids = [archive.archive_game(_game(seed))['id'] for seed in range(3)]
+    storage.save_data(_game(9, players=('B', 'C', 'E')))
+    h2h.matrix()
+    # a fresh process reads the cache instead of the games
+    h2h._ARCHIVED = h2h._Archived()
+    del loads[:]
+    _check()
+    assert loads == []
+    # archiving a game reads just that game
+    del loads[:]
+    new = archive.archive_game(_game(5, players=('A', 'E')))['id']
+    h2h.matrix()
+    assert loads == [new]
+    _check()
+    body = _read_game(ids[1])
+    body['rounds'].append(make_round({'A': 50, 'B': -50}))
+    body['meta'] = {'archive_id': ids[1]}
+    archive.archive_game(body)
+    _check()
+    archive.delete_game(ids[0])
+    _check()
+
+
+def test_open_archived_game_is_not_counted_twice(store):
+    ids = [archive.archive_game(_game(seed))['id'] for seed in range(3)]
+    body = archive.read_game(ids[1])
+    body['meta'] = {'archive_id': ids[1]}
+    storage.save_data(body)
+    _check()
+    storage.append_round(make_round({'A': 3, 'B': -3, 'C': 0}))
+    _check()
+
+
+def test_unreadable_archived_game_raises(store):
+    gid = archive.archive_game(_game(1))['id']
+    os.remove(archive.game_path(gid))
+    with pytest.raises(archive.ArchiveError):
+        h2h.matrix()
@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+import importer
+import storage
+from conftest import make_round
+
+
+def _values(text, chunk):
+    st = importer._Stream(io.BytesIO(text.encode('utf-8')), chunk)
+    return st.value()
+
+
+@pytest.mark.parametrize('text', ['2.75', '-12', '1e5', '1.5E-3', '-0.5e+2', '0', '"a\\"b"', 'true', 'null',
+                                  '[1, 2.5, "x"]', '{"k": [1, {"n": -3.25}]}'])
+@pytest.mark.parametrize('chunk', [1, 2, 3, 5])
+def test_values_split_at_any_chunk_boundary(text, chunk):
+    assert _values(text + ' ', chunk) == json.loads(text)
+    assert _values(text, chunk) == json.loads(text)
+
+
+def _write(path, doc):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, ensure_ascii=False)
+
+
+@pytest.mark.parametrize('chunk', [1, 3, 7, 64 * 1024])
+def test_iter_document_with_small_chunks(tmp_path, chunk):
+    doc = {'players': ['甲', 'B'], 'x': 12.75, 'rounds': [make_round({'甲': -15, 'B': 15}),
+                                                         make_round({'甲': 3, 'B': -3})], 'y': -3}
+    path = tmp_path / 'export.json'
+    _write(path, doc)
+    events = [ev for ev in importer.iter_document(str(path), chunk) if ev[0] != 'progress']
+    assert events == [('key', 'players', doc['players']), ('key', 'x', 12.75),
+                      ('round', doc['rounds'][0]), ('round', doc['rounds'][1]), ('key', 'y', -3)]
+
+
+def test_malformed_document_raises(tmp_path):
+    path = tmp_path / 'bad.json'
+    path.write_text('{"rounds": [1 2]}', encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(importer.iter_document(str(path)))
+
+
+def _run(job):
+    job.start()
+    job._thread.join()
+    return job
+
+
+def test_merge_import_is_idempotent(store, tmp_path):
+    store.put({'players': ['A', 'B'], 'rounds': [make_round({'A': 1, 'B': -1})]})
+    rounds = [make_round({'A': i, 'B': -i}) for i in range(1, 6)]
+    path = tmp_path / 'in.json'
+    _write(path, {'players': ['A', 'B'], 'rounds': rounds})
+    results = []
+    _run(importer.ImportJob(str(path), chunk_rounds=2, post=lambda fn: fn(), on_done=results.append))
+    assert results[-1]['ok'] and results[-1]['rounds'] == 4 and results[-1]['skipped'] == 1
+    _run(importer.ImportJob(str(path), chunk_rounds=2, post=lambda fn: fn(), on_done=results.append))
+    assert results[-1]['rounds'] == 0 and results[-1]['skipped'] == 5
+    data = storage.load_data()
+    assert len(data['rounds']) == 5
+    # score ranks are filled in on the way in
+    assert all(rd.get('ranks_by_score') for rd in data['rounds'][1:])
+
+
+def test_replace_import_drops_aggregates(store, tmp_path):
+    path = tmp_path / 'in.json'
+    _write(path, {'players': ['A'], 'rounds': [make_round({'A': 2})], 'aggregates': {'bogus': True}})
+    results = []
+    _run(importer.ImportJob(str(path), mode='replace', post=lambda fn: fn(), on_done=results.append))
+    assert results[-1]['ok']
+    data = storage.load_data()
+    assert data['players'] == ['A'] and len(data['rounds']) == 1
+    assert 'aggregates' not in data or data['aggregates'].get('bogus') is None
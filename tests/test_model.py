@@ -0,0 +1,21 @@
+"""Round-trip of the typed model through the dict API."""
+import model
+from conftest import sample_document
+
+
+def test_model_round_trip():
+    doc = sample_document()
+    game = model.Game.from_dict(doc)
+    assert game.to_dict() == doc
+    assert game.value(game.rounds[0], 'total', 'B') == -5
+    assert game.value(game.rounds[2], 'total', 'D') == -6
+    assert game.value(game.rounds[0], 'total', 'D', None) is None
+
+
+def test_model_append_matches_from_dict():
+    doc = sample_document()
+    game = model.Game.from_dict({'players': doc['players'], 'rounds': []})
+    for rd in doc['rounds']:
+        game.append_dict(rd)
+    game.extra = {'meta': doc['meta']}
+    assert game.to_dict() == doc
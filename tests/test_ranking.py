@@ -0,0 +1,64 @@
+"""Score ranks and the drag/score agreement of a single round."""
+import pytest
+
+import aggregates
+import ranking
+import storage
+from conftest import make_round
+
+
+def test_competition_ranks_share_and_skip():
+    assert ranking.competition_ranks({'A': 30, 'B': 10, 'C': 10, 'D': -50}) == \
+        {'A': 1, 'B': 2, 'C': 2, 'D': 4}
+    assert ranking.competition_ranks({'A': 0, 'B': 0}) == {'A': 1, 'B': 1}
+    # values that are not numbers are left out
+    assert ranking.competition_ranks({'A': '5', 'B': 'x', 'C': None}) == {'A': 1}
+
+
+def test_ensure_score_ranks_keeps_existing():
+    rd = {'total': {'A': 1, 'B': 2}}
+    assert ranking.ensure_score_ranks(rd)
+    assert rd[ranking.SCORE_KEY] == {'B': 1, 'A': 2}
+    rd['total']['A'] = 9
+    assert not ranking.ensure_score_ranks(rd)
+    assert rd[ranking.SCORE_KEY] == {'B': 1, 'A': 2}
+    assert not ranking.ensure_score_ranks({'total': {}})
+    assert not ranking.ensure_score_ranks(None)
+
+
+def test_pair_agreement():
+    tau, rho, disc = ranking.pair_agreement([(1, 1), (2, 2), (3, 3)])
+    assert (tau, rho, disc) == (pytest.approx(1.0), pytest.approx(1.0), 0)
+    tau, rho, disc = ranking.pair_agreement([(1, 3), (2, 2), (3, 1)])
+    assert (tau, rho, disc) == (pytest.approx(-1.0), pytest.approx(-1.0), 3)
+    # tau-b with a tie in the score order
+    tau, rho, disc = ranking.pair_agreement([(1, 1), (2, 2), (3, 2)])
+    assert tau == pytest.approx(2 / 6 ** 0.5)
+    assert disc == 0
+    # undefined: one player, or one order all ties
+    assert ranking.pair_agreement([(1, 1)]) == (None, None, 0)
+    assert ranking.pair_agreement([(1, 1), (2, 1)])[:2] == (None, None)
+
+
+def test_backfill_store_saves_once_and_drops_aggregates(store):
+    rounds = [make_round({'A': i, 'B': -i}) for i in range(3)]
+    storage.save_data({'players': ['A', 'B'], 'rounds': rounds})
+    aggregates.ensure(storage.load_data())
+    rev = store.revision
+    assert ranking.backfill_store() == 3
+    assert store.revision == rev + 1
+    data = storage.load_data()
+    assert aggregates.KEY not in data
+    assert [rd[ranking.SCORE_KEY] for rd in data['rounds']][1] == {'A': 1, 'B': 2}
+    assert ranking.backfill_store() == 0
+    assert store.revision == rev + 1
+
+
+def test_round_ranks_fall_back_to_score_ranks():
+    rd = {'ranks': {'A': 2, 'B': '1', 'C': 'x'}, 'ranks_by_score': {'A': 1, 'B': 2}}
+    assert ranking.round_ranks(rd) == {'A': 2, 'B': 1}
+    rd['ranks'] = {}
+    assert ranking.rank_key(rd) == ranking.SCORE_KEY
+    assert ranking.round_ranks(rd) == {'A': 1, 'B': 2}
+    assert ranking.round_ranks({}) == {}
+    assert ranking.round_ranks(None) == {}
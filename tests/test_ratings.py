@@ -0,0 +1,163 @@
+"""Incremental ratings must match a full replay of every game."""
+import os
+
+import pytest
+
+import archive
+import ratings
+import storage
+from conftest import make_round
+
+# the reference replay does not go through the counted function
+_rate_round = ratings.rate_round
+
+
+def _game(seed, n=6, players=('A', 'B', 'C')):
+    rounds = []
+    for i in range(n):
+        scores = [((seed * 7 + i * 3 + j * 5) % 11) - 5 for j in range(len(players))]
+        rounds.append(make_round(dict(zip(players, scores))))
+    return {'players': list(players), 'rounds': rounds}
+
+
+def _full(current=None):
+    """Replay every game in order, the current one in place of the archived
+    game `current` (at the end without one)."""
+    state = ratings.new_state()
+    live = storage.load_data().get('rounds') or []
+    games = [live if e['id'] == current else archive.read_game(e['id'])['rounds']
+             for e in archive.chronological()]
+    if current not in [e['id'] for e in archive.chronological()]:
+        games.append(live)
+    for rounds in games:
+        for rd in rounds:
+            _rate_round(state, rd)
+    return state
+
+
+def _check():
+    meta = storage.load_data().get('meta') or {}
+    state = ratings.current_state()[0]
+    expected = _full(meta.get('archive_id'))
+    assert state['n'] == expected['n']
+    assert state['r'] == pytest.approx(expected['r'])
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    """Counts rounds rated from here on."""
+    calls = []
+    rate_round = ratings.rate_round
+
+    def counting(state, rd):
+        calls.append(rd)
+        rate_round(state, rd)
+    monkeypatch.setattr(ratings, 'rate_round', counting)
+    return calls
+
+
+def test_player_id_normalizes():
+    assert ratings.player_id(' Ａlice  Smith ') == ratings.player_id('alice smith')
+
+
+def test_current_game_edits(store, counted):
+    storage.save_data(_game(1, n=250, players=('A', 'b', 'C', 'D')))
+    _check()
+    del counted[:]
+    storage.append_round(make_round({'A': 5, 'b': -5, 'C': 0, 'D': 0}))
+    _check()
+    assert len(counted) == 1
+    # an edit replays from the checkpoint before it
+    del counted[:]
+    storage.update_round(220, make_round({'A': -9, 'b': 9, 'C': 0, 'D': 0}))
+    _check()
+    assert len(counted) == 251 - ratings.CHECKPOINT * 2
+    storage.STORE.truncate_rounds(120)
+    _check()
+    # a full save with a different history
+    storage.save_data(_game(2, n=10, players=('A', 'B')))
+    _check()
+
+
+def test_archived_games(store, counted):
+    ids = [archive.archive_game(_game(seed))['id'] for seed in range(3)]
+    storage.save_data(_game(9, players=('B', 'C', 'E')))
+    _check()
+    cache = os.path.join(archive.ARCHIVE_DIR, ratings.CACHE_NAME)
+    assert os.path.exists(cache)
+    # nothing changed: the cached chain is used as is
+    del counted[:]
+    ratings._LIVE = ratings._Live()
+    _check()
+    assert len(counted) == len(storage.load_data()['rounds'])
+    # editing an archived game replays from it on
+    body = archive.read_game(ids[1])
+    body['rounds'].append(make_round({'A': 50, 'B': -50}))
+    body['meta'] = {'archive_id': ids[1]}
+    archive.archive_game(body)
+    _check()
+    archive.delete_game(ids[0])
+    _check()
+    archive.archive_game(_game(5, players=('A', 'E')))
+    _check()
+
+
+def test_stale_or_broken_cache_is_rebuilt(store, counted, monkeypatch):
+    for seed in range(2):
+        archive.archive_game(_game(seed))
+    _check()
+    cache = os.path.join(archive.ARCHIVE_DIR, ratings.CACHE_NAME)
+    # a cache written with another K is not used
+    monkeypatch.setattr(ratings, 'K', ratings.K / 2)
+    del counted[:]
+    ratings._LIVE = ratings._Live()
+    _check()
+    assert len(counted) == 12
+    with open(cache, 'w', encoding='utf-8') as f:
+        f.write('{"version": ')
+    del counted[:]
+    ratings._LIVE = ratings._Live()
+    _check()
+    assert len(counted) == 12
+    assert archive.load_derived_cache(ratings.CACHE_NAME, ratings.CACHE_VERSION, k=ratings.K)
+
+
+def test_open_archived_game_is_not_counted_twice(store):
+    ids = [archive.archive_game(_game(seed))['id'] for seed in range(3)]
+    chain = ratings._chain()
+    cache = os.path.join(archive.ARCHIVE_DIR, ratings.CACHE_NAME)
+    mtime = os.stat(cache).st_mtime_ns
+    body = archive.read_game(ids[1])
+    body['meta'] = {'archive_id': ids[1]}
+    storage.save_data(body)
+    _check()
+    storage.append_round(make_round({'A': 3, 'B': -3, 'C': 0}))
+    _check()
+    # the shared chain is untouched by the exclusion
+    assert os.stat(cache).st_mtime_ns == mtime
+    assert ratings._chain() == chain
+
+
+def test_reopened_game_keeps_its_rating_change(store):
+    ids = [archive.archive_game(_game(seed))['id'] for seed in range(3)]
+    order = [e['id'] for e in archive.chronological()]
+    chain = {snap['id']: snap['state'] for snap in ratings._chain()}
+    middle = order[1]
+    body = archive.read_game(middle)
+    body['meta'] = {'archive_id': middle}
+    storage.save_data(body)
+    before, after = chain[order[0]], chain[middle]
+    changes = {name: change for name, _r, _n, change in ratings.standings()}
+    for pid, r in after['r'].items():
+        assert changes[after['names'][pid]] == pytest.approx(r - before['r'][pid])
+    # and every rating is what it was with the game archived
+    state = ratings.current_state()[0]
+    assert state['r'] == pytest.approx(chain[order[-1]]['r'])
+    assert sorted(ids) == sorted(order)
+
+
+def test_unreadable_archived_game_raises(store):
+    gid = archive.archive_game(_game(1))['id']
+    os.remove(archive.game_path(gid))
+    with pytest.raises(archive.ArchiveError):
+        ratings.current_state()
@@ -0,0 +1,54 @@
+"""Round-trips and incremental saves of the SQLite backend."""
+import pytest
+
+import sqlite_backend
+from conftest import make_round, sample_document
+
+
+@pytest.fixture
+def db(tmp_path):
+    backend = sqlite_backend.SqliteBackend(str(tmp_path / 'score.db'))
+    yield backend
+    backend.close()
+
+
+def test_sqlite_round_trip(db):
+    doc = sample_document()
+    db.write(doc)
+    fresh = sqlite_backend.SqliteBackend(db.path)
+    try:
+        assert fresh.load() == doc
+    finally:
+        fresh.close()
+
+
+def test_sqlite_write_touches_only_changed_rows(db):
+    doc = sample_document()
+    db.write(doc)
+    conn = db._db()
+    before = conn.total_changes
+    db.write(doc)
+    assert conn.total_changes == before
+    doc['rounds'][1] = make_round({'A': 1, 'B': 1, '丙': -2})
+    db.write(doc)
+    # just that round's row
+    assert conn.total_changes - before == 1
+    del doc['rounds'][3:]
+    doc['players'] = ['B', 'A', '丙']
+    del doc['meta']
+    db.write(doc)
+    assert sqlite_backend.SqliteBackend(db.path).load() == doc
+
+
+def test_sqlite_append(db):
+    doc = sample_document()
+    db.write(doc)
+    extra = make_round({'A': 4, 'B': -4, '丙': 0})
+    db.append_rounds([extra], len(doc['rounds']))
+    doc['rounds'].append(extra)
+    assert sqlite_backend.SqliteBackend(db.path).load() == doc
+    # the digests followed the append: an unchanged save writes nothing
+    conn = db._db()
+    before = conn.total_changes
+    db.write(doc)
+    assert conn.total_changes == before
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+
+import aggregates
+import storage
+from conftest import make_round
+
+
+def _reload():
+    return storage.JsonBackend().load()
+
+
+def test_append_goes_to_journal_and_replays(store):
+    store.put({'players': ['A', 'B'], 'rounds': []})
+    store.flush()
+    snapshot = open(storage.DATA_FILE, 'rb').read()
+    store.append_rounds([make_round({'A': 1, 'B': -1}), make_round({'A': 2, 'B': -2})])
+    assert open(storage.DATA_FILE, 'rb').read() == snapshot
+    data = _reload()
+    assert [rd['total']['A'] for rd in data['rounds']] == [1, 2]
+    assert storage.GEN_KEY not in data
+
+
+def test_torn_journal_line_is_ignored(store):
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    store.append_round(make_round({'A': 1}))
+    with open(storage.journal_path(), 'a', encoding='utf-8') as f:
+        f.write('{"op": "round", "at": 1, "rou')
+    assert len(_reload()['rounds']) == 1
+    # the next append starts on a fresh line
+    store.append_round(make_round({'A': 2}))
+    assert [rd['total']['A'] for rd in _reload()['rounds']] == [1, 2]
+
+
+def test_entries_already_in_snapshot_are_skipped(store):
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    store.append_round(make_round({'A': 1}))
+    journal = open(storage.journal_path(), encoding='utf-8').read()
+    gen = store.backend.gen
+    # crash after the snapshot took the round but before the journal went
+    doc = {'players': ['A'], 'rounds': [make_round({'A': 1})], storage.GEN_KEY: gen}
+    storage.atomic_write_text(storage.DATA_FILE, json.dumps(doc))
+    open(storage.journal_path(), 'w', encoding='utf-8').write(journal)
+    assert len(_reload()['rounds']) == 1
+
+
+def test_reset_snapshot_ignores_older_journal(store):
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    store.append_rounds([make_round({'A': i}) for i in range(3)])
+    journal = open(storage.journal_path(), encoding='utf-8').read()
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    # crash between writing the reset snapshot and removing the journal
+    open(storage.journal_path(), 'w', encoding='utf-8').write(journal)
+    assert _reload()['rounds'] == []
+
+
+def test_legacy_files_without_generation_still_replay(store):
+    open(storage.DATA_FILE, 'w', encoding='utf-8').write('{"players": ["A"], "rounds": []}')
+    open(storage.journal_path(), 'w', encoding='utf-8').write(
+        json.dumps({'op': 'round', 'at': 0, 'round': make_round({'A': 5})}) + '\n')
+    assert _reload()['rounds'][0]['total'] == {'A': 5}
+
+
+def test_compaction_folds_journal_without_a_replace(store):
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    store.append_rounds([make_round({'A': i}) for i in range(5)])
+    rev = store.revision
+    assert storage.compact()
+    assert not os.path.exists(storage.journal_path())
+    assert store.changes_since(rev) == []
+    store.get()
+    assert store.changes_since(rev) == []
+    assert len(_reload()['rounds']) == 5
+
+
+def test_rounds_appended_during_compaction_survive(store):
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    store.append_rounds([make_round({'A': i}) for i in range(5)])
+    backend, doc = store.snapshot()
+    staged = backend.stage_compaction(doc)
+    store.append_rounds([make_round({'A': 10}), make_round({'A': 11})])
+    assert store.adopt_compaction(backend, staged, len(doc['rounds']))
+    with open(storage.journal_path(), encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
+    assert [rd['total']['A'] for rd in _reload()['rounds']] == [0, 1, 2, 3, 4, 10, 11]
+    # and the journal keeps working under the new generation
+    store.append_round(make_round({'A': 12}))
+    assert len(_reload()['rounds']) == 8
+
+
+def test_full_save_during_compaction_wins(store):
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    store.append_rounds([make_round({'A': i}) for i in range(5)])
+    backend, doc = store.snapshot()
+    staged = backend.stage_compaction(doc)
+    store.put({'players': ['A'], 'rounds': [make_round({'A': 99})]})
+    store.flush()
+    assert not store.adopt_compaction(backend, staged, len(doc['rounds']))
+    assert [rd['total']['A'] for rd in _reload()['rounds']] == [99]
+    assert not [f for f in os.listdir('.') if f.endswith('.tmp')]
+
+
+def test_hold_defers_compaction(store, monkeypatch):
+    monkeypatch.setattr(storage, 'COMPACT_THRESHOLD', 3)
+    store.put({'players': ['A'], 'rounds': []})
+    store.flush()
+    storage.hold_compaction()
+    try:
+        for i in range(6):
+            store.append_round(make_round({'A': i}))
+        assert os.path.exists(storage.journal_path())
+    finally:
+        storage.release_compaction()
+    storage._compact_thread.join()
+    assert not os.path.exists(storage.journal_path())
+    assert len(_reload()['rounds']) == 6
+
+
+def test_update_and_truncate_record_changes(store):
+    store.put({'players': ['A'], 'rounds': [make_round({'A': i}) for i in range(4)]})
+    rev = store.revision
+    store.update_round(1, make_round({'A': 7}))
+    assert store.changes_since(rev) == [('update', 1)]
+    store.truncate_rounds(2)
+    store.flush()
+    assert store.changes_since(rev) is None
+    assert [rd['total']['A'] for rd in _reload()['rounds']] == [0, 7]
+
+
+def test_aggregates_fold_under_the_store_lock(store, monkeypatch):
+    """Compaction copies the block under the lock on another thread, so it
+    must never see a fold half done."""
+    store.put({'players': ['A'], 'rounds': [make_round({'A': i}) for i in range(4)]})
+    free = []
+    fold = aggregates.fold
+
+    def probing(agg, rd):
+        def probe():
+            got = storage.lock().acquire(blocking=False)
+            if got:
+                storage.lock().release()
+            free.append(got)
+        t = threading.Thread(target=probe)
+        t.start()
+        t.join()
+        fold(agg, rd)
+    monkeypatch.setattr(aggregates, 'fold', probing)
+    data = store.get()
+    for _ in aggregates.iter_ensure(data, chunk=2):
+        pass
+    aggregates.invalidate(data)
+    aggregates.ensure(data)
+    assert free == [False] * 8
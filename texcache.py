@@ -0,0 +1,90 @@
+"""Shared LRU cache of rendered text textures.
+
+Rasterizing text (CJK fonts in particular) is the expensive part of drawing
+a board cell, and the board repeats the same strings constantly: round
+labels, small score values, player names and the trophy glyph. Textures are
+keyed by (text, font, size, color, wrap width) and shared by every caller;
+the least recently used ones are dropped once the cache holds more than
+MAX_BYTES of texture memory (4 bytes per pixel).
+"""
+from collections import OrderedDict
+import threading
+
+from kivy.core.text import Label as CoreLabel
+
+MAX_BYTES = 16 * 1024 * 1024
+
+
+class TextureCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text, font_name=None, font_size=None, color=(1, 1, 1, 1), width=None, halign='center'):
+        """Return the texture for `text`, rendering it on a miss."""
+        color = tuple(round(float(c), 4) for c in color)
+        key = (text, font_name or None, round(float(font_size or 0), 2), color, width, halign)
+        with self._lock:
+            tex = self._items.get(key)
+            if tex is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return tex
+            self.misses += 1
+        kw = {'color': color, 'halign': halign}
+        if font_size:
+            kw['font_size'] = font_size
+        if font_name:
+            kw['font_name'] = font_name
+        if width:
+            kw['text_size'] = (width, None)
+        lbl = CoreLabel(text=text, **kw)
+        lbl.refresh()
+        tex = lbl.texture
+        if tex is None:
+            return None
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = tex
+                self.bytes += tex.width * tex.height * 4
+                self._trim()
+        return tex
+
+    def _trim(self):
+        # keep at least the newest entry even if it alone is over the cap
+        while self.bytes > self.max_bytes and len(self._items) > 1:
+            _key, old = self._items.popitem(last=False)
+            self.bytes -= old.width * old.height * 4
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._items), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': (self.hits / total) if total else 0.0}
+
+
+CACHE = TextureCache()
+
+
+def get_texture(text, font_name=None, font_size=None, color=(1, 1, 1, 1), width=None, halign='center'):
+    return CACHE.get(text, font_name, font_size, color, width, halign)
+
+
+def stats():
+    return CACHE.stats()
+
+
+def clear():
+    CACHE.clear()
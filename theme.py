@@ -3,6 +3,9 @@ from kivy.core.window import Window
 from kivy.metrics import sp, dp
 import os
 from kivy.core.text import LabelBase
+from kivy.event import EventDispatcher
+from kivy.properties import ColorProperty, StringProperty
+import weakref
 
 # 颜色与尺寸常量
 COLOR_BG = (0.96, 0.96, 0.98, 1)
@@ -45,6 +48,70 @@ THEMES = {
     }
 }
 
+COLOR_NAMES = ('COLOR_BG', 'PANEL_BG', 'HEADER_BG', 'ROW_DARK', 'ROW_LIGHT', 'TOTAL_BG',
+               'BORDER_COLOR', 'BTN_BG', 'ACCENT', 'TEXT_COLOR')
+
+
+class ThemeState(EventDispatcher):
+    """Current theme colors as Kivy properties.
+
+    bind_color() ties a widget attribute or a canvas instruction to one color;
+    apply_theme() then updates exactly the bound targets in place. Targets are
+    held weakly, so dead widgets simply drop out.
+    """
+    name = StringProperty('light')
+    COLOR_BG = ColorProperty(COLOR_BG)
+    PANEL_BG = ColorProperty(PANEL_BG)
+    HEADER_BG = ColorProperty(HEADER_BG)
+    ROW_DARK = ColorProperty(ROW_DARK)
+    ROW_LIGHT = ColorProperty(ROW_LIGHT)
+    TOTAL_BG = ColorProperty(TOTAL_BG)
+    BORDER_COLOR = ColorProperty(BORDER_COLOR)
+    BTN_BG = ColorProperty(BTN_BG)
+    ACCENT = ColorProperty(ACCENT)
+    TEXT_COLOR = ColorProperty(TEXT_COLOR)
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self._targets = {}
+        for nm in COLOR_NAMES:
+            self.fbind(nm, self._push, nm)
+
+    def bind_color(self, target, attr, color_name, now=True):
+        """Keep `target.attr` equal to theme color `color_name`; with
+        now=False the current value is left alone until the next change."""
+        targets = self._targets.get(color_name)
+        if targets is None:
+            targets = self._targets[color_name] = weakref.WeakKeyDictionary()
+        attrs = targets.setdefault(target, [])
+        if attr not in attrs:
+            attrs.append(attr)
+        if now:
+            setattr(target, attr, tuple(getattr(self, color_name)))
+
+    def _push(self, color_name, _inst, value):
+        targets = self._targets.get(color_name)
+        if not targets:
+            return
+        value = tuple(value)
+        for target, attrs in list(targets.items()):
+            for attr in attrs:
+                try:
+                    setattr(target, attr, value)
+                except Exception:
+                    pass
+
+
+STATE = ThemeState()
+
+
+def bind_color(target, attr, color_name, now=True):
+    try:
+        STATE.bind_color(target, attr, color_name, now)
+    except Exception:
+        pass
+
+
 CURRENT_THEME = 'light'
 
 def apply_theme(name: str):
@@ -66,6 +133,14 @@ def apply_theme(name: str):
         Window.clearcolor = COLOR_BG
     except Exception:
         pass
+    # bound widgets and instructions recolor themselves here
+    try:
+        g = globals()
+        for nm in COLOR_NAMES:
+            setattr(STATE, nm, g[nm])
+        STATE.name = name
+    except Exception:
+        pass
     # notify any registered listeners so UI can refresh dynamic graphics
     try:
         for cb in _THEME_LISTENERS:
@@ -7,73 +7,36 @@ from kivy.metrics import dp, sp
 from kivy.graphics import Color, Rectangle, Line, Ellipse
 from kivy.clock import Clock
 from kivy.uix.textinput import TextInput
-import weakref
+from kivy.properties import StringProperty, ColorProperty, NumericProperty, BooleanProperty
 import theme as _theme
 
-# registry of widgets that need theme-driven updates (weak refs to avoid leaks)
-_THEMED_WIDGETS = weakref.WeakSet()
-
 def _register_themable(obj):
-    try:
-        _THEMED_WIDGETS.add(obj)
-    except Exception:
-        pass
+    """Bind obj's theme-dependent colors to theme.STATE (see theme.py).
 
-def _apply_theme_to_registered():
-    """Update known widgets' colors when theme changes."""
+    What to bind is decided once here; a theme change then only sets the
+    bound properties, with no walk over widgets.
+    """
     try:
         from kivy.uix.label import Label as _KLabel
         from kivy.uix.textinput import TextInput as _KTI
+        bind = _theme.bind_color
+        instr = getattr(obj, '_bg_color_instruction', None)
+        if instr is not None:
+            bind(instr, 'rgba', 'BTN_BG', now=False)
+        instr = getattr(obj, '_bg_color_instr', None)
+        if instr is not None:
+            bind(instr, 'rgba', 'BTN_BG', now=False)
+        instr = getattr(obj, '_mark_color_instruction', None)
+        if instr is not None:
+            bind(instr, 'rgba', 'TEXT_COLOR', now=False)
+        if isinstance(obj, (_KLabel, CachedLabel)):
+            bind(obj, 'color', 'TEXT_COLOR', now=False)
+        if isinstance(obj, _KTI):
+            bind(obj, 'background_color', 'PANEL_BG', now=False)
+            bind(obj, 'foreground_color', 'TEXT_COLOR', now=False)
     except Exception:
-        _KLabel = None
-        _KTI = None
-    for w in list(_THEMED_WIDGETS):
-        try:
-            # update canvas color instructions if present
-            if hasattr(w, '_bg_color_instruction') and getattr(w, '_bg_color_instruction') is not None:
-                try:
-                    w._bg_color_instruction.rgba = _T('BTN_BG')
-                except Exception:
-                    pass
-            if hasattr(w, '_bg_color_instr') and getattr(w, '_bg_color_instr') is not None:
-                try:
-                    w._bg_color_instr.rgba = _T('BTN_BG')
-                except Exception:
-                    pass
-            if hasattr(w, '_mark_color_instruction') and getattr(w, '_mark_color_instruction') is not None:
-                try:
-                    w._mark_color_instruction.rgba = _T('TEXT_COLOR')
-                except Exception:
-                    pass
-            # Labels: update text color
-            try:
-                if _KLabel is not None and isinstance(w, _KLabel):
-                    w.color = _T('TEXT_COLOR')
-            except Exception:
-                pass
-            # TextInput: update background and foreground
-            try:
-                if _KTI is not None and isinstance(w, _KTI):
-                    try:
-                        w.background_color = _T('PANEL_BG')
-                    except Exception:
-                        pass
-                    try:
-                        w.foreground_color = _T('TEXT_COLOR')
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-        except Exception:
-            pass
-
-# register our theme applier with theme module so it's called on apply_theme
-try:
-    _theme.register_theme_listener(_apply_theme_to_registered)
-except Exception:
-    pass
+        pass
 
-import theme as _theme
 FONT_NAME = getattr(_theme, 'FONT_NAME', None)
 FA_FONT = getattr(_theme, 'FA_FONT', None)
 def _T(name):
@@ -130,6 +93,59 @@ def H(text="", **kw):
         pass
     return lbl
 
+class CachedLabel(Widget):
+    """Label-like widget that draws its text from the shared texture cache.
+
+    Supports the Label attributes the app sets (text, color, font_name,
+    font_size); identical strings share one texture (see texcache.py)
+    instead of being rasterized per widget. With wrap=True the text wraps
+    to the widget width.
+    """
+    text = StringProperty('')
+    color = ColorProperty([1, 1, 1, 1])
+    font_name = StringProperty('')
+    font_size = NumericProperty(sp(12))
+    wrap = BooleanProperty(False)
+
+    def __init__(self, **kw):
+        for _k in ('halign', 'valign', 'markup'):
+            kw.pop(_k, None)
+        super().__init__(**kw)
+        with self.canvas:
+            self._tex_color = Color(1, 1, 1, 1)
+            self._tex_rect = Rectangle(size=(0, 0))
+        self._trigger = Clock.create_trigger(self._refresh, -1)
+        self.bind(text=self._trigger, color=self._trigger, font_name=self._trigger,
+                  font_size=self._trigger, wrap=self._trigger, pos=self._place, size=self._on_size)
+        self._refresh()
+
+    def _on_size(self, *_a):
+        if self.wrap:
+            self._trigger()
+        self._place()
+
+    def _refresh(self, *_a):
+        tex = None
+        if self.text:
+            try:
+                from texcache import get_texture
+                width = int(self.width) if self.wrap and self.width > 1 else None
+                tex = get_texture(self.text, self.font_name or None, self.font_size, tuple(self.color), width)
+            except Exception:
+                tex = None
+        self._tex_rect.texture = tex
+        self._tex_rect.size = tex.size if tex is not None else (0, 0)
+        self._place()
+
+    def _place(self, *_a):
+        tw, th = self._tex_rect.size
+        self._tex_rect.pos = (int(self.center_x - tw / 2), int(self.center_y - th / 2))
+
+    @property
+    def texture_size(self):
+        return tuple(self._tex_rect.size)
+
+
 def TI(**kw):
     if FONT_NAME:
         kw.setdefault("font_name", FONT_NAME)
@@ -152,166 +168,33 @@ def TI(**kw):
         pass
     return ti
 
-def cell_bg(text, width, height, bg_color):
-    from kivy.uix.boxlayout import BoxLayout
-    cont = BoxLayout(size_hint=(None, None), width=width, height=height)
-    try:
-        with cont.canvas.before:
-            border_color_instr = Color(* (0,0,0,0.06))
-            rect_border = Rectangle(pos=cont.pos, size=cont.size)
-            bg_color_instr = Color(*bg_color)
-            rect = Rectangle(pos=(cont.x + dp(1), cont.y + dp(1)), size=(max(0, cont.width - dp(2)), max(0, cont.height - dp(2))))
-        cont._rect_border = rect_border
-        cont._rect = rect
-        cont._border_color_instr = border_color_instr
-        cont._bg_color_instr = bg_color_instr
-        cont._bg_color = bg_color
-        cont.bind(pos=lambda inst, *_: setattr(rect_border, 'pos', inst.pos),
-                  size=lambda inst, *_: setattr(rect_border, 'size', inst.size))
-        cont.bind(pos=lambda inst, *_: setattr(rect, 'pos', (inst.x + dp(1), inst.y + dp(1))),
-                  size=lambda inst, *_: setattr(rect, 'size', (max(0, inst.width - dp(2)), max(0, inst.height - dp(2)))))
-    except Exception:
-        cont._rect_border = None
-        cont._rect = None
-        cont._border_color_instr = None
-        cont._bg_color_instr = None
-        cont._bg_color = bg_color
-        pass
-    lbl = L(text=text, size_hint=(1, 1))
-    cont.add_widget(lbl)
-    try:
-        _register_themable(cont)
-    except Exception:
-        pass
-    return cont
-
-def cell_bg_with_trophy(text, width, height, bg_color, rank=None):
-    from kivy.uix.boxlayout import BoxLayout
-    cont = BoxLayout(size_hint=(None, None), width=width, height=height)
-    try:
-        with cont.canvas.before:
-            border_color_instr = Color(* (0,0,0,0.06))
-            rect_border = Rectangle(pos=cont.pos, size=cont.size)
-            bg_color_instr = Color(*bg_color)
-            rect = Rectangle(pos=(cont.x + dp(1), cont.y + dp(1)), size=(max(0, cont.width - dp(2)), max(0, cont.height - dp(2))))
-        cont._rect_border = rect_border
-        cont._rect = rect
-        cont._border_color_instr = border_color_instr
-        cont._bg_color_instr = bg_color_instr
-        cont._bg_color = bg_color
-        cont.bind(pos=lambda inst, *_: setattr(rect_border, 'pos', inst.pos),
-                  size=lambda inst, *_: setattr(rect_border, 'size', inst.size))
-        cont.bind(pos=lambda inst, *_: setattr(rect, 'pos', (inst.x + dp(1), inst.y + dp(1))),
-                  size=lambda inst, *_: setattr(rect, 'size', (max(0, inst.width - dp(2)), max(0, inst.height - dp(2)))))
-    except Exception:
-        cont._rect_border = None
-        cont._rect = None
-        cont._border_color_instr = None
-        cont._bg_color_instr = None
-        cont._bg_color = bg_color
-        pass
-    content = BoxLayout(orientation='horizontal', size_hint=(1,1))
-    lbl = L(text=text, size_hint=(1,1))
-    content.add_widget(lbl)
-    if rank == 1 or rank == 'last':
-        try:
-            from kivy.uix.image import Image
-            icon_w = None
-            _gold = 'assets/icons/trophy_gold.png'
-            _gray = 'assets/icons/trophy_gray.png'
-            if FA_FONT:
-                try:
-                    glyph = '\uf091'
-                    icon_w = Label(text=glyph, font_name=FA_FONT, font_size=sp(14), size_hint=(None,1), width=dp(20))
-                    icon_w.color = (1.0, 0.84, 0.0, 1) if rank == 1 else (0.6,0.6,0.63,1)
-                except Exception:
-                    pass
-            if icon_w is not None:
-                content.add_widget(icon_w)
-        except Exception:
-            pass
-    cont.add_widget(content)
-    try:
-        _register_themable(cont)
-    except Exception:
-        pass
-    return cont
-
-
 def TrophyWidget(rank=None, size=36):
     """Return a simple trophy widget without background for inline use.
 
     If `rank` is 1 or 'last' the widget shows a colored trophy glyph; else empty.
+    The glyph texture is shared through the texture cache.
     """
     try:
         font_size = sp(14)
     except Exception:
         font_size = 14
-    # Prefer FontAwesome glyph when available (matches score page), fall back to emoji
     try:
+        # Prefer FontAwesome glyph when available (matches score page), fall back to emoji
         if FA_FONT:
-            glyph = '\uf091'
-            if rank == 1:
-                lbl = Label(text=glyph, font_name=FA_FONT, font_size=font_size, size_hint=(None, 1), width=dp(size), halign='center', valign='middle')
-                try:
-                    lbl.color = (1.0, 0.84, 0.0, 1)
-                except Exception:
-                    pass
-                try:
-                    lbl.bind(size=lambda inst, *_: setattr(inst, 'text_size', (inst.width, inst.height)))
-                except Exception:
-                    pass
-                try:
-                    _register_themable(lbl)
-                except Exception:
-                    pass
-                return lbl
-            elif rank == 'last':
-                lbl = Label(text=glyph, font_name=FA_FONT, font_size=font_size, size_hint=(None, 1), width=dp(size), halign='center', valign='middle')
-                try:
-                    lbl.color = (0.6, 0.6, 0.63, 1)
-                except Exception:
-                    pass
-                try:
-                    lbl.bind(size=lambda inst, *_: setattr(inst, 'text_size', (inst.width, inst.height)))
-                except Exception:
-                    pass
-                try:
-                    _register_themable(lbl)
-                except Exception:
-                    pass
-                return lbl
-            else:
-                lbl = Label(text='', size_hint=(None, 1), width=dp(size))
-                try:
-                    lbl.bind(size=lambda inst, *_: setattr(inst, 'text_size', (inst.width, inst.height)))
-                except Exception:
-                    pass
-                try:
-                    _register_themable(lbl)
-                except Exception:
-                    pass
-                return lbl
+            glyph, font = '\uf091', FA_FONT
         else:
-            # No FontAwesome available; use emoji which may rely on system fallback fonts
-            if rank == 1:
-                lbl = Label(text='🏆', font_size=font_size, color=(1.0, 0.84, 0.0, 1), size_hint=(None, 1), width=dp(size), halign='center', valign='middle')
-            elif rank == 'last':
-                lbl = Label(text='🏆', font_size=font_size, color=(0.6, 0.6, 0.63, 1), size_hint=(None, 1), width=dp(size), halign='center', valign='middle')
-            else:
-                lbl = Label(text='', size_hint=(None, 1), width=dp(size))
-            try:
-                lbl.bind(size=lambda inst, *_: setattr(inst, 'text_size', (inst.width, inst.height)))
-            except Exception:
-                pass
-            try:
-                _register_themable(lbl)
-            except Exception:
-                pass
-            return lbl
+            glyph, font = '🏆', ''
+        if rank == 1:
+            return CachedLabel(text=glyph, font_name=font, font_size=font_size, color=(1.0, 0.84, 0.0, 1),
+                               size_hint=(None, 1), width=dp(size))
+        if rank == 'last':
+            return CachedLabel(text=glyph, font_name=font, font_size=font_size, color=(0.6, 0.6, 0.63, 1),
+                               size_hint=(None, 1), width=dp(size))
+        # empty slot; callers may set text/color later (see InputScreen rows)
+        return CachedLabel(text='', font_name=font, font_size=font_size, size_hint=(None, 1), width=dp(size))
     except Exception:
         # ultimate fallback: plain empty L()
-        return L(text='' if rank is None else '🏆' if rank == 1 else '🏆', size_hint_x=None, width=dp(size))
+        return L(text='' if rank is None else '🏆', size_hint_x=None, width=dp(size))
 
 def BTN(text, **kw):
     kw.setdefault("size_hint_y", None)
@@ -709,6 +592,11 @@ class ScoreInputItem(BoxLayout):
         except Exception:
             self.dun_input.text = '0'
 
+    def reset(self):
+        """Put both inputs back to their initial values (a new round)."""
+        self.base_input.text = str(self.base_value)
+        self.dun_input.text = str(self.dun_value)
+
     # long-press handlers
     def _on_name_long_press(self, inst, touch):
         try: